@@ -120,3 +120,24 @@ def authenticated_api_client(api_client, user):
 def enable_db_access_for_all_tests(db):
     """Enable database access for all tests"""
     pass
+
+
+@pytest.fixture(autouse=True)
+def locmem_cache(settings):
+    """Run tests on a local memory cache instead of the shared Redis one"""
+    settings.CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'financeapp-tests',
+            'TIMEOUT': 300,
+        }
+    }
+
+
+@pytest.fixture(autouse=True)
+def clear_cache(locmem_cache):
+    """Start every test with an empty cache"""
+    from django.core.cache import cache
+    cache.clear()
+    yield
+    cache.clear()
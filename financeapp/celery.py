@@ -3,7 +3,10 @@ Celery configuration for financeapp project
 """
 import os
 from celery import Celery
+from celery.schedules import crontab
+from celery.signals import worker_init
 from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
 
 # Set the default Django settings module for the 'celery' program.
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'financeapp.settings')
@@ -23,11 +26,46 @@ app.conf.beat_schedule = {
         'task': 'transactions.tasks.process_recurring_transactions',
         'schedule': 3600.0,  # Run every hour
     },
+    'reconcile-pending-payments': {
+        'task': 'transactions.tasks.reconcile_pending_payments',
+        'schedule': 300.0,  # Run every 5 minutes
+    },
+    'process-pending-stripe-events': {
+        'task': 'transactions.tasks.process_pending_stripe_events',
+        'schedule': 60.0,  # Safety net for webhook events that were not enqueued
+    },
+    'refresh-admin-stats': {
+        'task': 'transactions.tasks.refresh_admin_stats',
+        'schedule': 240.0,  # Run every 4 minutes, inside the cache TTL
+    },
+    'take-balance-snapshots': {
+        'task': 'transactions.tasks.take_balance_snapshots',
+        'schedule': 86400.0,  # Run daily
+    },
+    'generate-monthly-reports': {
+        'task': 'transactions.tasks.generate_monthly_reports',
+        'schedule': crontab(minute=0, hour=2, day_of_month=1),  # Previous month, early on the 1st
+    },
 }
 
 app.conf.timezone = 'UTC'
 
 
+@worker_init.connect
+def require_shared_cache(**kwargs):
+    """Refuse to run workers on a cache other worker processes cannot see
+    
+    process_payment_async locks each payment with ``cache.add``; on the
+    per-process local memory cache every process would get the lock.
+    """
+    backend = settings.CACHES['default']['BACKEND']
+    if backend.endswith('LocMemCache'):
+        raise ImproperlyConfigured(
+            'Celery workers need a shared cache for the payment lock; set CACHE_REDIS_URL '
+            'or use a Redis CELERY_BROKER_URL'
+        )
+
+
 @app.task(bind=True)
 def debug_task(self):
     print(f'Request: {self.request!r}')
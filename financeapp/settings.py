@@ -4,6 +4,7 @@ Django settings for financeapp project.
 
 import os
 from pathlib import Path
+from urllib.parse import urlsplit
 from decouple import config
 import dj_database_url
 
@@ -42,6 +43,7 @@ MIDDLEWARE = [
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "transactions.middleware.UserPreferencesMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -155,9 +157,72 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'UTC'
 
+# Cache configuration
+# Uses the Redis server behind the Celery broker, on its own database, unless
+# CACHE_REDIS_URL names another one; setting CACHE_REDIS_URL empty falls back
+# to per-process local memory. Celery workers refuse to start on the local
+# memory cache, as the payment lock in process_payment_async must be shared.
+# The test suite swaps in local memory from conftest.py.
+_broker = urlsplit(CELERY_BROKER_URL)
+CACHE_REDIS_URL = config(
+    'CACHE_REDIS_URL',
+    default=_broker._replace(path='/2').geturl() if _broker.scheme in ('redis', 'rediss') else ''
+)
+
+if CACHE_REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_REDIS_URL,
+            'KEY_PREFIX': 'financeapp',
+            'TIMEOUT': 300,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'financeapp',
+            'TIMEOUT': 300,
+        }
+    }
+
+# Per-user page data cache for dashboard, accounts, analytics and profile (seconds)
+VIEW_CACHE_TTL = config('VIEW_CACHE_TTL', default=300, cast=int)
+
+# Admin dashboard statistics cache (seconds)
+ADMIN_STATS_CACHE_TTL = config('ADMIN_STATS_CACHE_TTL', default=300, cast=int)
+ADMIN_STATS_STALE_TTL = config('ADMIN_STATS_STALE_TTL', default=3600, cast=int)
+
+# Transaction search typeahead: seconds a prefix's matches stay cached, and
+# how many matches are cached per prefix for narrowing in memory
+TYPEAHEAD_CACHE_TTL = config('TYPEAHEAD_CACHE_TTL', default=60, cast=int)
+TYPEAHEAD_CANDIDATES = config('TYPEAHEAD_CANDIDATES', default=200, cast=int)
+
+# Due recurring transactions processed per Celery subtask
+RECURRING_CHUNK_SIZE = config('RECURRING_CHUNK_SIZE', default=500, cast=int)
+
+# Users per month-end report subtask
+MONTHLY_REPORT_BATCH_SIZE = config('MONTHLY_REPORT_BATCH_SIZE', default=200, cast=int)
+
 # Stripe Configuration
 STRIPE_SECRET_KEY = config('STRIPE_SECRET_KEY', default='')
 STRIPE_PUBLIC_KEY = config('STRIPE_PUBLIC_KEY', default='')
+STRIPE_WEBHOOK_SECRET = config('STRIPE_WEBHOOK_SECRET', default='')
+# Oldest webhook signature timestamp accepted (seconds)
+STRIPE_WEBHOOK_TOLERANCE = config('STRIPE_WEBHOOK_TOLERANCE', default=300, cast=int)
+# Stripe HTTP transport, per worker process (seconds where applicable)
+STRIPE_CONNECT_TIMEOUT = config('STRIPE_CONNECT_TIMEOUT', default=2.0, cast=float)
+STRIPE_READ_TIMEOUT = config('STRIPE_READ_TIMEOUT', default=10.0, cast=float)
+STRIPE_MAX_CONNECTIONS = config('STRIPE_MAX_CONNECTIONS', default=10, cast=int)
+STRIPE_MAX_CONCURRENT_REQUESTS = config('STRIPE_MAX_CONCURRENT_REQUESTS', default=10, cast=int)
+STRIPE_ACQUIRE_TIMEOUT = config('STRIPE_ACQUIRE_TIMEOUT', default=1.0, cast=float)
+# Consecutive failures that open the circuit, and how long it stays open
+STRIPE_CIRCUIT_FAILURE_THRESHOLD = config('STRIPE_CIRCUIT_FAILURE_THRESHOLD', default=5, cast=int)
+STRIPE_CIRCUIT_RESET_TIMEOUT = config('STRIPE_CIRCUIT_RESET_TIMEOUT', default=30.0, cast=float)
+
+# Per-worker cap on payment confirmation tasks, so bursts queue instead of hammering Stripe
+PAYMENT_TASK_RATE_LIMIT = config('PAYMENT_TASK_RATE_LIMIT', default='20/s')
 
 # Logging configuration
 LOGGING = {
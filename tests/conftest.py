@@ -0,0 +1,238 @@
+"""
+Test doubles shared by the test modules
+"""
+import itertools
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import pytest
+import stripe
+
+
+class FakeStripe:
+    """In-memory stand-in for the Stripe API calls made by StripePaymentService
+    
+    Honours idempotency keys like Stripe does, records every call, and can be
+    told to raise errors on the next calls to simulate outages.
+    """
+    
+    def __init__(self):
+        self.intents = {}
+        self.customers = {}
+        self.calls = []
+        self._idempotent_results = {}
+        self._failures = []
+        self._ids = itertools.count(1)
+        self.PaymentIntent = SimpleNamespace(
+            create=self._create_payment_intent,
+            retrieve=self._retrieve_payment_intent,
+            list=self._list_payment_intents,
+        )
+        self.Customer = SimpleNamespace(create=self._create_customer)
+    
+    def fail_next(self, error, times=1):
+        """Raise ``error`` from the next ``times`` API calls"""
+        self._failures.extend([error] * times)
+    
+    def set_status(self, intent_id, status):
+        self.intents[intent_id].status = status
+    
+    def _call(self, name, kwargs):
+        self.calls.append((name, kwargs))
+        if self._failures:
+            raise self._failures.pop(0)
+    
+    def _idempotent(self, key, create):
+        if key is None:
+            return create()
+        if key not in self._idempotent_results:
+            self._idempotent_results[key] = create()
+        return self._idempotent_results[key]
+    
+    def _create_payment_intent(self, amount, currency, metadata=None, idempotency_key=None):
+        self._call('PaymentIntent.create', {
+            'amount': amount, 'currency': currency, 'metadata': metadata,
+            'idempotency_key': idempotency_key,
+        })
+        
+        def create():
+            return self.add_intent(amount=amount, currency=currency, metadata=metadata)
+        
+        return self._idempotent(idempotency_key, create)
+    
+    def add_intent(self, status='succeeded', amount=1000, currency='usd', metadata=None,
+                   created=None, last_payment_error=None):
+        """Store an intent directly, as if created earlier, without recording a call"""
+        intent_id = f'pi_fake_{next(self._ids)}'
+        intent = SimpleNamespace(
+            id=intent_id,
+            client_secret=f'{intent_id}_secret',
+            amount=amount,
+            currency=currency,
+            metadata=dict(metadata or {}),
+            status=status,
+            payment_method='pm_fake_card',
+            created=created or int(time.time()),
+            last_payment_error=last_payment_error,
+        )
+        self.intents[intent_id] = intent
+        return intent
+    
+    def _retrieve_payment_intent(self, intent_id):
+        self._call('PaymentIntent.retrieve', {'id': intent_id})
+        if intent_id not in self.intents:
+            raise stripe.error.InvalidRequestError(f"No such payment_intent: '{intent_id}'", 'id')
+        return self.intents[intent_id]
+    
+    def _list_payment_intents(self, created=None, limit=10, starting_after=None):
+        self._call('PaymentIntent.list', {
+            'created': created, 'limit': limit, 'starting_after': starting_after,
+        })
+        intents = sorted(self.intents.values(), key=lambda intent: (intent.created, intent.id), reverse=True)
+        if created and 'gte' in created:
+            intents = [intent for intent in intents if intent.created >= created['gte']]
+        if starting_after:
+            position = [intent.id for intent in intents].index(starting_after)
+            intents = intents[position + 1:]
+        return SimpleNamespace(data=intents[:limit], has_more=len(intents) > limit)
+    
+    def _create_customer(self, email, metadata=None, idempotency_key=None):
+        self._call('Customer.create', {
+            'email': email, 'metadata': metadata, 'idempotency_key': idempotency_key,
+        })
+        
+        def create():
+            customer = SimpleNamespace(id=f'cus_fake_{next(self._ids)}', email=email)
+            self.customers[customer.id] = customer
+            return customer
+        
+        return self._idempotent(idempotency_key, create)
+    
+    def call_count(self, name):
+        return sum(1 for call_name, _ in self.calls if call_name == name)
+
+
+@pytest.fixture
+def fake_stripe(monkeypatch):
+    """Route StripePaymentService to an in-memory FakeStripe"""
+    fake = FakeStripe()
+    monkeypatch.setattr('transactions.services.stripe.PaymentIntent', fake.PaymentIntent)
+    monkeypatch.setattr('transactions.services.stripe.Customer', fake.Customer)
+    return fake
+
+
+STRIPE_WEBHOOK_SECRET = 'whsec_test_secret'
+
+
+def make_stripe_event(event_type, payment_intent_id, created=None, **intent_fields):
+    """Build a Stripe webhook event payload for a payment intent"""
+    created = created or int(time.time())
+    return {
+        'id': f'evt_{payment_intent_id}_{event_type}_{created}',
+        'object': 'event',
+        'type': event_type,
+        'created': created,
+        'data': {
+            'object': {
+                'id': payment_intent_id,
+                'object': 'payment_intent',
+                **intent_fields,
+            }
+        },
+    }
+
+
+def sign_stripe_payload(payload, secret=STRIPE_WEBHOOK_SECRET, timestamp=None):
+    """Return a Stripe-Signature header for a payload, signed the way Stripe signs it"""
+    timestamp = timestamp or int(time.time())
+    signature = stripe.WebhookSignature._compute_signature(f'{timestamp}.{payload}', secret)
+    return f't={timestamp},v1={signature}'
+
+
+class FakeStripeServer:
+    """Local HTTP server answering Stripe API calls over keep-alive connections
+    
+    Every request gets ``status`` and a payment intent body after ``delay``
+    seconds; ``gate`` can be cleared to hold requests until it is set again.
+    Counts requests and the distinct connections they arrived on.
+    """
+    
+    def __init__(self):
+        self.status = 200
+        self.delay = 0
+        self.gate = threading.Event()
+        self.gate.set()
+        self.requests = 0
+        self.connections = 0
+        self._lock = threading.Lock()
+        server = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            
+            def setup(self):
+                super().setup()
+                with server._lock:
+                    server.connections += 1
+            
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                self._respond()
+            
+            def do_GET(self):
+                self._respond()
+            
+            def _respond(self):
+                with server._lock:
+                    server.requests += 1
+                    number = server.requests
+                server.gate.wait(5)
+                time.sleep(server.delay)
+                if server.status >= 400:
+                    body = {'error': {'type': 'api_error', 'message': 'Fake Stripe failure'}}
+                else:
+                    # No 'object' key: the library builds the resource class it asked for
+                    body = {
+                        'id': f'pi_local_{number}',
+                        'client_secret': f'pi_local_{number}_secret', 'status': 'succeeded',
+                    }
+                payload = json.dumps(body).encode()
+                try:
+                    self.send_response(server.status)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(payload)))
+                    self.end_headers()
+                    self.wfile.write(payload)
+                except OSError:
+                    # The client gave up waiting
+                    pass
+            
+            def log_message(self, *args):
+                pass
+        
+        self._httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._httpd.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self._httpd.server_address[1]}'
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+    
+    def shutdown(self):
+        self.gate.set()
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+@pytest.fixture
+def stripe_server(monkeypatch):
+    """Point the Stripe library at a local FakeStripeServer"""
+    server = FakeStripeServer()
+    monkeypatch.setattr(stripe, 'api_base', server.url)
+    monkeypatch.setattr(stripe, 'api_key', 'sk_test_local')
+    monkeypatch.setattr(stripe, 'default_http_client', None)
+    yield server
+    if stripe.default_http_client is not None:
+        stripe.default_http_client.close()
+    server.shutdown()
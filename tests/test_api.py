@@ -3,8 +3,10 @@ API integration tests
 """
 import pytest
 import json
+from datetime import timedelta
 from decimal import Decimal
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
 from transactions.models import Account, Transaction, Category
 
@@ -56,6 +58,19 @@ class TestAccountAPI:
         assert 'balance' in data
         assert data['currency'] == account.currency
     
+    def test_balance_edit_is_recorded_in_ledger(self, authenticated_api_client, account):
+        """Test a balance written through the API is posted as a ledger adjustment"""
+        from transactions.models import LedgerEntry
+        url = reverse('account-detail', kwargs={'pk': account.id})
+        response = authenticated_api_client.patch(url, {'balance': '1250.00'}, format='json')
+        
+        assert response.status_code == status.HTTP_200_OK
+        account.refresh_from_db()
+        assert account.balance == Decimal('1250.00')
+        adjustment = LedgerEntry.objects.get(account=account, entry_type='adjustment')
+        assert adjustment.amount == Decimal('250.00')
+        assert account.get_balance_at() == account.balance
+    
     def test_get_spending_by_category(self, authenticated_api_client, account, category):
         """Test getting spending breakdown by category"""
         # Create a transaction
@@ -151,6 +166,14 @@ class TestTransactionAPI:
         assert data['count'] == 1
         assert data['results'][0]['description'] == 'Checking expense'
     
+    def test_filter_by_invalid_account_is_ignored(self, authenticated_api_client, transaction):
+        """Test a non-numeric account_id is ignored instead of failing"""
+        url = reverse('transaction-list')
+        response = authenticated_api_client.get(url, {'account_id': 'abc'})
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.json()['results']) == 1
+    
     def test_search_transactions(self, authenticated_api_client, account):
         """Test searching transactions"""
         Transaction.objects.create(
@@ -176,6 +199,105 @@ class TestTransactionAPI:
         assert data['count'] == 1
         assert 'Coffee shop' in data['results'][0]['description']
     
+    def _create_history(self, account, count):
+        """Create transactions in pairs sharing a date, so the id tie-break matters"""
+        base = timezone.now() - timedelta(days=count)
+        return [
+            Transaction.objects.create(
+                account=account,
+                amount=Decimal('1.00'),
+                description=f'Purchase {i}',
+                transaction_type='debit',
+                transaction_date=base + timedelta(hours=i // 2)
+            )
+            for i in range(count)
+        ]
+    
+    def test_keyset_pages_walk_full_history(self, authenticated_api_client, account):
+        """Test following next and previous cursors visits every transaction once"""
+        created = self._create_history(account, 45)
+        expected = [t.id for t in sorted(created, key=lambda t: (t.transaction_date, t.id), reverse=True)]
+        
+        response = authenticated_api_client.get(reverse('transaction-list'), {'cursor': ''})
+        pages = [response.json()]
+        while pages[-1]['next']:
+            pages.append(authenticated_api_client.get(pages[-1]['next']).json())
+        
+        assert [len(page['results']) for page in pages] == [20, 20, 5]
+        assert [row['id'] for page in pages for row in page['results']] == expected
+        assert 'count' not in pages[0]
+        assert pages[0]['previous'] is None
+        
+        backwards = authenticated_api_client.get(pages[-1]['previous']).json()
+        assert [row['id'] for row in backwards['results']] == expected[20:40]
+        assert backwards['next'] is not None
+    
+    def test_deep_keyset_page_skips_count(self, authenticated_api_client, account):
+        """Test later pages cost the same queries as the first and none counts"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        self._create_history(account, 45)
+        url = reverse('transaction-list') + '?cursor='
+        
+        with CaptureQueriesContext(connection) as first:
+            next_url = authenticated_api_client.get(url).json()['next']
+        first_queries = list(first.captured_queries)
+        second_url = authenticated_api_client.get(next_url).json()['next']
+        with CaptureQueriesContext(connection) as deep:
+            authenticated_api_client.get(second_url)
+        
+        assert len(deep.captured_queries) == len(first_queries)
+        assert not [q for q in first_queries + deep.captured_queries if 'COUNT(' in q['sql'].upper()]
+        assert not [q for q in deep.captured_queries if 'OFFSET' in q['sql'].upper()]
+    
+    def test_keyset_page_reads_user_index_in_order(self, authenticated_api_client, account, savings_account):
+        """Test a page across all the user's accounts needs no sort"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        self._create_history(account, 5)
+        self._create_history(savings_account, 5)
+        
+        with CaptureQueriesContext(connection) as ctx:
+            authenticated_api_client.get(reverse('transaction-list'), {'cursor': ''})
+        page_sql = next(
+            q['sql'] for q in ctx.captured_queries
+            if q['sql'].startswith('SELECT') and 'FROM "transactions_transaction"' in q['sql']
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(f'{connection.ops.explain_query_prefix()} {page_sql}')
+            plan = ' '.join(str(row[-1]) for row in cursor.fetchall())
+        
+        assert 'TEMP B-TREE FOR ORDER BY' not in plan
+        assert 'Sort' not in plan
+    
+    def test_keyset_count_modes(self, authenticated_api_client, account):
+        """Test the count can be requested exactly or estimated, or left out"""
+        self._create_history(account, 3)
+        url = reverse('transaction-list')
+        
+        assert authenticated_api_client.get(url, {'cursor': '', 'count': 'exact'}).json()['count'] == 3
+        assert authenticated_api_client.get(url, {'cursor': '', 'count': 'estimate'}).json()['count'] == 3
+        assert 'count' not in authenticated_api_client.get(url, {'cursor': ''}).json()
+    
+    def test_page_numbers_remain_the_default(self, authenticated_api_client, account):
+        """Test requests without a cursor keep page numbers and the count"""
+        created = self._create_history(account, 45)
+        url = reverse('transaction-list')
+        
+        data = authenticated_api_client.get(url, {'page': 3}).json()
+        
+        assert data['count'] == 45
+        assert len(data['results']) == 5
+        assert 'page=2' in data['previous']
+        assert data['next'] is None
+        assert authenticated_api_client.get(url, {'count': 'estimate'}).json()['count'] == len(created)
+    
+    def test_invalid_cursor(self, authenticated_api_client, account):
+        """Test a malformed cursor is rejected"""
+        response = authenticated_api_client.get(reverse('transaction-list'), {'cursor': 'not-a-cursor'})
+        
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+    
     @pytest.mark.slow
     def test_create_payment_transaction(self, authenticated_api_client, account):
         """Test creating a payment transaction"""
@@ -295,3 +417,91 @@ class TestCategoryAPI:
         # Verify subcategory relationship
         subcategory = Category.objects.get(name='Fast Food')
         assert subcategory.parent == category
+
+
+@pytest.mark.integration
+@pytest.mark.api
+class TestTransactionBulkAPI:
+    """Test bulk transaction ingestion endpoint"""
+    
+    def test_bulk_create_json_array(self, authenticated_api_client, account, category):
+        """Test creating many transactions from a JSON array"""
+        url = reverse('transaction-bulk-create')
+        rows = [
+            {
+                'account_id': account.id,
+                'amount': f'{i + 1}.50',
+                'description': f'Feed row {i}',
+                'transaction_type': 'debit',
+                'category_id': category.id,
+            }
+            for i in range(25)
+        ]
+        
+        response = authenticated_api_client.post(url, rows, format='json')
+        
+        assert response.status_code == status.HTTP_201_CREATED
+        data = response.json()
+        assert data['created'] == 25
+        assert data['failed'] == 0
+        assert [r['index'] for r in data['results']] == list(range(25))
+        
+        references = {r['reference_number'] for r in data['results']}
+        assert len(references) == 25
+        assert Transaction.objects.filter(account=account, status='pending').count() == 25
+        assert Transaction.objects.get(id=data['results'][3]['id']).amount == Decimal('4.50')
+    
+    def test_bulk_create_ndjson(self, authenticated_api_client, account):
+        """Test creating transactions from an NDJSON body"""
+        url = reverse('transaction-bulk-create')
+        body = '\n'.join(json.dumps({
+            'account_id': account.id,
+            'amount': '10.00',
+            'description': f'NDJSON row {i}',
+            'transaction_type': 'credit',
+            'transaction_date': '2024-01-15T10:00:00Z',
+        }) for i in range(3)) + '\n'
+        
+        response = authenticated_api_client.post(
+            url, body, content_type='application/x-ndjson'
+        )
+        
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response.json()['created'] == 3
+        txn = Transaction.objects.get(description='NDJSON row 0')
+        assert txn.transaction_date.year == 2024
+    
+    def test_bulk_create_partial_failure(self, authenticated_api_client, account, user):
+        """Test invalid rows are reported per row while valid rows are created"""
+        from django.contrib.auth.models import User
+        other_user = User.objects.create_user(username='otheruser', password='password123')
+        other_account = Account.objects.create(
+            user=other_user, name='Other', account_type='checking', account_number='OTHER123'
+        )
+        
+        url = reverse('transaction-bulk-create')
+        rows = [
+            {'account_id': account.id, 'amount': '5.00', 'description': 'Good'},
+            {'account_id': account.id, 'amount': '-5.00', 'description': 'Negative'},
+            {'account_id': other_account.id, 'amount': '5.00', 'description': 'Not mine'},
+            {'account_id': account.id, 'amount': '5000.00', 'description': 'Too much'},
+            {'account_id': account.id, 'amount': '5.00', 'transaction_type': 'refund', 'description': 'Bad type'},
+        ]
+        
+        response = authenticated_api_client.post(url, rows, format='json')
+        
+        assert response.status_code == status.HTTP_207_MULTI_STATUS
+        results = response.json()['results']
+        assert results[0]['success'] is True
+        assert 'amount' in results[1]['errors']
+        assert results[2]['errors'] == {'account_id': 'Account not found'}
+        assert results[3]['errors'] == {'amount': 'Insufficient funds'}
+        assert 'transaction_type' in results[4]['errors']
+        assert not Transaction.objects.filter(account=other_account).exists()
+    
+    def test_bulk_create_rejects_non_list(self, authenticated_api_client):
+        """Test a JSON object body is rejected"""
+        url = reverse('transaction-bulk-create')
+        response = authenticated_api_client.post(url, {'amount': '1.00'}, format='json')
+        
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
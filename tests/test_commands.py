@@ -0,0 +1,217 @@
+"""
+Tests for management commands
+"""
+import pytest
+from datetime import datetime
+from decimal import Decimal
+from io import StringIO
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.utils import timezone
+from transactions.models import (
+    Account, BalanceSnapshot, DailyAccountRollup, LedgerEntry, RollupCoverage, Transaction
+)
+
+
+@pytest.mark.unit
+class TestRebuildRollupsCommand:
+    """Test the rebuild_rollups command"""
+    
+    def test_rebuild_from_scratch(self, account, category):
+        """Test rollups are rebuilt from transactions and coverage is recorded"""
+        day = timezone.make_aware(datetime(2024, 5, 10, 9, 30))
+        for amount in ('5.00', '7.00'):
+            Transaction.objects.create(
+                account=account, amount=Decimal(amount), description='Lunch',
+                transaction_type='debit', category=category, status='completed',
+                transaction_date=day
+            )
+        Transaction.objects.create(
+            account=account, amount=Decimal('99.00'), description='Pending',
+            transaction_type='debit', status='pending', transaction_date=day
+        )
+        
+        # Simulate drift, e.g. from a bulk update that bypassed save()
+        DailyAccountRollup.objects.update(total=Decimal('0.00'))
+        
+        out = StringIO()
+        call_command('rebuild_rollups', stdout=out)
+        
+        bucket = DailyAccountRollup.objects.get(account=account, day=day.date())
+        assert bucket.count == 2
+        assert bucket.total == Decimal('12.00')
+        assert DailyAccountRollup.objects.count() == 1
+        assert RollupCoverage.get_covered_from() == day.date()
+        assert 'Rebuilt 1 rollup rows' in out.getvalue()
+    
+    def test_partial_rebuild_keeps_coverage(self, account):
+        """Test a bounded rebuild does not claim coverage up to today"""
+        call_command('rebuild_rollups', start='2024-01-01', end='2024-01-31', stdout=StringIO())
+        
+        assert RollupCoverage.get_covered_from() is None
+    
+    def test_invalid_dates(self):
+        """Test malformed or inverted ranges are rejected"""
+        with pytest.raises(CommandError):
+            call_command('rebuild_rollups', start='01/01/2024', stdout=StringIO())
+        with pytest.raises(CommandError):
+            call_command('rebuild_rollups', start='2024-02-01', end='2024-01-01', stdout=StringIO())
+
+
+@pytest.mark.unit
+class TestReconcileLedgerCommand:
+    """Test the reconcile_ledger command"""
+    
+    def test_balances_match_ledger(self, account, savings_account):
+        """Test a clean ledger passes in batches, with and without snapshots"""
+        txn = Transaction.objects.create(
+            account=account, amount=Decimal('40.00'), description='Groceries', transaction_type='debit'
+        )
+        txn.complete_transaction()
+        BalanceSnapshot.take(as_of=timezone.now())
+        
+        for extra in ([], ['--full']):
+            out = StringIO()
+            call_command('reconcile_ledger', '--batch-size', '1', '--workers', '1', *extra, stdout=out)
+            assert 'Checked 2 accounts in 2 batches: all balances match' in out.getvalue()
+    
+    def test_reports_mismatched_balance(self, account, savings_account):
+        """Test a balance changed outside the ledger is reported"""
+        Account.objects.filter(pk=account.pk).update(balance=Decimal('1234.00'))
+        
+        err = StringIO()
+        with pytest.raises(CommandError, match='1 accounts do not match'):
+            call_command('reconcile_ledger', '--workers', '1', stderr=err)
+        assert f'Account {account.pk}: balance 1234.00, ledger 1000.00 (difference 234.00)' in err.getvalue()
+        
+        # An adjustment posting brings the ledger back in line
+        LedgerEntry.record({account.pk: Decimal('234.00')}, entry_type='adjustment')
+        call_command('reconcile_ledger', '--workers', '1', stdout=StringIO())
+    
+    @pytest.mark.django_db(transaction=True)
+    def test_parallel_workers(self, user):
+        """Test batches checked on worker threads agree with the serial run"""
+        for i in range(6):
+            Account.objects.create(
+                user=user, name=f'Account {i}', account_type='checking', balance=Decimal('10.00') * i
+            )
+        
+        out = StringIO()
+        call_command('reconcile_ledger', '--batch-size', '2', '--workers', '3', stdout=out)
+        assert 'Checked 6 accounts in 3 batches: all balances match' in out.getvalue()
+
+
+@pytest.mark.unit
+@pytest.mark.django_db(transaction=True)
+class TestBenchmarkRecurringScanCommand:
+    """Test the benchmark_recurring_scan command"""
+    
+    def test_benchmark_reports_both_timings_and_cleans_up(self, settings):
+        """Test a small run times the scan, restores the index and removes its rows"""
+        from django.db import connection
+        from transactions.models import RecurringTransaction
+        settings.DEBUG = True
+        
+        out = StringIO()
+        call_command(
+            'benchmark_recurring_scan', '--rows', '300', '--batch-size', '100', '--repeat', '1',
+            stdout=out
+        )
+        
+        output = out.getvalue()
+        assert 'Seeded 300 recurring transactions' in output
+        assert 'Without index:' in output
+        assert 'With index:' in output
+        assert not RecurringTransaction.objects.exists()
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(
+                cursor, RecurringTransaction._meta.db_table
+            )
+        assert 'recurring_due_idx' in constraints
+    
+    def test_benchmark_refuses_to_run_without_debug(self, settings):
+        """Test the command seeds nothing unless DEBUG is on or production is allowed"""
+        from django.contrib.auth.models import User
+        from transactions.models import RecurringTransaction
+        settings.DEBUG = False
+        
+        with pytest.raises(CommandError, match='--allow-production'):
+            call_command('benchmark_recurring_scan', '--rows', '10', stdout=StringIO())
+        
+        assert not User.objects.filter(username__startswith='recurring-benchmark-').exists()
+        assert not RecurringTransaction.objects.exists()
+
+
+@pytest.mark.unit
+@pytest.mark.django_db
+class TestAuditIndexesCommand:
+    """Test the audit_indexes command"""
+    
+    def test_explains_queries_of_replayed_pages(self, user, account):
+        """Test the user's pages are replayed and their transaction queries explained"""
+        Transaction.objects.create(
+            account=account, amount=Decimal('5.00'), description='Coffee', transaction_type='debit'
+        )
+        
+        out = StringIO()
+        call_command(
+            'audit_indexes', '--user', user.username, '--page', 'transaction_list', '--verbose-plans',
+            stdout=out
+        )
+        
+        output = out.getvalue()
+        assert '/transactions/: 200' in output
+        assert 'FROM "transactions_transaction"' in output
+        assert 'distinct queries on transactions_transaction' in output
+        # The user-scoped page is read in index order
+        assert 'TEMP B-TREE FOR ORDER BY' not in output
+    
+    def test_unknown_user(self):
+        """Test an unknown username is rejected"""
+        with pytest.raises(CommandError):
+            call_command('audit_indexes', '--user', 'nobody', stdout=StringIO())
+    
+    def test_suggest_columns(self):
+        """Test a user join is suggested as a copied column leading the index"""
+        from transactions.management.commands.audit_indexes import join_filters, suggest_columns
+        
+        sql = (
+            'SELECT "transactions_transaction"."id" FROM "transactions_transaction" '
+            'INNER JOIN "transactions_account" ON ("transactions_transaction"."account_id" = "transactions_account"."id") '
+            'WHERE ("transactions_account"."user_id" = %s AND "transactions_transaction"."status" = %s) '
+            'ORDER BY "transactions_transaction"."transaction_date" DESC, "transactions_transaction"."id" DESC'
+        )
+        
+        assert join_filters(sql, 'transactions_transaction') == [('user_id', 'transactions_account')]
+        assert suggest_columns(sql, 'transactions_transaction') == [
+            'user_id', 'status', 'transaction_date', 'id'
+        ]
+    
+    def test_suggest_columns_skips_in_lists(self):
+        """Test an IN list over accounts does not lead an index meant to supply the order"""
+        from transactions.management.commands.audit_indexes import suggest_columns
+        
+        sql = (
+            'SELECT "transactions_transaction"."id" FROM "transactions_transaction" '
+            'WHERE "transactions_transaction"."account_id" IN (...) '
+            'ORDER BY "transactions_transaction"."transaction_date" DESC, "transactions_transaction"."id" DESC'
+        )
+        
+        assert suggest_columns(sql, 'transactions_transaction') == ['transaction_date', 'id']
+    
+    def test_redundant_indexes(self):
+        """Test prefixes of longer indexes and duplicates of unique constraints are reported"""
+        from transactions.management.commands.audit_indexes import redundant_indexes
+        
+        indexes = {
+            'account_idx': ['account_id'],
+            'account_date_idx': ['account_id', 'transaction_date'],
+            'reference_unique': ['reference_number'],
+            'reference_idx': ['reference_number'],
+            'partial_idx': ['account_id'],
+        }
+        
+        assert redundant_indexes(indexes, unique={'reference_unique'}, partial={'partial_idx'}) == [
+            ('account_idx', 'account_date_idx'),
+            ('reference_idx', 'reference_unique'),
+        ]
@@ -4,8 +4,14 @@ Unit tests for models
 import pytest
 from decimal import Decimal
 from django.core.exceptions import ValidationError
-from django.db import IntegrityError
-from transactions.models import Account, Transaction, Category, RecurringTransaction
+from django.db import IntegrityError, connection
+from django.db.models import Sum
+from django.contrib.auth.models import User
+from django.utils import timezone
+from transactions.models import (
+    Account, Transaction, Category, RecurringTransaction, DailyAccountRollup,
+    UserPreferences, LedgerEntry, BalanceSnapshot
+)
 
 
 @pytest.mark.unit
@@ -231,8 +237,221 @@ class TestTransactionModel:
         
         account.refresh_from_db()
         assert account.balance == first_completion_balance
+    
+    
+    def test_completion_with_stale_account_does_not_lose_updates(self, account):
+        """Test two completions holding stale copies of the account both apply"""
+        initial_balance = account.balance
+        
+        first = Transaction.objects.create(
+            account=account, amount=Decimal('10.00'), description='First',
+            transaction_type='credit'
+        )
+        # Loaded separately, so each holds its own (soon stale) Account instance
+        first = Transaction.objects.select_related('account').get(pk=first.pk)
+        second = Transaction.objects.select_related('account').get(pk=Transaction.objects.create(
+            account=account, amount=Decimal('20.00'), description='Second',
+            transaction_type='credit'
+        ).pk)
+        
+        first.complete_transaction()
+        second.complete_transaction()
+        
+        account.refresh_from_db()
+        assert account.balance == initial_balance + Decimal('30.00')
+        assert second.account.balance == account.balance
+    
+    def test_completion_of_already_completed_copy(self, account):
+        """Test a second in-memory copy cannot complete the transaction again"""
+        transaction = Transaction.objects.create(
+            account=account, amount=Decimal('100.00'), description='Deposit',
+            transaction_type='credit'
+        )
+        other_copy = Transaction.objects.get(pk=transaction.pk)
+        
+        transaction.complete_transaction()
+        other_copy.complete_transaction()
+        
+        account.refresh_from_db()
+        assert account.balance == Decimal('1100.00')
+        assert other_copy.status == 'completed'
+    
+    def test_transition_to_respects_state_machine(self, account):
+        """Test status changes are only applied from allowed states"""
+        transaction = Transaction.objects.create(
+            account=account,
+            amount=Decimal('10.00'),
+            description='Card payment',
+            transaction_type='debit'
+        )
+        stale_copy = Transaction.objects.get(pk=transaction.pk)
+        
+        assert transaction.transition_to('failed', metadata={'error': 'Declined'})
+        
+        # The stale copy still thinks it is pending, but the database says no
+        assert not stale_copy.transition_to('processing')
+        transaction.refresh_from_db()
+        assert transaction.status == 'failed'
+        assert transaction.metadata == {'error': 'Declined'}
+        with pytest.raises(ValueError):
+            transaction.transition_to('completed')
+    
+    def test_complete_transaction_refuses_final_status(self, account):
+        """Test a cancelled transaction cannot be completed through a stale copy"""
+        transaction = Transaction.objects.create(
+            account=account,
+            amount=Decimal('10.00'),
+            description='Card payment',
+            transaction_type='debit'
+        )
+        stale_copy = Transaction.objects.get(pk=transaction.pk)
+        assert transaction.transition_to('cancelled')
+        
+        assert stale_copy.complete_transaction() is False
+        assert stale_copy.status == 'cancelled'
+        account.refresh_from_db()
+        assert account.balance == Decimal('1000.00')
+        assert not LedgerEntry.objects.filter(transaction=transaction).exists()
+    
+    def test_owner_is_copied_from_account(self, account, user):
+        """Test saved and bulk-created transactions carry their account's owner"""
+        saved = Transaction.objects.create(
+            account=account, amount=Decimal('1.00'), description='Saved', transaction_type='debit'
+        )
+        bulk = Transaction.objects.bulk_create([
+            Transaction(
+                account_id=account.pk, amount=Decimal('1.00'), description='Bulk',
+                transaction_type='debit', reference_number='BULK000001'
+            )
+        ])
+        assert saved.user_id == bulk[0].user_id == user.pk
+        
+        new_owner = User.objects.create_user(username='new-owner')
+        account = Account.objects.get(pk=account.pk)
+        account.user = new_owner
+        account.save()
+        
+        assert set(Transaction.objects.values_list('user_id', flat=True)) == {new_owner.pk}
+    
+    def test_owner_follows_reassigned_account(self, account, user):
+        """Test moving a transaction to another user's account moves it to that user"""
+        other = User.objects.create_user(username='other-owner')
+        other_account = Account.objects.create(user=other, name='Other', account_type='checking')
+        moved = Transaction.objects.create(
+            account=account, amount=Decimal('1.00'), description='Moved', transaction_type='debit'
+        )
+        updated = Transaction.objects.create(
+            account=account, amount=Decimal('1.00'), description='Updated', transaction_type='debit'
+        )
+        
+        moved = Transaction.objects.get(pk=moved.pk)
+        moved.account = other_account
+        moved.save()
+        Transaction.objects.filter(pk=updated.pk).update(account=other_account.pk)
+        
+        assert Transaction.objects.get(pk=moved.pk).user_id == other.pk
+        assert Transaction.objects.get(pk=updated.pk).user_id == other.pk
+        assert not Transaction.objects.filter(user=user).exists()
+    
+    def test_post_balance_deltas_checks_locked_balance(self, account):
+        """Test funds are checked against the stored balance, not the in-memory one"""
+        Account.objects.filter(pk=account.pk).update(balance=Decimal('5.00'))
+        
+        with pytest.raises(ValueError, match='Insufficient funds'):
+            Account.post_balance_deltas({account.pk: Decimal('-50.00')}, require_funds=[account.pk])
+        
+        account.refresh_from_db()
+        assert account.balance == Decimal('5.00')
 
 
+@pytest.mark.slow
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.skipif(
+    connection.vendor == 'sqlite',
+    reason='SQLite serializes writers, so row locking cannot be exercised'
+)
+class TestConcurrentBalancePosting:
+    """Stress test balance postings from many threads"""
+    
+    def test_parallel_postings_keep_exact_balance(self, user):
+        """Test many concurrent credits, debits and transfers leave the exact expected balances"""
+        from concurrent.futures import ThreadPoolExecutor
+        from django.db import connections
+        
+        hub = Account.objects.create(
+            user=user, name='Hub', account_type='checking',
+            account_number='HUB000001', balance=Decimal('10000.00')
+        )
+        spoke = Account.objects.create(
+            user=user, name='Spoke', account_type='checking',
+            account_number='SPOKE0001', balance=Decimal('10000.00')
+        )
+        
+        specs = []
+        for i in range(50):
+            specs.append(dict(account=hub, transaction_type='credit', amount=Decimal('3.00')))
+            specs.append(dict(account=hub, transaction_type='debit', amount=Decimal('1.00')))
+            # Transfers in both directions exercise lock ordering
+            specs.append(dict(account=hub, to_account=spoke, transaction_type='transfer', amount=Decimal('2.00')))
+            specs.append(dict(account=spoke, to_account=hub, transaction_type='transfer', amount=Decimal('5.00')))
+        
+        ids = [
+            Transaction.objects.create(description=f'Stress {i}', **spec).pk
+            for i, spec in enumerate(specs)
+        ]
+        
+        def complete(pk):
+            try:
+                Transaction.objects.select_related('account', 'to_account').get(pk=pk).complete_transaction()
+            finally:
+                connections.close_all()
+        
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(complete, ids))
+        
+        hub.refresh_from_db()
+        spoke.refresh_from_db()
+        
+        assert hub.balance == Decimal('10000.00') + 50 * (Decimal('3.00') - Decimal('1.00') - Decimal('2.00') + Decimal('5.00'))
+        assert spoke.balance == Decimal('10000.00') + 50 * (Decimal('2.00') - Decimal('5.00'))
+        assert Transaction.objects.filter(status='completed').count() == len(ids)
+    
+    def test_opposite_transfers_through_view_do_not_deadlock(self, user):
+        """Test concurrent A-to-B and B-to-A transfers all succeed with exact balances"""
+        import json
+        from concurrent.futures import ThreadPoolExecutor
+        from django.db import connections
+        from django.test import Client
+        from django.urls import reverse
+        
+        first = Account.objects.create(
+            user=user, name='First', account_type='checking', balance=Decimal('1000.00')
+        )
+        second = Account.objects.create(
+            user=user, name='Second', account_type='checking', balance=Decimal('1000.00')
+        )
+        
+        def transfer(pair):
+            try:
+                client = Client()
+                client.force_login(user)
+                return client.post(
+                    reverse('transfer_funds_ajax'),
+                    json.dumps({'from_account_id': pair[0].pk, 'to_account_id': pair[1].pk, 'amount': '1.00'}),
+                    content_type='application/json'
+                ).status_code
+            finally:
+                connections.close_all()
+        
+        pairs = [(first, second), (second, first)] * 40
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            statuses = list(pool.map(transfer, pairs))
+        
+        assert statuses == [200] * len(pairs)
+        first.refresh_from_db()
+        second.refresh_from_db()
+        assert first.balance == second.balance == Decimal('1000.00')
+
 @pytest.mark.unit
 class TestCategoryModel:
     """Test Category model"""
@@ -287,3 +506,222 @@ class TestRecurringTransactionModel:
         assert recurring.frequency == 'monthly'
         assert recurring.is_active is True
         assert str(recurring) == 'Recurring: Monthly subscription - $50.00 monthly'
+
+
+@pytest.mark.unit
+class TestDailyAccountRollupModel:
+    """Test incremental maintenance of daily rollups"""
+    
+    def _bucket(self, account):
+        return DailyAccountRollup.objects.get(account=account, transaction_type='debit')
+    
+    def test_rollup_tracks_completion(self, account, category):
+        """Test rollups only include completed transactions"""
+        txn = Transaction.objects.create(
+            account=account,
+            amount=Decimal('30.00'),
+            description='Pending purchase',
+            transaction_type='debit',
+            category=category
+        )
+        assert not DailyAccountRollup.objects.exists()
+        
+        txn.status = 'completed'
+        txn.save()
+        
+        bucket = self._bucket(account)
+        assert bucket.count == 1
+        assert bucket.total == Decimal('30.00')
+        assert bucket.category == category
+    
+    def test_rollup_status_change_and_delete(self, account, category):
+        """Test rollups are reversed when a transaction leaves completed or is deleted"""
+        first = Transaction.objects.create(
+            account=account, amount=Decimal('10.00'), description='First',
+            transaction_type='debit', category=category, status='completed'
+        )
+        second = Transaction.objects.create(
+            account=account, amount=Decimal('15.00'), description='Second',
+            transaction_type='debit', category=category, status='completed'
+        )
+        assert self._bucket(account).total == Decimal('25.00')
+        
+        # Reload from the database, as a view would
+        first = Transaction.objects.get(pk=first.pk)
+        first.status = 'cancelled'
+        first.save()
+        
+        bucket = self._bucket(account)
+        assert bucket.count == 1
+        assert bucket.total == Decimal('15.00')
+        
+        second.delete()
+        bucket = self._bucket(account)
+        assert bucket.count == 0
+        assert bucket.total == Decimal('0.00')
+    
+    def test_deleted_category_merges_into_uncategorized_bucket(self, account, category):
+        """Test deleting a category leaves one uncategorized bucket with exact totals"""
+        other = Category.objects.create(name='Dining')
+        for amount, txn_category in (('5.00', category), ('7.00', other), ('3.00', None)):
+            Transaction.objects.create(
+                account=account, amount=Decimal(amount), description='Purchase',
+                transaction_type='debit', category=txn_category, status='completed'
+            )
+        
+        other.delete()
+        Transaction.objects.create(
+            account=account, amount=Decimal('7.00'), description='Purchase',
+            transaction_type='debit', status='completed'
+        )
+        
+        uncategorized = DailyAccountRollup.objects.get(account=account, category__isnull=True)
+        assert uncategorized.count == 3
+        assert uncategorized.total == Decimal('17.00')
+        rollup_total = DailyAccountRollup.objects.aggregate(total=Sum('total'))['total']
+        assert rollup_total == Transaction.objects.filter(status='completed').aggregate(
+            total=Sum('amount')
+        )['total'] == Decimal('22.00')
+    
+    def test_uncategorized_bucket_is_unique(self, account):
+        """Test a second uncategorized bucket for the same key is rejected"""
+        today = timezone.localdate()
+        DailyAccountRollup.objects.create(account=account, day=today, transaction_type='debit')
+        
+        with pytest.raises(IntegrityError):
+            DailyAccountRollup.objects.create(account=account, day=today, transaction_type='debit')
+    
+    def test_rollup_amount_change(self, account):
+        """Test editing a completed transaction moves its contribution"""
+        txn = Transaction.objects.create(
+            account=account, amount=Decimal('10.00'), description='Edit me',
+            transaction_type='debit', status='completed'
+        )
+        txn.amount = Decimal('12.50')
+        txn.save()
+        
+        bucket = self._bucket(account)
+        assert bucket.count == 1
+        assert bucket.total == Decimal('12.50')
+    
+    def test_apply_transactions_bulk(self, account):
+        """Test folding unsaved bulk-created transactions into rollups"""
+        transactions = [
+            Transaction(
+                account=account, amount=Decimal('2.00'), description=f'Bulk {i}',
+                transaction_type='debit', status='completed', reference_number=f'BULK{i}'
+            )
+            for i in range(3)
+        ]
+        Transaction.objects.bulk_create(transactions)
+        DailyAccountRollup.apply_transactions(transactions)
+        
+        bucket = self._bucket(account)
+        assert bucket.count == 3
+        assert bucket.total == Decimal('6.00')
+
+
+@pytest.mark.unit
+class TestLedgerModels:
+    """Test the append-only ledger and balance snapshots"""
+    
+    def test_opening_balance_is_recorded(self, account):
+        """Test a new account with a balance gets a balanced opening posting"""
+        entries = LedgerEntry.objects.filter(entry_type='opening', posting_id__in=LedgerEntry.objects.filter(
+            account=account
+        ).values('posting_id'))
+        
+        assert entries.count() == 2
+        assert entries.aggregate(total=Sum('amount'))['total'] == 0
+        assert account.get_balance_at() == account.balance
+    
+    def test_postings_are_double_entry(self, account, savings_account):
+        """Test every posting writes legs that sum to zero"""
+        transfer = Transaction.objects.create(
+            account=account, to_account=savings_account, amount=Decimal('200.00'),
+            description='Transfer', transaction_type='transfer'
+        )
+        transfer.complete_transaction()
+        deposit = Transaction.objects.create(
+            account=account, amount=Decimal('50.00'), description='Deposit', transaction_type='credit'
+        )
+        deposit.complete_transaction()
+        
+        transfer_legs = LedgerEntry.objects.filter(transaction=transfer)
+        assert sorted(transfer_legs.values_list('account_id', 'amount')) == sorted([
+            (account.id, Decimal('-200.00')), (savings_account.id, Decimal('200.00'))
+        ])
+        assert sorted(LedgerEntry.objects.filter(transaction=deposit).values_list('amount', flat=True)) == [
+            Decimal('-50.00'), Decimal('50.00')
+        ]
+        assert LedgerEntry.objects.aggregate(total=Sum('amount'))['total'] == 0
+        assert account.get_balance_at() == Decimal('850.00')
+        assert savings_account.get_balance_at() == Decimal('5200.00')
+    
+    def test_entries_are_append_only(self, account):
+        """Test ledger entries cannot be changed or deleted"""
+        entry = LedgerEntry.objects.filter(account=account).first()
+        
+        entry.amount = Decimal('1.00')
+        with pytest.raises(ValueError):
+            entry.save()
+        with pytest.raises(ValueError):
+            entry.delete()
+    
+    def test_balance_at_point_in_time_uses_snapshot(self, account, django_assert_num_queries):
+        """Test historic balances start from the latest snapshot before them"""
+        start = timezone.now() - timezone.timedelta(days=10)
+        LedgerEntry.objects.filter(account=account).update(posted_at=start)
+        for days_ago, amount in ((8, Decimal('-100.00')), (5, Decimal('30.00')), (2, Decimal('-10.00'))):
+            LedgerEntry.record({account.id: amount}, posted_at=timezone.now() - timezone.timedelta(days=days_ago))
+        
+        assert BalanceSnapshot.take(as_of=timezone.now() - timezone.timedelta(days=6)) == 1
+        snapshot = BalanceSnapshot.objects.get(account=account)
+        assert snapshot.balance == Decimal('900.00')
+        
+        # Snapshot lookup plus one grouped sum over the entries since
+        with django_assert_num_queries(2):
+            assert account.get_balance_at(timezone.now() - timezone.timedelta(days=3)) == Decimal('930.00')
+        assert account.get_balance_at(timezone.now() - timezone.timedelta(days=7)) == Decimal('900.00')
+        assert account.get_balance_at(timezone.now() - timezone.timedelta(days=9)) == Decimal('1000.00')
+        assert account.get_balance_at() == Decimal('920.00')
+        assert LedgerEntry.balances_at([account.id], use_snapshots=False)[account.id] == Decimal('920.00')
+    
+    def test_take_skips_unchanged_accounts(self, account, savings_account):
+        """Test a second snapshot run only checkpoints accounts with new entries"""
+        as_of = timezone.now()
+        assert BalanceSnapshot.take(as_of=as_of) == 2
+        
+        LedgerEntry.record({account.id: Decimal('5.00')})
+        
+        assert BalanceSnapshot.take(as_of=timezone.now()) == 1
+        latest = BalanceSnapshot.objects.filter(account=account).first()
+        assert latest.balance == Decimal('1005.00')
+
+
+@pytest.mark.unit
+class TestUserPreferencesModel:
+    """Test cached preference loading"""
+    
+    def test_get_for_user_does_not_write(self, user):
+        """Test reading preferences for a new user returns defaults without saving"""
+        preferences = UserPreferences.get_for_user(user)
+        
+        assert preferences.pk is None
+        assert preferences.theme == 'light'
+        assert preferences.default_currency == 'USD'
+        assert not UserPreferences.objects.filter(user=user).exists()
+    
+    def test_get_for_user_is_cached_and_invalidated_on_save(self, user, django_assert_num_queries):
+        """Test preferences are served from cache until saved"""
+        UserPreferences.objects.create(user=user, theme='dark')
+        
+        assert UserPreferences.get_for_user(user).theme == 'dark'
+        with django_assert_num_queries(0):
+            assert UserPreferences.get_for_user(user).theme == 'dark'
+        
+        preferences = UserPreferences.objects.get(user=user)
+        preferences.theme = 'auto'
+        preferences.save()
+        
+        assert UserPreferences.get_for_user(user).theme == 'auto'
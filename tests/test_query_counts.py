@@ -0,0 +1,86 @@
+"""
+Query-count regression tests for list endpoints
+"""
+import pytest
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from transactions.models import Account, Transaction
+
+
+def _create_accounts(user, count, start=0):
+    for i in range(start, start + count):
+        account = Account.objects.create(
+            user=user,
+            name=f'Account {i}',
+            account_type='checking',
+            account_number=f'QC{i:06d}'
+        )
+        Transaction.objects.create(
+            account=account,
+            amount=Decimal('10.00'),
+            description=f'Purchase {i}',
+            transaction_type='debit',
+            status='completed'
+        )
+
+
+def _count_queries(client, url):
+    with CaptureQueriesContext(connection) as ctx:
+        response = client.get(url)
+    assert response.status_code == 200
+    return len(ctx.captured_queries), response
+
+
+@pytest.mark.integration
+class TestListQueryCounts:
+    """List endpoints issue a constant number of queries regardless of page size"""
+    
+    def test_account_api_list(self, authenticated_api_client, user):
+        """Test the accounts API list does not count transactions per account"""
+        url = reverse('account-list')
+        
+        _create_accounts(user, 2)
+        small, _ = _count_queries(authenticated_api_client, url)
+        
+        _create_accounts(user, 10, start=2)
+        large, response = _count_queries(authenticated_api_client, url)
+        
+        assert large == small
+        assert response.json()['count'] == 12
+        assert all(row['transaction_count'] == 1 for row in response.json()['results'])
+    
+    def test_transaction_api_list(self, authenticated_api_client, user):
+        """Test the transactions API list loads related rows in the same query"""
+        url = reverse('transaction-list')
+        
+        _create_accounts(user, 2)
+        small, _ = _count_queries(authenticated_api_client, url)
+        
+        _create_accounts(user, 10, start=2)
+        large, _ = _count_queries(authenticated_api_client, url)
+        
+        assert large == small
+    
+    @pytest.mark.parametrize('url_name', [
+        'admin:transactions_account_changelist',
+        'admin:transactions_transaction_changelist',
+    ])
+    def test_admin_changelists(self, client, user, url_name):
+        """Test admin changelists do not query per row"""
+        User.objects.create_superuser('admin', 'admin@example.com', 'adminpass123')
+        client.login(username='admin', password='adminpass123')
+        url = reverse(url_name)
+        
+        _create_accounts(user, 2)
+        client.get(url)  # warm the admin stats cache
+        small, _ = _count_queries(client, url)
+        
+        _create_accounts(user, 10, start=2)
+        client.get(url)
+        large, response = _count_queries(client, url)
+        
+        assert large == small
+        assert response.context['cl'].result_count >= 12
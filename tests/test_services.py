@@ -1,13 +1,15 @@
 """
 Unit tests for services
 """
+import time
 import pytest
 from unittest.mock import patch, MagicMock
 from decimal import Decimal
 from django.contrib.auth.models import User
 from transactions.models import Account, Transaction, Category
+from transactions.stripe_client import CircuitBreaker, StripeHTTPClient
 from transactions.services import (
-    StripePaymentService, TransactionService, AnalyticsService
+    StripePaymentService, TransactionService, AnalyticsService, AdminStatsService
 )
 
 
@@ -99,6 +101,95 @@ class TestStripePaymentService:
         )
 
 
+@pytest.mark.unit
+class TestStripeHTTPClient:
+    """Test the pooled Stripe transport against a local HTTP server"""
+    
+    def _configure(self, **options):
+        options.setdefault('circuit_breaker', CircuitBreaker(failure_threshold=3, reset_timeout=60))
+        return StripePaymentService.configure(StripeHTTPClient(**options))
+    
+    def test_calls_reuse_one_keep_alive_connection(self, stripe_server):
+        """Test sequential calls share a pooled connection"""
+        self._configure()
+        
+        for _ in range(3):
+            assert StripePaymentService.create_payment_intent(Decimal('10.00'))['success']
+        
+        assert stripe_server.requests == 3
+        assert stripe_server.connections == 1
+    
+    def test_slow_response_times_out(self, stripe_server):
+        """Test a stalled Stripe call gives up after the read timeout"""
+        from transactions.services import PaymentServiceUnavailable
+        self._configure(read_timeout=0.2)
+        stripe_server.delay = 1
+        
+        started = time.monotonic()
+        with pytest.raises(PaymentServiceUnavailable):
+            StripePaymentService.create_payment_intent(Decimal('10.00'))
+        
+        assert time.monotonic() - started < 0.9
+    
+    def test_circuit_opens_after_repeated_failures(self, stripe_server):
+        """Test calls stop reaching Stripe once the failure threshold is hit"""
+        from transactions.services import PaymentServiceUnavailable
+        client = self._configure()
+        stripe_server.status = 500
+        
+        for _ in range(4):
+            with pytest.raises(PaymentServiceUnavailable):
+                StripePaymentService.create_payment_intent(Decimal('10.00'))
+        
+        assert stripe_server.requests == 3
+        assert client.circuit_breaker.state == CircuitBreaker.OPEN
+    
+    def test_concurrency_limit_rejects_excess_calls(self, stripe_server):
+        """Test a call beyond the concurrency cap fails fast instead of queueing"""
+        import threading
+        from transactions.services import PaymentServiceUnavailable
+        self._configure(max_concurrent_requests=1, acquire_timeout=0.1)
+        stripe_server.gate.clear()
+        
+        results = []
+        holder = threading.Thread(target=lambda: results.append(
+            StripePaymentService.create_payment_intent(Decimal('10.00'))
+        ))
+        holder.start()
+        while stripe_server.requests == 0:
+            time.sleep(0.01)
+        
+        with pytest.raises(PaymentServiceUnavailable):
+            StripePaymentService.create_payment_intent(Decimal('10.00'))
+        
+        stripe_server.gate.set()
+        holder.join(5)
+        assert results[0]['success']
+        assert stripe_server.requests == 1
+    
+    def test_circuit_breaker_half_open_probe(self):
+        """Test one probe is let through after the reset timeout"""
+        now = [0.0]
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30, clock=lambda: now[0])
+        breaker.record_failure()
+        assert breaker.allow_request()
+        breaker.record_failure()
+        assert not breaker.allow_request()
+        
+        now[0] = 31
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        assert breaker.allow_request()
+        assert not breaker.allow_request()
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.OPEN
+        
+        now[0] = 62
+        assert breaker.allow_request()
+        breaker.record_success()
+        assert breaker.state == CircuitBreaker.CLOSED
+        assert breaker.allow_request()
+
+
 @pytest.mark.unit
 class TestTransactionService:
     """Test transaction service"""
@@ -184,6 +275,83 @@ class TestTransactionService:
         assert result['success'] is False
         assert result['error'] == 'Card declined'
     
+    @patch('transactions.tasks.process_payment_async.delay')
+    def test_process_payment_uses_idempotency_key(self, mock_delay, account, fake_stripe):
+        """Test the intent is created with a key derived from the transaction reference"""
+        result = TransactionService.process_payment(
+            account=account,
+            amount=Decimal('75.00'),
+            payment_method_id='pm_test_123',
+            description='Online purchase'
+        )
+        
+        txn = Transaction.objects.get(id=result['transaction_id'])
+        (_, call), = fake_stripe.calls
+        assert call['idempotency_key'] == f'payment-intent-{txn.reference_number}'
+        assert call['metadata']['reference_number'] == txn.reference_number
+        assert txn.metadata['payment_intent_id'] == fake_stripe.intents[
+            txn.metadata['payment_intent_id']
+        ].id
+    
+    @pytest.mark.django_db(transaction=True)
+    @patch('transactions.tasks.process_payment_async.delay')
+    def test_process_payment_calls_stripe_outside_transaction(self, mock_delay, account, fake_stripe):
+        """Test the pending transaction is committed before Stripe is called"""
+        from django.db import connection
+        create = fake_stripe.PaymentIntent.create
+        seen = {}
+        
+        def create_outside_transaction(**kwargs):
+            seen['in_atomic_block'] = connection.in_atomic_block
+            seen['status'] = Transaction.objects.get(account=account).status
+            return create(**kwargs)
+        
+        fake_stripe.PaymentIntent.create = create_outside_transaction
+        
+        result = TransactionService.process_payment(
+            account=account,
+            amount=Decimal('75.00'),
+            payment_method_id='pm_test_123',
+            description='Online purchase'
+        )
+        
+        assert seen == {'in_atomic_block': False, 'status': 'pending'}
+        txn = Transaction.objects.get(id=result['transaction_id'])
+        assert txn.status == 'pending'
+        assert txn.metadata['payment_method'] == 'pm_test_123'
+        mock_delay.assert_called_once_with(txn.id, txn.metadata['payment_intent_id'])
+    
+    @patch('transactions.tasks.process_payment_async.delay')
+    def test_process_payment_unavailable_fails_transaction(self, mock_delay, account, fake_stripe):
+        """Test a Stripe outage marks the committed transaction failed"""
+        import stripe
+        fake_stripe.fail_next(stripe.error.APIConnectionError('Connection reset'))
+        
+        result = TransactionService.process_payment(
+            account=account,
+            amount=Decimal('75.00'),
+            payment_method_id='pm_test_123',
+            description='Online purchase'
+        )
+        
+        assert result['success'] is False
+        txn = Transaction.objects.get(id=result['transaction_id'])
+        assert txn.status == 'failed'
+        assert txn.metadata['error'] == 'Connection reset'
+        account.refresh_from_db()
+        assert account.balance == Decimal('1000.00')
+        mock_delay.assert_not_called()
+    
+    def test_transient_stripe_error_raises_unavailable(self, fake_stripe):
+        """Test outages surface as retryable errors rather than failed results"""
+        import stripe
+        from transactions.services import PaymentServiceUnavailable
+        
+        fake_stripe.fail_next(stripe.error.RateLimitError('Too many requests'))
+        
+        with pytest.raises(PaymentServiceUnavailable):
+            StripePaymentService.confirm_payment('pi_test_123')
+    
     def test_transfer_funds_success(self, account, savings_account):
         """Test successful fund transfer"""
         initial_from_balance = account.balance
@@ -353,3 +521,314 @@ class TestAnalyticsService:
         last_month_key = last_month.strftime('%Y-%m')
         assert trends[last_month_key]['spending'] == Decimal('150.00')
         assert trends[last_month_key]['income'] == Decimal('600.00')
+    
+    def test_get_user_overview(self, user, account, savings_account, category):
+        """Test calendar-month series and category totals across all accounts"""
+        from django.utils import timezone
+        from dateutil.relativedelta import relativedelta
+        
+        now = timezone.now()
+        last_month = now.replace(day=1) - relativedelta(months=1)
+        
+        Transaction.objects.create(
+            account=account, amount=Decimal('40.00'), description='Lunch',
+            transaction_type='debit', category=category, status='completed',
+            transaction_date=now
+        )
+        Transaction.objects.create(
+            account=savings_account, amount=Decimal('60.00'), description='Dinner',
+            transaction_type='debit', category=category, status='completed',
+            transaction_date=now
+        )
+        Transaction.objects.create(
+            account=savings_account, amount=Decimal('900.00'), description='Salary',
+            transaction_type='credit', status='completed', transaction_date=last_month
+        )
+        # Pending transactions are ignored
+        Transaction.objects.create(
+            account=account, amount=Decimal('999.00'), description='Pending',
+            transaction_type='debit', status='pending', transaction_date=now
+        )
+        
+        overview = AnalyticsService.get_user_overview(user, months=12)
+        monthly = overview['monthly']
+        
+        assert len(monthly) == 12
+        assert monthly[-1]['month'] == now.strftime('%b %Y')
+        assert monthly[-1]['spending'] == Decimal('100.00')
+        assert monthly[-1]['income'] == Decimal('0.00')
+        assert monthly[-2]['month'] == last_month.strftime('%b %Y')
+        assert monthly[-2]['income'] == Decimal('900.00')
+        assert overview['category_spending'] == {category.name: Decimal('100.00')}
+    
+    def test_get_spending_by_category_many_accounts(self, user, account, savings_account, category):
+        """Test spending breakdown across a user or a list of accounts"""
+        from django.utils import timezone
+        from datetime import timedelta
+        
+        Transaction.objects.create(
+            account=account, amount=Decimal('10.00'), description='Coffee',
+            transaction_type='debit', category=category, status='completed'
+        )
+        Transaction.objects.create(
+            account=savings_account, amount=Decimal('15.00'), description='Snacks',
+            transaction_type='debit', category=category, status='completed'
+        )
+        Transaction.objects.create(
+            account=savings_account, amount=Decimal('5.00'), description='Misc',
+            transaction_type='debit', status='completed'
+        )
+        
+        start_date = timezone.now() - timedelta(days=1)
+        end_date = timezone.now() + timedelta(days=1)
+        
+        by_user = AnalyticsService.get_spending_by_category(user, start_date, end_date)
+        by_list = AnalyticsService.get_spending_by_category(
+            [account, savings_account], start_date, end_date
+        )
+        
+        assert by_user == by_list == {
+            category.name: Decimal('25.00'),
+            'Uncategorized': Decimal('5.00'),
+        }
+        
+        per_account = AnalyticsService.get_spending_by_category_per_account(
+            Account.objects.filter(user=user), start_date, end_date
+        )
+        assert per_account[account.id] == {category.name: Decimal('10.00')}
+        assert per_account[savings_account.id] == {
+            category.name: Decimal('15.00'),
+            'Uncategorized': Decimal('5.00'),
+        }
+    
+    @pytest.mark.slow
+    def test_get_spending_by_category_memory_is_constant(self, account, category):
+        """Benchmark: peak Python memory does not grow with matching row count"""
+        import tracemalloc
+        from django.utils import timezone
+        from datetime import timedelta
+        
+        start_date = timezone.now() - timedelta(days=1)
+        end_date = timezone.now() + timedelta(days=1)
+        
+        def seed(count, offset):
+            Transaction.objects.bulk_create([
+                Transaction(
+                    account=account, amount=Decimal('1.00'), description='Bench',
+                    transaction_type='debit', category=category, status='completed',
+                    reference_number=f'BENCH{offset + i:010d}'
+                )
+                for i in range(count)
+            ])
+        
+        def measure():
+            tracemalloc.start()
+            AnalyticsService.get_spending_by_category(account, start_date, end_date)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            return peak
+        
+        seed(500, 0)
+        small_peak = measure()
+        seed(5000, 500)
+        large_peak = measure()
+        
+        assert AnalyticsService.get_spending_by_category(
+            account, start_date, end_date
+        )[category.name] == Decimal('5500.00')
+        assert large_peak < small_peak * 2
+    
+    def test_get_trends_weekly_and_monthly_with_gaps(self, account, django_assert_num_queries):
+        """Test one grouped query serves weekly and monthly trends with empty periods filled"""
+        from datetime import datetime
+        from django.utils import timezone
+        
+        def at(month, day):
+            return timezone.make_aware(datetime(2024, month, day, 12, 0))
+        
+        Transaction.objects.create(
+            account=account, amount=Decimal('20.00'), description='Groceries',
+            transaction_type='debit', status='completed', transaction_date=at(1, 3)
+        )
+        Transaction.objects.create(
+            account=account, amount=Decimal('300.00'), description='Salary',
+            transaction_type='credit', status='completed', transaction_date=at(1, 4)
+        )
+        Transaction.objects.create(
+            account=account, amount=Decimal('45.00'), description='Fuel',
+            transaction_type='debit', status='completed', transaction_date=at(3, 15)
+        )
+        
+        # One coverage lookup plus one grouped query, whatever the granularities
+        with django_assert_num_queries(2):
+            trends = AnalyticsService.get_trends(
+                account, at(1, 1), at(3, 31), granularities=('week', 'month')
+            )
+        
+        monthly = trends['month']
+        assert list(monthly) == ['2024-01', '2024-02', '2024-03']
+        assert monthly['2024-01'] == {'income': Decimal('300.00'), 'spending': Decimal('20.00')}
+        assert monthly['2024-02'] == {'income': Decimal('0.00'), 'spending': Decimal('0.00')}
+        assert monthly['2024-03']['spending'] == Decimal('45.00')
+        
+        weekly = trends['week']
+        # 2024-01-01 is a Monday; weeks run through the one containing 2024-03-31
+        assert next(iter(weekly)) == '2024-01-01'
+        assert len(weekly) == 13
+        assert weekly['2024-01-01'] == {'income': Decimal('300.00'), 'spending': Decimal('20.00')}
+        assert weekly['2024-03-11']['spending'] == Decimal('45.00')
+    
+    def test_get_trends_invalid_granularity(self, account):
+        """Test unsupported granularity is rejected"""
+        from django.utils import timezone
+        
+        with pytest.raises(ValueError, match='Unsupported granularity'):
+            AnalyticsService.get_trends(
+                account, timezone.now(), timezone.now(), granularities=('hour',)
+            )
+    
+    def test_analytics_read_from_rollups(self, account, category):
+        """Test covered ranges read whole days from rollups and edges from transactions"""
+        from datetime import datetime
+        from django.core.management import call_command
+        from django.utils import timezone
+        from io import StringIO
+        from transactions.models import DailyAccountRollup
+        
+        def at(day, hour):
+            return timezone.make_aware(datetime(2024, 6, day, hour, 0))
+        
+        for day, hour, amount in [(1, 8, '10.00'), (2, 12, '20.00'), (3, 18, '40.00')]:
+            Transaction.objects.create(
+                account=account, amount=Decimal(amount), description='Spend',
+                transaction_type='debit', category=category, status='completed',
+                transaction_date=at(day, hour)
+            )
+        call_command('rebuild_rollups', stdout=StringIO())
+        
+        # Prove whole days come from the rollups: change the stored day total
+        DailyAccountRollup.objects.filter(day=at(2, 0).date()).update(total=Decimal('25.00'))
+        
+        # Jun 1 12:00 -> Jun 3 12:00: Jun 1 and Jun 3 are partial edges, Jun 2 is whole
+        spending = AnalyticsService.get_spending_by_category(account, at(1, 12), at(3, 12))
+        assert spending == {category.name: Decimal('25.00')}
+        
+        spending = AnalyticsService.get_spending_by_category(account, at(1, 0), at(3, 23))
+        assert spending == {category.name: Decimal('75.00')}
+        
+        trends = AnalyticsService.get_trends(account, at(1, 0), at(3, 23), granularities=('day',))
+        assert trends['day']['2024-06-02']['spending'] == Decimal('25.00')
+        assert trends['day']['2024-06-03']['spending'] == Decimal('40.00')
+
+
+@pytest.mark.unit
+class TestAdminStatsService:
+    """Test cached admin statistics"""
+    
+    def test_compute(self, account, transaction):
+        """Test statistics values"""
+        import json
+        
+        stats = AdminStatsService.compute()
+        
+        assert stats['user_count'] == 1
+        assert stats['account_count'] == 1
+        assert stats['transaction_count'] == 1
+        assert stats['total_balance'] == account.balance
+        assert stats['recent_transaction_count'] == 1
+        assert json.loads(stats['monthly_transactions'])[-1] == 1
+        assert json.loads(stats['account_type_labels']) == ['Checking']
+    
+    def test_snapshot_served_from_cache(self, account, django_assert_num_queries):
+        """Test fresh snapshots are served without queries"""
+        first = AdminStatsService.get_snapshot()
+        
+        with django_assert_num_queries(0):
+            second = AdminStatsService.get_snapshot()
+        
+        assert first == second
+    
+    @patch('transactions.tasks.refresh_admin_stats.delay')
+    def test_stale_snapshot_triggers_single_refresh(self, mock_delay, account):
+        """Test stale snapshots are served while one background refresh is queued"""
+        from datetime import timedelta
+        from django.core.cache import cache
+        from django.utils import timezone
+        
+        AdminStatsService.refresh()
+        snapshot = cache.get(AdminStatsService.CACHE_KEY)
+        snapshot['computed_at'] = timezone.now() - timedelta(hours=1)
+        cache.set(AdminStatsService.CACHE_KEY, snapshot)
+        
+        first = AdminStatsService.get_snapshot()
+        AdminStatsService.get_snapshot()
+        
+        assert first == snapshot['stats']
+        mock_delay.assert_called_once_with()
+
+
+@pytest.mark.unit
+class TestTransactionSearch:
+    """Test the transaction search backends"""
+    
+    def _postgres_connection(self):
+        """A PostgreSQL connection object for compiling SQL; it never connects"""
+        from django.db.backends.postgresql.base import DatabaseWrapper
+        from django.db.utils import ConnectionHandler
+        settings_dict = ConnectionHandler({
+            'default': {'ENGINE': 'django.db.backends.postgresql', 'NAME': 'financeapp'}
+        }).settings['default']
+        return DatabaseWrapper(settings_dict, alias='search-sql')
+    
+    def test_terms_are_normalized(self):
+        """Test punctuation is dropped and terms are lowercased"""
+        from transactions.search import get_search_terms
+        
+        assert get_search_terms('  Coffee-Shop  TXN1a! ') == ['coffee', 'shop', 'txn1a']
+        assert get_search_terms(None) == []
+    
+    def test_postgres_backend_uses_prefix_tsquery(self):
+        """Test every term becomes a prefix match on the indexed column, ranked"""
+        from transactions.search import PostgresSearchBackend
+        queryset = PostgresSearchBackend().filter(
+            Transaction.objects.filter(account__user_id=1), ['cof', 'txn1'], rank=True
+        )
+        
+        sql, params = queryset.query.get_compiler(connection=self._postgres_connection()).as_sql()
+        
+        assert '"transactions_transaction"."search_vector") @@ (to_tsquery(' in sql
+        assert 'ts_rank(' in sql
+        assert 'LIKE' not in sql.upper()
+        assert 'cof:* & txn1:*' in params
+    
+    def test_fallback_backend_requires_every_term(self, account):
+        """Test the fallback matches terms in any order across both fields"""
+        from transactions.search import search_transactions
+        match = Transaction.objects.create(
+            account=account, amount=Decimal('4.50'), description='Corner Coffee Shop',
+            transaction_type='debit'
+        )
+        Transaction.objects.create(
+            account=account, amount=Decimal('9.00'), description='Coffee beans',
+            transaction_type='debit'
+        )
+        
+        results = search_transactions(Transaction.objects.all(), 'shop coffee', rank=True)
+        by_reference = search_transactions(Transaction.objects.all(), match.reference_number[:6].lower())
+        
+        assert list(results) == [match]
+        assert match in by_reference
+    
+    def test_postgres_backend_narrows_on_indexed_lexemes(self):
+        """Test cached rows are narrowed with the lexemes the database indexed"""
+        from transactions.search import PostgresSearchBackend
+        backend = PostgresSearchBackend()
+        queryset = backend.with_match_fields(Transaction.objects.filter(account__user_id=1))
+        row = {'description': 'Corner_Coffee', 'reference_number': 'TXN1', 'search_lexemes': ['corner', 'coffee', 'txn1']}
+        
+        sql, _ = queryset.query.get_compiler(connection=self._postgres_connection()).as_sql()
+        
+        assert 'tsvector_to_array("transactions_transaction"."search_vector")' in sql
+        assert backend.MATCH_FIELDS == ('search_lexemes',)
+        assert backend.matches(row, ['cof', 'corn'])
+        assert not backend.matches(row, ['cof', 'shop'])
@@ -4,10 +4,19 @@ Unit tests for Celery tasks
 import pytest
 from unittest.mock import patch, MagicMock
 from decimal import Decimal
+from types import SimpleNamespace
+from django.contrib.auth.models import User
 from django.utils import timezone
-from transactions.models import Account, Transaction, RecurringTransaction, Category
+import stripe
+from transactions.models import (
+    Account, Transaction, RecurringTransaction, Category, MonthlyReport, LedgerEntry,
+    StripeEvent
+)
+from transactions.services import PaymentPending
 from transactions.tasks import (
-    process_payment_async, process_recurring_transactions, generate_monthly_report
+    process_payment_async, process_recurring_transactions, generate_monthly_report,
+    refresh_admin_stats, summarize_recurring_run, generate_monthly_reports,
+    reconcile_pending_payments, process_stripe_events, process_pending_stripe_events
 )
 
 
@@ -106,6 +115,308 @@ class TestProcessPaymentAsyncTask:
         assert result['error'] == 'Unexpected error'
 
 
+@pytest.mark.unit
+class TestProcessPaymentAsyncIdempotency:
+    """Test retries and duplicate deliveries of the payment task against a fake Stripe"""
+    
+    def _pending_payment(self, account, fake_stripe):
+        intent = fake_stripe.PaymentIntent.create(amount=10000, currency='usd')
+        txn = Transaction.objects.create(
+            account=account,
+            amount=Decimal('100.00'),
+            description='Online purchase',
+            transaction_type='debit',
+            status='pending',
+            metadata={'payment_intent_id': intent.id}
+        )
+        return txn, intent
+    
+    def test_duplicate_delivery_posts_once(self, account, fake_stripe):
+        """Test a redelivered task does not debit the account twice"""
+        txn, intent = self._pending_payment(account, fake_stripe)
+        
+        first = process_payment_async(txn.id, intent.id)
+        second = process_payment_async(txn.id, intent.id)
+        
+        assert first == second == {'success': True, 'transaction_id': txn.id}
+        account.refresh_from_db()
+        assert account.balance == Decimal('900.00')
+        assert LedgerEntry.objects.filter(transaction=txn).count() == 2
+        assert fake_stripe.call_count('PaymentIntent.retrieve') == 1
+    
+    def test_concurrent_delivery_is_skipped(self, account, fake_stripe):
+        """Test a delivery arriving while another holds the lock leaves Stripe alone"""
+        from django.core.cache import cache
+        
+        txn, intent = self._pending_payment(account, fake_stripe)
+        cache.add(f'payment-lock:{txn.id}', 'other-worker')
+        
+        result = process_payment_async(txn.id, intent.id)
+        
+        assert result == {'success': False, 'error': 'Payment already being processed'}
+        assert fake_stripe.call_count('PaymentIntent.retrieve') == 0
+        assert cache.get(f'payment-lock:{txn.id}') == 'other-worker'
+    
+    def test_transient_error_is_retried(self, account, fake_stripe):
+        """Test a Stripe outage is retried and the payment then completes"""
+        txn, intent = self._pending_payment(account, fake_stripe)
+        fake_stripe.fail_next(stripe.error.APIConnectionError('Connection reset'), times=2)
+        
+        process_payment_async.apply(args=(txn.id, intent.id))
+        
+        txn.refresh_from_db()
+        assert txn.status == 'completed'
+        assert fake_stripe.call_count('PaymentIntent.retrieve') == 3
+    
+    def test_pending_intent_is_retried_without_failing(self, account, fake_stripe):
+        """Test an intent that is still processing leaves the transaction pending"""
+        txn, intent = self._pending_payment(account, fake_stripe)
+        fake_stripe.set_status(intent.id, 'processing')
+        
+        with pytest.raises(PaymentPending):
+            process_payment_async(txn.id, intent.id)
+        
+        txn.refresh_from_db()
+        assert txn.status == 'pending'
+    
+    def test_declined_intent_stays_pending(self, account, fake_stripe):
+        """Test a declined intent is left pending for the customer's retry"""
+        txn, intent = self._pending_payment(account, fake_stripe)
+        fake_stripe.set_status(intent.id, 'requires_payment_method')
+        
+        result = process_payment_async(txn.id, intent.id)
+        
+        assert result == {'success': False, 'error': 'Awaiting a new payment method'}
+        txn.refresh_from_db()
+        assert txn.status == 'pending'
+    
+    def test_failed_transaction_is_final(self, account, fake_stripe):
+        """Test a late success cannot resurrect a failed transaction"""
+        txn, intent = self._pending_payment(account, fake_stripe)
+        txn.transition_to('failed', metadata={'error': 'Card declined'})
+        
+        result = process_payment_async(txn.id, intent.id)
+        
+        assert result == {'success': False, 'error': 'Card declined'}
+        txn.refresh_from_db()
+        assert txn.status == 'failed'
+        assert fake_stripe.call_count('PaymentIntent.retrieve') == 0
+    
+    
+    def test_cancelled_while_confirming_is_not_completed(self, account, fake_stripe):
+        """Test a cancellation that lands during the Stripe call wins over the late success"""
+        txn, intent = self._pending_payment(account, fake_stripe)
+        
+        def cancel_then_confirm(payment_intent_id):
+            Transaction.objects.get(pk=txn.pk).transition_to('cancelled')
+            return {'success': True, 'status': 'succeeded'}
+        
+        with patch('transactions.tasks.StripePaymentService.confirm_payment', side_effect=cancel_then_confirm):
+            result = process_payment_async(txn.id, intent.id)
+        
+        assert result == {'success': False, 'error': 'Transaction cancelled'}
+        txn.refresh_from_db()
+        assert txn.status == 'cancelled'
+        account.refresh_from_db()
+        assert account.balance == Decimal('1000.00')
+        assert not LedgerEntry.objects.filter(transaction=txn).exists()
+
+
+@pytest.mark.unit
+class TestReconcilePendingPaymentsTask:
+    """Test bulk settlement of pending payments from listed intents"""
+    
+    def _pending(self, account, intents, status='pending'):
+        transactions = [
+            Transaction(
+                account=account,
+                amount=Decimal('1.00'),
+                description='Card payment',
+                transaction_type='debit',
+                status=status,
+                reference_number=f'RECON{i:06d}',
+                metadata={'payment_intent_id': intent.id}
+            )
+            for i, intent in enumerate(intents)
+        ]
+        return Transaction.objects.bulk_create(transactions)
+    
+    def test_settles_pending_payments_in_pages(self, account, fake_stripe):
+        """Test hundreds of payments are settled with a handful of list calls"""
+        succeeded = [fake_stripe.add_intent() for _ in range(250)]
+        canceled = fake_stripe.add_intent(status='canceled')
+        declined = fake_stripe.add_intent(
+            status='requires_payment_method',
+            last_payment_error=SimpleNamespace(message='Your card was declined.')
+        )
+        in_flight = fake_stripe.add_intent(status='processing')
+        fake_stripe.add_intent()  # Someone else's payment
+        self._pending(account, succeeded + [canceled, declined, in_flight])
+        
+        metrics = reconcile_pending_payments()
+        
+        assert metrics['completed'] == 250
+        assert metrics['failed'] == 1
+        assert fake_stripe.call_count('PaymentIntent.list') == 3
+        assert fake_stripe.call_count('PaymentIntent.retrieve') == 0
+        
+        by_intent = {
+            txn.metadata['payment_intent_id']: txn for txn in Transaction.objects.all()
+        }
+        assert by_intent[canceled.id].status == 'failed'
+        assert by_intent[canceled.id].metadata['error'] == 'Payment canceled'
+        # Declined, but the customer may still retry with another card
+        assert by_intent[declined.id].status == 'pending'
+        assert by_intent[in_flight.id].status == 'pending'
+        assert by_intent[succeeded[0].id].external_payment_id == succeeded[0].id
+        
+        account.refresh_from_db()
+        assert account.balance == Decimal('750.00')
+        assert account.get_balance_at() == account.balance
+    
+    def test_long_pending_payment_does_not_relist_old_intents(self, account, fake_stripe):
+        """Test later runs list only new intents and retrieve older pending payments singly"""
+        from transactions.services import PaymentReconciliationService
+        start = timezone.now()
+        hours_ago = int((start - timezone.timedelta(hours=20)).timestamp())
+        declined = fake_stripe.add_intent(status='requires_payment_method', created=hours_ago)
+        for _ in range(500):
+            fake_stripe.add_intent(created=hours_ago)  # Other customers' payments
+        stuck, = self._pending(account, [declined])
+        Transaction.objects.filter(pk=stuck.pk).update(
+            created_at=start - timezone.timedelta(hours=20)
+        )
+        
+        first = PaymentReconciliationService.reconcile(now=start)
+        assert first['pages'] == 6
+        
+        fake_stripe.calls.clear()
+        for run in range(1, 4):
+            run_at = start + timezone.timedelta(minutes=5 * run)
+            created_at = run_at - timezone.timedelta(minutes=1)
+            intent = fake_stripe.add_intent(created=int(created_at.timestamp()))
+            txn = Transaction.objects.create(
+                account=account, amount=Decimal('1.00'), description='Card payment',
+                transaction_type='debit', metadata={'payment_intent_id': intent.id}
+            )
+            Transaction.objects.filter(pk=txn.pk).update(created_at=created_at)
+            
+            metrics = PaymentReconciliationService.reconcile(now=run_at)
+            assert metrics['completed'] == 1
+        
+        # One short list page and one retrieve of the stuck payment per run
+        assert fake_stripe.call_count('PaymentIntent.list') == 3
+        assert fake_stripe.call_count('PaymentIntent.retrieve') == 3
+        assert Transaction.objects.get(pk=stuck.pk).status == 'pending'
+        
+        fake_stripe.set_status(declined.id, 'canceled')
+        metrics = PaymentReconciliationService.reconcile(now=start + timezone.timedelta(minutes=20))
+        assert metrics['failed'] == 1
+        assert Transaction.objects.get(pk=stuck.pk).status == 'failed'
+    
+    def test_no_pending_payments_skips_stripe(self, account, fake_stripe):
+        """Test nothing is requested from Stripe when nothing is pending"""
+        fake_stripe.add_intent()
+        
+        assert reconcile_pending_payments()['pending'] == 0
+        assert fake_stripe.calls == []
+    
+    def test_already_settled_transactions_are_left_alone(self, account, fake_stripe):
+        """Test a payment completed by the per-transaction task is not posted again"""
+        intent = fake_stripe.add_intent()
+        txn, = self._pending(account, [intent])
+        txn.complete_transaction()
+        
+        from transactions.services import PaymentReconciliationService
+        assert PaymentReconciliationService.settle({intent.id: ('completed', '')}) == (0, 0)
+        
+        account.refresh_from_db()
+        assert account.balance == Decimal('999.00')
+
+
+@pytest.mark.unit
+class TestProcessStripeEventsTask:
+    """Test the webhook event consumer"""
+    
+    def _store(self, event):
+        from transactions.services import StripeWebhookService
+        from conftest import sign_stripe_payload
+        import json
+        payload = json.dumps(event)
+        return StripeWebhookService.receive(payload.encode(), sign_stripe_payload(payload))
+    
+    @pytest.fixture(autouse=True)
+    def webhook_secret(self, settings):
+        from conftest import STRIPE_WEBHOOK_SECRET
+        settings.STRIPE_WEBHOOK_SECRET = STRIPE_WEBHOOK_SECRET
+    
+    def test_succeeded_event_completes_payment(self, account):
+        """Test a succeeded event settles the matching pending transaction once"""
+        from conftest import make_stripe_event
+        txn = Transaction.objects.create(
+            account=account, amount=Decimal('100.00'), description='Online purchase',
+            transaction_type='debit', metadata={'payment_intent_id': 'pi_123'}
+        )
+        self._store(make_stripe_event('payment_intent.created', 'pi_123'))
+        self._store(make_stripe_event('payment_intent.succeeded', 'pi_123'))
+        
+        assert process_stripe_events('pi_123') == 2
+        assert process_stripe_events('pi_123') == 0
+        
+        txn.refresh_from_db()
+        account.refresh_from_db()
+        assert txn.status == 'completed'
+        assert account.balance == Decimal('900.00')
+        assert not StripeEvent.objects.filter(processed_at__isnull=True).exists()
+    
+    def test_events_apply_in_stripe_order(self, account):
+        """Test events delivered out of order are applied in the order Stripe created them"""
+        from conftest import make_stripe_event
+        from transactions.services import PaymentReconciliationService
+        
+        now = int(timezone.now().timestamp())
+        self._store(make_stripe_event('payment_intent.succeeded', 'pi_123', created=now))
+        self._store(make_stripe_event('payment_intent.canceled', 'pi_123', created=now - 60))
+        
+        with patch.object(PaymentReconciliationService, 'settle', return_value=(0, 0)) as settle:
+            process_stripe_events('pi_123')
+        
+        assert [c.args[0] for c in settle.call_args_list] == [
+            {'pi_123': ('failed', 'Payment canceled')},
+            {'pi_123': ('completed', '')},
+        ]
+    
+    def test_failed_attempt_then_retry_succeeds(self, account):
+        """Test a declined attempt leaves the payment pending for the customer's retry"""
+        from conftest import make_stripe_event
+        txn = Transaction.objects.create(
+            account=account, amount=Decimal('100.00'), description='Online purchase',
+            transaction_type='debit', metadata={'payment_intent_id': 'pi_123'}
+        )
+        
+        now = int(timezone.now().timestamp())
+        self._store(make_stripe_event(
+            'payment_intent.payment_failed', 'pi_123', created=now - 60,
+            last_payment_error={'message': 'Card declined'}
+        ))
+        process_stripe_events('pi_123')
+        txn.refresh_from_db()
+        assert txn.status == 'pending'
+        
+        self._store(make_stripe_event('payment_intent.succeeded', 'pi_123', created=now))
+        process_stripe_events('pi_123')
+        txn.refresh_from_db()
+        assert txn.status == 'completed'
+    
+    def test_sweep_processes_events_never_enqueued(self, account):
+        """Test the periodic sweep picks up every intent with unprocessed events"""
+        from conftest import make_stripe_event
+        for intent_id in ('pi_1', 'pi_2'):
+            self._store(make_stripe_event('payment_intent.canceled', intent_id))
+        
+        assert process_pending_stripe_events() == 2
+
+
 @pytest.mark.unit
 class TestProcessRecurringTransactionsTask:
     """Test recurring transactions processing task"""
@@ -211,13 +522,93 @@ class TestProcessRecurringTransactionsTask:
         daily.refresh_from_db()
         weekly.refresh_from_db()
         
-        # Daily should be next day
-        expected_daily = base_date + timezone.timedelta(days=1)
+        # Daily was due yesterday and again today, so both periods are caught up
+        expected_daily = base_date + timezone.timedelta(days=2)
         assert daily.next_transaction_date.date() == expected_daily.date()
+        assert Transaction.objects.filter(metadata__recurring_id=daily.id).count() == 2
         
         # Weekly should be next week
         expected_weekly = base_date + timezone.timedelta(weeks=1)
         assert weekly.next_transaction_date.date() == expected_weekly.date()
+    
+    
+    def test_catch_up_missed_periods(self, account, category):
+        """Test every missed period is generated on its scheduled date"""
+        first_due = timezone.now() - timezone.timedelta(weeks=3, days=1)
+        recurring = RecurringTransaction.objects.create(
+            account=account,
+            amount=Decimal('15.00'),
+            description='Weekly box',
+            category=category,
+            frequency='weekly',
+            next_transaction_date=first_due,
+            is_active=True
+        )
+        
+        assert process_recurring_transactions() == 1
+        
+        generated = Transaction.objects.filter(metadata__recurring_id=recurring.id).order_by('transaction_date')
+        assert [txn.transaction_date for txn in generated] == [
+            first_due + timezone.timedelta(weeks=week) for week in range(4)
+        ]
+        assert {txn.status for txn in generated} == {'completed'}
+        
+        account.refresh_from_db()
+        recurring.refresh_from_db()
+        assert account.balance == Decimal('940.00')
+        assert account.get_balance_at() == account.balance
+        assert recurring.next_transaction_date == first_due + timezone.timedelta(weeks=4)
+        
+        # A second run finds nothing due
+        assert process_recurring_transactions() == 0
+    
+    def test_insufficient_funds_records_failure(self, account):
+        """Test periods the account cannot cover are recorded as failed"""
+        recurring = RecurringTransaction.objects.create(
+            account=account,
+            amount=Decimal('600.00'),
+            description='Rent',
+            frequency='monthly',
+            next_transaction_date=timezone.now() - timezone.timedelta(days=40),
+            is_active=True
+        )
+        
+        process_recurring_transactions()
+        
+        statuses = list(Transaction.objects.filter(
+            metadata__recurring_id=recurring.id
+        ).order_by('transaction_date').values_list('status', flat=True))
+        assert statuses == ['completed', 'failed']
+        account.refresh_from_db()
+        assert account.balance == Decimal('400.00')
+    
+    def test_large_runs_fan_out_to_chunks(self, account, settings):
+        """Test due rows beyond one chunk are processed by chord subtasks"""
+        from financeapp.celery import app
+        
+        settings.RECURRING_CHUNK_SIZE = 2
+        for i in range(5):
+            RecurringTransaction.objects.create(
+                account=account,
+                amount=Decimal('1.00'),
+                description=f'Subscription {i}',
+                frequency='monthly',
+                next_transaction_date=timezone.now() - timezone.timedelta(days=1),
+                is_active=True
+            )
+        
+        app.conf.task_always_eager = True
+        try:
+            with patch('transactions.tasks.summarize_recurring_run.run',
+                       wraps=summarize_recurring_run.run) as summarize:
+                assert process_recurring_transactions() == 5
+        finally:
+            app.conf.task_always_eager = False
+        
+        results = summarize.call_args[0][0]
+        assert len(results) == 3
+        assert sum(result['transactions'] for result in results) == 5
+        assert Transaction.objects.filter(status='completed').count() == 5
 
 
 @pytest.mark.unit
@@ -273,3 +664,122 @@ class TestGenerateMonthlyReportTask:
         
         # Should handle gracefully or raise appropriate error
         assert isinstance(result, dict)
+
+
+@pytest.mark.unit
+class TestGenerateMonthlyReportsTask:
+    """Test the month-end report pipeline"""
+    
+    def _spend(self, account, category, amount, when):
+        Transaction.objects.create(
+            account=account, amount=Decimal(amount), description='Spend',
+            transaction_type='debit', category=category, status='completed',
+            transaction_date=when
+        )
+    
+    def test_reports_are_stored_for_every_user(self, user, account, savings_account, category):
+        """Test one run stores a report per user with per-account spending"""
+        other = User.objects.create_user(username='other')
+        other_account = Account.objects.create(user=other, name='Other', account_type='checking')
+        march = timezone.make_aware(timezone.datetime(2024, 3, 15, 12))
+        self._spend(account, category, '30.00', march)
+        self._spend(other_account, category, '5.00', march)
+        self._spend(account, category, '99.00', march + timezone.timedelta(days=30))
+        
+        assert generate_monthly_reports(2024, 3) == 2
+        
+        report = MonthlyReport.objects.get(user=user).data
+        assert report['period'] == '2024-03'
+        spending = {a['account_id']: a['spending_by_category'] for a in report['accounts']}
+        assert spending == {account.id: {category.name: 30.0}, savings_account.id: {}}
+        assert MonthlyReport.objects.get(user=other).data['accounts'][0]['spending_by_category'] == {
+            category.name: 5.0
+        }
+    
+    def test_batch_query_count_is_constant(self, category, django_assert_num_queries):
+        """Test a batch costs the same queries however many users it holds"""
+        from transactions.tasks import generate_monthly_report_batch
+        
+        user_ids = []
+        for i in range(5):
+            owner = User.objects.create_user(username=f'owner{i}')
+            user_ids.append(owner.pk)
+            for name in ('Checking', 'Savings'):
+                Account.objects.create(user=owner, name=name, account_type='checking')
+        
+        # Accounts, spending (one grouped query per uncovered range), upsert
+        with django_assert_num_queries(4):
+            assert generate_monthly_report_batch(user_ids[:1], 2024, 3) == 1
+        with django_assert_num_queries(4):
+            assert generate_monthly_report_batch(user_ids, 2024, 3) == 5
+    
+    def test_many_users_fan_out_to_batches(self, settings):
+        """Test users beyond one batch are handed to subtasks"""
+        settings.MONTHLY_REPORT_BATCH_SIZE = 2
+        for i in range(5):
+            User.objects.create_user(username=f'user{i}')
+        
+        with patch('transactions.tasks.group') as mock_group:
+            assert generate_monthly_reports(2024, 3) == 5
+        
+        batches = [signature.args[0] for signature in mock_group.call_args[0][0]]
+        assert [len(batch) for batch in batches] == [2, 2, 1]
+        mock_group.return_value.apply_async.assert_called_once()
+        assert not MonthlyReport.objects.exists()
+    
+    def test_repeat_fetch_reads_stored_report(self, user, account, django_assert_num_queries):
+        """Test generate_monthly_report serves a stored report without recomputing"""
+        first = generate_monthly_report(user.id, 2024, 3)
+        MonthlyReport.objects.filter(user=user).update(data={**first, 'stored': True})
+        
+        # User lookup and report read
+        with django_assert_num_queries(2):
+            assert generate_monthly_report(user.id, 2024, 3)['stored'] is True
+
+
+@pytest.mark.unit
+class TestRefreshAdminStatsTask:
+    """Test admin stats refresh task"""
+    
+    def test_refresh_admin_stats_populates_cache(self, account):
+        """Test the task stores a fresh snapshot in the cache"""
+        from django.core.cache import cache
+        from transactions.services import AdminStatsService
+        
+        stats = refresh_admin_stats()
+        
+        assert stats['account_count'] == 1
+        assert cache.get(AdminStatsService.CACHE_KEY)['stats'] == stats
+
+
+@pytest.mark.unit
+class TestWorkerCacheCheck:
+    """Test workers refuse to start without a cache shared across processes"""
+    
+    def test_local_memory_cache_is_rejected(self):
+        """Test the per-process cache cannot back the payment lock"""
+        from django.core.exceptions import ImproperlyConfigured
+        from django.test import override_settings
+        from financeapp.celery import require_shared_cache
+        
+        # The test cache is local memory
+        with pytest.raises(ImproperlyConfigured):
+            require_shared_cache()
+        
+        with override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': 'redis://redis:6379/2',
+        }}):
+            require_shared_cache()
+    
+    def test_cache_defaults_to_broker_redis(self, monkeypatch):
+        """Test the project cache shares the broker's Redis server on its own database"""
+        import importlib
+        from financeapp import settings as project_settings
+        monkeypatch.delenv('CACHE_REDIS_URL', raising=False)
+        
+        # Re-reading the module leaves the configured django.conf.settings alone
+        project_settings = importlib.reload(project_settings)
+        
+        assert project_settings.CACHE_REDIS_URL == 'redis://redis:6379/2'
+        assert project_settings.CACHES['default']['BACKEND'].endswith('RedisCache')
@@ -6,7 +6,8 @@ import json
 from decimal import Decimal
 from django.urls import reverse
 from django.contrib.auth.models import User
-from transactions.models import Account, Transaction, Category
+from unittest.mock import patch
+from transactions.models import Account, BalanceSnapshot, Category, LedgerEntry, StripeEvent, Transaction
 
 
 @pytest.mark.integration
@@ -82,6 +83,114 @@ class TestAccountDetailView:
         
         assert response.status_code == 404
     
+    def _create_history(self, account, savings_account, count, start=None, step=None):
+        """Create ``count`` rows ``step`` apart and post the completed ones at their dates"""
+        from django.utils import timezone
+        start = start or timezone.now() - timezone.timedelta(days=1)
+        step = step or timezone.timedelta(minutes=1)
+        # The accounts were opened before their history
+        LedgerEntry.objects.filter(entry_type='opening').update(posted_at=start - timezone.timedelta(days=1))
+        rows = []
+        for i in range(count):
+            if i % 10 == 3:
+                # Incoming transfer from another account
+                txn_fields = {'account': savings_account, 'to_account': account, 'transaction_type': 'transfer'}
+            else:
+                txn_fields = {'account': account, 'transaction_type': 'credit' if i % 4 == 0 else 'debit'}
+            txn = Transaction.objects.create(
+                amount=Decimal(i + 1),
+                description=f'Row {i}',
+                status='pending' if i % 7 == 5 else 'completed',
+                transaction_date=start + step * i,
+                **txn_fields
+            )
+            if txn.status == 'completed':
+                Account.post_balance_deltas(txn.get_balance_deltas(), record_ledger=False)
+                LedgerEntry.record(txn.get_balance_deltas(), transaction=txn, posted_at=txn.transaction_date)
+            rows.append(txn)
+        
+        def signed(txn):
+            if txn.status != 'completed':
+                return Decimal('0')
+            return txn.amount if txn.transaction_type == 'credit' or txn.to_account_id == account.id else -txn.amount
+        
+        account.refresh_from_db()
+        
+        expected, balance = {}, account.balance
+        for txn in reversed(rows):
+            expected[txn.id] = balance
+            balance -= signed(txn)
+        return rows, expected
+    
+    def test_full_history_with_running_balance(self, authenticated_client, account, savings_account):
+        """Test every page is reachable and carries the balance after each row"""
+        rows, expected = self._create_history(account, savings_account, 60)
+        url = reverse('account_detail', kwargs={'account_id': account.id})
+        
+        response = authenticated_client.get(url)
+        pages = [response.context['transactions']]
+        while pages[-1].has_next:
+            response = authenticated_client.get(url, {'cursor': pages[-1].next_cursor})
+            pages.append(response.context['transactions'])
+        
+        seen = [(t.id, t.running_balance) for page in pages for t in page]
+        assert [len(page) for page in pages] == [25, 25, 10]
+        assert [pk for pk, _ in seen] == [t.id for t in reversed(rows)]
+        assert all(balance == expected[pk] for pk, balance in seen)
+        assert seen[0][1] == account.balance
+        
+        response = authenticated_client.get(url, {'cursor': pages[-1].previous_cursor})
+        backwards = response.context['transactions']
+        assert [(t.id, t.running_balance) for t in backwards] == seen[25:50]
+    
+    def test_deep_pages_anchor_on_balance_snapshots(self, account, savings_account, django_assert_max_num_queries):
+        """Test a deep page reads its balance from a snapshot and an index range per branch"""
+        from transactions.services import AccountHistoryService
+        rows, expected = self._create_history(account, savings_account, 60)
+        BalanceSnapshot.take(as_of=rows[5].transaction_date)
+        
+        page = AccountHistoryService.get_page(account)
+        while page.has_next:
+            cursor = page.next_cursor
+            page = AccountHistoryService.get_page(account, cursor)
+        
+        # Two branch pages, the snapshot lookup, the entries since it and the date ties
+        with django_assert_max_num_queries(5):
+            page = AccountHistoryService.get_page(account, cursor)
+        assert [(t.id, t.running_balance) for t in page] == [(t.id, expected[t.id]) for t in reversed(rows[:10])]
+    
+    def test_date_range_filter(self, authenticated_client, account, savings_account):
+        """Test filtering by date keeps balances anchored to the full history"""
+        from django.utils import timezone
+        rows, expected = self._create_history(
+            account, savings_account, 30,
+            start=timezone.now() - timezone.timedelta(days=30), step=timezone.timedelta(days=1)
+        )
+        day = (timezone.localtime() - timezone.timedelta(days=20)).date()
+        url = reverse('account_detail', kwargs={'account_id': account.id})
+        
+        response = authenticated_client.get(url, {'from': day.isoformat(), 'to': day.isoformat()})
+        
+        page = list(response.context['transactions'])
+        assert [t.id for t in page] == [rows[10].id]
+        assert page[0].running_balance == expected[rows[10].id]
+        assert response.context['filter_query'] == f'from={day.isoformat()}&to={day.isoformat()}'
+    
+    def test_two_leg_transfer_listed_once(self, authenticated_client, account, savings_account):
+        """Test the receiving account lists a two-leg transfer through its credit leg only"""
+        response = authenticated_client.post(
+            reverse('transfer_funds_ajax'),
+            json.dumps({'from_account_id': account.id, 'to_account_id': savings_account.id, 'amount': '50.00'}),
+            content_type='application/json'
+        )
+        assert response.status_code == 200
+        
+        response = authenticated_client.get(reverse('account_detail', kwargs={'account_id': savings_account.id}))
+        
+        page = list(response.context['transactions'])
+        assert [t.transaction_type for t in page] == ['credit']
+        assert page[0].running_balance == savings_account.balance + Decimal('50.00')
+    
     def test_account_detail_nonexistent(self, authenticated_client):
         """Test accessing non-existent account"""
         url = reverse('account_detail', kwargs={'account_id': 99999})
@@ -90,6 +199,54 @@ class TestAccountDetailView:
         assert response.status_code == 404
 
 
+@pytest.mark.integration
+class TestTransactionListView:
+    """Test the keyset-paginated transaction list"""
+    
+    def test_cursor_pages_keep_filters(self, authenticated_client, account, savings_account):
+        """Test the older-page link carries the filters and continues where the page ended"""
+        from django.utils import timezone
+        now = timezone.now()
+        for i in range(30):
+            Transaction.objects.create(
+                account=account, amount=Decimal('1.00'), description=f'Purchase {i}',
+                transaction_type='debit', transaction_date=now - timezone.timedelta(minutes=i)
+            )
+        Transaction.objects.create(
+            account=savings_account, amount=Decimal('1.00'), description='Savings deposit',
+            transaction_type='credit'
+        )
+        
+        response = authenticated_client.get(reverse('transaction_list'), {'account': account.id})
+        page = response.context['transactions']
+        assert [t.description for t in page] == [f'Purchase {i}' for i in range(25)]
+        assert not page.has_previous
+        assert f'?account={account.id}&cursor={page.next_cursor}' in response.content.decode()
+        
+        response = authenticated_client.get(
+            reverse('transaction_list'), {'account': account.id, 'cursor': page.next_cursor}
+        )
+        page = response.context['transactions']
+        assert [t.description for t in page] == [f'Purchase {i}' for i in range(25, 30)]
+        assert page.has_previous and not page.has_next
+    
+    def test_invalid_cursor_shows_first_page(self, authenticated_client, transaction):
+        """Test a mangled cursor falls back to the newest transactions"""
+        response = authenticated_client.get(reverse('transaction_list'), {'cursor': '%%%'})
+        
+        assert response.status_code == 200
+        assert list(response.context['transactions']) == [transaction]
+    
+    def test_invalid_account_filter_is_ignored(self, authenticated_client, transaction):
+        """Test an account id that is not a number lists every transaction instead of failing"""
+        for value in ('abc', '1.5', '99999999999999999999'):
+            response = authenticated_client.get(reverse('transaction_list'), {'account': value})
+            
+            assert response.status_code == 200
+            assert list(response.context['transactions']) == [transaction]
+            assert response.context['current_filters']['account'] is None
+
+
 @pytest.mark.integration
 class TestTransactionSearchView:
     """Test transaction search AJAX endpoint"""
@@ -166,6 +323,48 @@ class TestTransactionSearchView:
         data = response.json()
         
         assert len(data['transactions']) == 0
+    
+    
+    def _typeahead(self, client, query):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.get(reverse('transaction_search'), {'q': query, 'typeahead': '1'})
+        transaction_queries = [q for q in ctx.captured_queries if 'transactions_transaction' in q['sql']]
+        return response.json()['transactions'], transaction_queries
+    
+    def test_typeahead_narrows_cached_prefix_in_memory(self, authenticated_client, account):
+        """Test longer prefixes are answered from the cached shorter prefix"""
+        for description in ('Coffee shop', 'Cola vending', 'Grocery store'):
+            Transaction.objects.create(
+                account=account, amount=Decimal('5.00'), description=description,
+                transaction_type='debit'
+            )
+        
+        rows, queries = self._typeahead(authenticated_client, 'co')
+        assert {row['description'] for row in rows} == {'Coffee shop', 'Cola vending'}
+        assert len(queries) == 1
+        
+        rows, queries = self._typeahead(authenticated_client, 'COF ')
+        assert [row['description'] for row in rows] == ['Coffee shop']
+        assert set(rows[0]) == {
+            'id', 'description', 'amount', 'transaction_type', 'status', 'date', 'account', 'category'
+        }
+        assert queries == []
+    
+    def test_typeahead_cache_invalidated_by_writes(self, authenticated_client, account):
+        """Test a new transaction shows up in the next typeahead response"""
+        rows, _ = self._typeahead(authenticated_client, 'coffee')
+        assert rows == []
+        
+        Transaction.objects.create(
+            account=account, amount=Decimal('5.00'), description='Coffee shop',
+            transaction_type='debit'
+        )
+        
+        rows, queries = self._typeahead(authenticated_client, 'coffee')
+        assert [row['description'] for row in rows] == ['Coffee shop']
+        assert len(queries) == 1
 
 
 @pytest.mark.integration
@@ -350,3 +549,402 @@ class TestQuickTransactionView:
         )
         
         assert response.status_code == 302  # Redirect to login
+
+
+@pytest.mark.integration
+class TestTransactionStatusViews:
+    """Test the AJAX endpoints that complete and cancel transactions"""
+    
+    def _pending_debit(self, account):
+        return Transaction.objects.create(
+            account=account, amount=Decimal('40.00'), description='Card payment',
+            transaction_type='debit'
+        )
+    
+    def test_complete_posts_balance(self, authenticated_client, account):
+        """Test completing through the endpoint debits the account"""
+        transaction = self._pending_debit(account)
+        
+        response = authenticated_client.post(reverse('transaction_complete_ajax', args=[transaction.id]))
+        
+        assert response.status_code == 200
+        assert response.json()['new_status'] == 'completed'
+        account.refresh_from_db()
+        assert account.balance == Decimal('960.00')
+    
+    def test_cancel_refuses_completed_transaction(self, authenticated_client, account):
+        """Test a transaction completed after it was listed cannot be cancelled"""
+        transaction = self._pending_debit(account)
+        Transaction.objects.get(pk=transaction.pk).complete_transaction()
+        
+        response = authenticated_client.post(reverse('transaction_cancel_ajax', args=[transaction.id]))
+        
+        assert response.status_code == 404
+        transaction.refresh_from_db()
+        assert transaction.status == 'completed'
+    
+    def test_cancel_pending_transaction(self, authenticated_client, account):
+        """Test a pending transaction is cancelled without touching the balance"""
+        transaction = self._pending_debit(account)
+        
+        response = authenticated_client.post(reverse('transaction_cancel_ajax', args=[transaction.id]))
+        
+        assert response.status_code == 200
+        transaction.refresh_from_db()
+        assert transaction.status == 'cancelled'
+        account.refresh_from_db()
+        assert account.balance == Decimal('1000.00')
+
+
+@pytest.mark.integration
+class TestTransferFundsView:
+    """Test the transfer funds AJAX endpoint"""
+    
+    def _transfer(self, client, from_account, to_account, amount):
+        return client.post(
+            reverse('transfer_funds_ajax'),
+            json.dumps({
+                'from_account_id': from_account.id,
+                'to_account_id': to_account.id,
+                'amount': amount,
+            }),
+            content_type='application/json'
+        )
+    
+    def test_transfer_updates_balances_and_ledger(self, authenticated_client, account, savings_account):
+        """Test a transfer moves money between the accounts and posts to the ledger"""
+        response = self._transfer(authenticated_client, account, savings_account, '250.00')
+        
+        assert response.status_code == 200
+        assert response.json()['from_balance'] == '750.00'
+        assert response.json()['to_balance'] == '5250.00'
+        
+        account.refresh_from_db()
+        savings_account.refresh_from_db()
+        assert account.balance == Decimal('750.00')
+        assert savings_account.balance == Decimal('5250.00')
+        assert account.get_balance_at() == account.balance
+        assert savings_account.get_balance_at() == savings_account.balance
+        assert set(Transaction.objects.values_list('status', flat=True)) == {'completed'}
+    
+    def test_transfer_insufficient_balance(self, authenticated_client, account, savings_account):
+        """Test an overdraft is rejected without creating transactions"""
+        response = self._transfer(authenticated_client, account, savings_account, '5000.00')
+        
+        assert response.status_code == 400
+        assert response.json()['error'] == 'Insufficient balance'
+        assert not Transaction.objects.exists()
+        account.refresh_from_db()
+        assert account.balance == Decimal('1000.00')
+
+
+@pytest.mark.integration
+class TestTransactionExportView:
+    """Test streaming CSV export"""
+    
+    def _read_rows(self, response):
+        import csv
+        content = b''.join(response.streaming_content).decode()
+        return list(csv.reader(content.splitlines()))
+    
+    def test_export_csv_streams_rows(self, authenticated_client, account, transaction):
+        """Test CSV export is streamed with a header and one row per transaction"""
+        url = reverse('transaction_export')
+        response = authenticated_client.get(url, {'format': 'csv'})
+        
+        assert response.status_code == 200
+        assert response.streaming
+        assert response['Content-Type'] == 'text/csv'
+        
+        rows = self._read_rows(response)
+        assert rows[0][0] == 'Date'
+        assert len(rows) == 2
+        assert rows[1][1] == transaction.reference_number
+        assert rows[1][3] == account.name
+        assert rows[1][4] == transaction.category.name
+        assert rows[1][5] == '-50.00'
+        assert rows[1][6] == 'Debit'
+        assert rows[1][7] == 'Completed'
+    
+    def test_export_csv_account_filter(self, authenticated_client, account, savings_account):
+        """Test CSV export filtered by account"""
+        Transaction.objects.create(
+            account=account,
+            amount=Decimal('10.00'),
+            description='Checking row',
+            transaction_type='debit'
+        )
+        Transaction.objects.create(
+            account=savings_account,
+            amount=Decimal('20.00'),
+            description='Savings row',
+            transaction_type='credit'
+        )
+        
+        url = reverse('transaction_export')
+        response = authenticated_client.get(url, {'format': 'csv', 'account': savings_account.id})
+        
+        rows = self._read_rows(response)
+        assert len(rows) == 2
+        assert rows[1][2] == 'Savings row'
+        assert rows[1][5] == '+20.00'
+    
+    def test_export_csv_date_range(self, authenticated_client, account):
+        """Test CSV export filtered by inclusive date range"""
+        from datetime import datetime
+        from django.utils import timezone
+        
+        for day, description in [(1, 'Before'), (10, 'Inside'), (20, 'After')]:
+            Transaction.objects.create(
+                account=account,
+                amount=Decimal('5.00'),
+                description=description,
+                transaction_type='debit',
+                transaction_date=timezone.make_aware(datetime(2024, 3, day, 12, 0))
+            )
+        
+        url = reverse('transaction_export')
+        response = authenticated_client.get(url, {
+            'format': 'csv',
+            'start_date': '2024-03-05',
+            'end_date': '2024-03-10',
+        })
+        
+        rows = self._read_rows(response)
+        assert [row[2] for row in rows[1:]] == ['Inside']
+    
+    def test_export_csv_invalid_date(self, authenticated_client):
+        """Test CSV export rejects malformed dates"""
+        url = reverse('transaction_export')
+        response = authenticated_client.get(url, {'format': 'csv', 'start_date': 'yesterday'})
+        
+        assert response.status_code == 400
+
+
+@pytest.mark.integration
+class TestAnalyticsView:
+    """Test analytics dashboard view"""
+    
+    def test_analytics_query_count_independent_of_accounts(self, authenticated_client, user):
+        """Test analytics page does not issue per-month or per-account queries"""
+        from django.core.cache import cache
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        
+        url = reverse('analytics')
+        
+        def count_queries():
+            cache.clear()
+            with CaptureQueriesContext(connection) as ctx:
+                response = authenticated_client.get(url)
+            assert response.status_code == 200
+            return len(ctx.captured_queries), response
+        
+        Account.objects.create(
+            user=user, name='Account 0', account_type='checking', account_number='ACCT00000'
+        )
+        baseline, _ = count_queries()
+        
+        for i in range(1, 6):
+            Account.objects.create(
+                user=user,
+                name=f'Account {i}',
+                account_type='checking',
+                account_number=f'ACCT{i:05d}'
+            )
+        
+        queries, response = count_queries()
+        
+        assert queries == baseline
+        monthly_data = json.loads(response.context['monthly_data'])
+        assert len(monthly_data) == 12
+
+
+@pytest.mark.integration
+class TestUserPreferencesLoading:
+    """Test preferences are read once per request without writes"""
+    
+    def test_dashboard_loads_preferences_once_without_writes(self, authenticated_client, account):
+        """Test rendering a page performs at most one preferences read and no insert"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        
+        with CaptureQueriesContext(connection) as ctx:
+            response = authenticated_client.get(reverse('dashboard'))
+        
+        assert response.status_code == 200
+        preference_queries = [
+            q['sql'] for q in ctx.captured_queries if 'transactions_userpreferences' in q['sql']
+        ]
+        assert len(preference_queries) == 1
+        assert preference_queries[0].startswith('SELECT')
+
+
+@pytest.mark.integration
+class TestCachedPages:
+    """Test per-user caching of read-mostly pages"""
+    
+    @pytest.mark.parametrize('url_name', ['dashboard', 'account_list', 'analytics', 'profile'])
+    def test_repeat_view_skips_page_queries(self, authenticated_client, account, transaction, url_name):
+        """Test a repeat page view issues no account or transaction queries"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        
+        url = reverse(url_name)
+        authenticated_client.get(url)
+        
+        with CaptureQueriesContext(connection) as ctx:
+            response = authenticated_client.get(url)
+        
+        assert response.status_code == 200
+        assert not [
+            q for q in ctx.captured_queries
+            if 'transactions_account' in q['sql'] or 'transactions_transaction' in q['sql']
+        ]
+    
+    def test_write_invalidates_cached_page(self, authenticated_client, account):
+        """Test creating a transaction invalidates the user's cached pages"""
+        url = reverse('dashboard')
+        response = authenticated_client.get(url)
+        assert len(response.context['recent_transactions']) == 0
+        
+        Transaction.objects.create(
+            account=account,
+            amount=Decimal('12.00'),
+            description='New purchase',
+            transaction_type='debit'
+        )
+        
+        response = authenticated_client.get(url)
+        assert len(response.context['recent_transactions']) == 1
+    
+    def test_cache_is_per_user(self, authenticated_client, client, account):
+        """Test one user's cached page is never served to another"""
+        other_user = User.objects.create_user(username='otheruser', password='password123')
+        Account.objects.create(
+            user=other_user, name='Other Account', account_type='checking', account_number='OTHER123'
+        )
+        
+        authenticated_client.get(reverse('account_list'))
+        
+        client.login(username='otheruser', password='password123')
+        response = client.get(reverse('account_list'))
+        
+        assert [a.name for a in response.context['accounts']] == ['Other Account']
+
+
+@pytest.mark.integration
+class TestStripeWebhookView:
+    """Test the Stripe webhook endpoint"""
+    
+    @pytest.fixture(autouse=True)
+    def webhook_secret(self, settings):
+        from conftest import STRIPE_WEBHOOK_SECRET
+        settings.STRIPE_WEBHOOK_SECRET = STRIPE_WEBHOOK_SECRET
+    
+    def _post(self, client, event, signature=None):
+        from conftest import sign_stripe_payload
+        payload = json.dumps(event)
+        return client.post(
+            reverse('stripe_webhook'),
+            payload,
+            content_type='application/json',
+            HTTP_STRIPE_SIGNATURE=signature or sign_stripe_payload(payload)
+        )
+    
+    @patch('transactions.webhooks.process_stripe_events.delay')
+    def test_signed_event_is_stored_and_enqueued(self, mock_delay, client,
+                                                 django_assert_num_queries,
+                                                 django_capture_on_commit_callbacks):
+        """Test a valid delivery is stored with one insert and handed to Celery"""
+        from conftest import make_stripe_event
+        event = make_stripe_event('payment_intent.succeeded', 'pi_123')
+        
+        with django_capture_on_commit_callbacks(execute=True):
+            with django_assert_num_queries(1):
+                response = self._post(client, event)
+        
+        assert response.status_code == 200
+        stored = StripeEvent.objects.get()
+        assert stored.event_id == event['id']
+        assert stored.payment_intent_id == 'pi_123'
+        assert stored.payload == event
+        assert stored.processed_at is None
+        mock_delay.assert_called_once_with('pi_123')
+    
+    @patch('transactions.webhooks.process_stripe_events.delay')
+    def test_redelivery_is_stored_once(self, mock_delay, client):
+        """Test Stripe retrying a delivery does not duplicate the event"""
+        from conftest import make_stripe_event
+        event = make_stripe_event('payment_intent.succeeded', 'pi_123')
+        
+        assert self._post(client, event).status_code == 200
+        assert self._post(client, event).status_code == 200
+        assert StripeEvent.objects.count() == 1
+    
+    def test_bad_signature_is_rejected(self, client):
+        """Test events signed with another secret are not stored"""
+        from conftest import make_stripe_event, sign_stripe_payload
+        event = make_stripe_event('payment_intent.succeeded', 'pi_123')
+        
+        response = self._post(client, event, sign_stripe_payload(json.dumps(event), 'whsec_other'))
+        
+        assert response.status_code == 400
+        assert not StripeEvent.objects.exists()
+    
+    def test_stale_signature_is_rejected(self, client):
+        """Test replays outside the signature tolerance are not stored"""
+        import time
+        from conftest import make_stripe_event, sign_stripe_payload
+        event = make_stripe_event('payment_intent.succeeded', 'pi_123')
+        
+        signature = sign_stripe_payload(json.dumps(event), timestamp=int(time.time()) - 3600)
+        
+        assert self._post(client, event, signature).status_code == 400
+
+
+@pytest.mark.integration
+class TestTransactionAdminActions:
+    """Test the transaction admin's bulk status actions"""
+    
+    def _run(self, action, *transactions):
+        from django.contrib.admin.sites import site
+        admin = site._registry[Transaction]
+        with patch.object(admin, 'message_user'):
+            getattr(admin, action)(None, Transaction.objects.filter(pk__in=[t.pk for t in transactions]))
+    
+    def test_mark_as_completed_posts_balance_and_ledger(self, account):
+        """Test completing from the admin posts like any completion and skips final states"""
+        pending = Transaction.objects.create(
+            account=account, amount=Decimal('40.00'), description='Pending', transaction_type='debit'
+        )
+        failed = Transaction.objects.create(
+            account=account, amount=Decimal('60.00'), description='Failed', transaction_type='debit',
+            status='failed'
+        )
+        
+        self._run('mark_as_completed', pending, failed)
+        
+        account.refresh_from_db()
+        assert account.balance == Decimal('960.00')
+        assert LedgerEntry.objects.filter(transaction=pending).exists()
+        assert Transaction.objects.get(pk=failed.pk).status == 'failed'
+        assert account.get_balance_at() == account.balance
+    
+    def test_mark_as_failed_leaves_completed_transactions(self, account):
+        """Test only pending and processing transactions are failed"""
+        completed = Transaction.objects.create(
+            account=account, amount=Decimal('40.00'), description='Completed', transaction_type='debit'
+        )
+        completed.complete_transaction()
+        processing = Transaction.objects.create(
+            account=account, amount=Decimal('10.00'), description='Processing', transaction_type='debit',
+            status='processing'
+        )
+        
+        self._run('mark_as_failed', completed, processing)
+        
+        assert Transaction.objects.get(pk=completed.pk).status == 'completed'
+        assert Transaction.objects.get(pk=processing.pk).status == 'failed'
+        account.refresh_from_db()
+        assert account.balance == Decimal('960.00')
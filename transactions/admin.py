@@ -5,7 +5,12 @@ from django.contrib import admin
 from django.utils.html import format_html
 from django.urls import reverse
 from django.utils.safestring import mark_safe
-from .models import Account, Transaction, Category, RecurringTransaction, PaymentMethod, UserPreferences
+from django.db.models import Count, Q
+from .models import (
+    Account, Transaction, Category, RecurringTransaction, PaymentMethod, UserPreferences,
+    LedgerEntry, MonthlyReport
+)
+from .cache import invalidate_user_cache
 
 
 @admin.register(Account)
@@ -33,30 +38,37 @@ class AccountAdmin(admin.ModelAdmin):
     def colored_balance(self, obj):
         color = 'green' if obj.balance >= 0 else 'red'
         return format_html(
-            '<span style="color: {};">${:,.2f}</span>',
-            color, float(obj.balance)
+            '<span style="color: {};">${}</span>',
+            color, f'{float(obj.balance):,.2f}'
         )
     colored_balance.short_description = 'Balance'
     
     def calculated_balance(self, obj):
-        calculated = obj.get_balance()
-        return format_html("${:,.2f}", float(calculated))
-    calculated_balance.short_description = 'Calculated Balance'
+        if not obj.pk:
+            return '-'
+        calculated = obj.get_balance_at()
+        return format_html("${}", f'{float(calculated):,.2f}')
+    calculated_balance.short_description = 'Ledger Balance'
     
     def get_queryset(self, request):
-        return super().get_queryset(request).select_related('user')
+        return super().get_queryset(request).select_related('user').annotate(
+            completed_transaction_count=Count('transactions', filter=Q(transactions__status='completed'))
+        )
     
     def transaction_count(self, obj):
-        return obj.get_transaction_count()
+        return obj.completed_transaction_count
     transaction_count.short_description = 'Transactions'
+    transaction_count.admin_order_field = 'completed_transaction_count'
     
     def activate_accounts(self, request, queryset):
         updated = queryset.update(is_active=True)
+        invalidate_user_cache(*queryset.values_list('user_id', flat=True))
         self.message_user(request, f'{updated} accounts activated.')
     activate_accounts.short_description = 'Activate selected accounts'
     
     def deactivate_accounts(self, request, queryset):
         updated = queryset.update(is_active=False)
+        invalidate_user_cache(*queryset.values_list('user_id', flat=True))
         self.message_user(request, f'{updated} accounts deactivated.')
     deactivate_accounts.short_description = 'Deactivate selected accounts'
 
@@ -98,8 +110,8 @@ class TransactionAdmin(admin.ModelAdmin):
         color = 'green' if obj.transaction_type == 'credit' else 'red'
         symbol = '+' if obj.transaction_type == 'credit' else '-'
         return format_html(
-            '<span style="color: {};">{} ${:,.2f}</span>',
-            color, symbol, float(obj.amount)
+            '<span style="color: {};">{} ${}</span>',
+            color, symbol, f'{float(obj.amount):,.2f}'
         )
     colored_amount.short_description = 'Amount'
     
@@ -118,28 +130,72 @@ class TransactionAdmin(admin.ModelAdmin):
     status_badge.short_description = 'Status'
     
     def get_queryset(self, request):
-        return super().get_queryset(request).select_related('account', 'category', 'to_account')
+        return super().get_queryset(request).select_related('account__user', 'category', 'to_account')
     
     def account_user(self, obj):
         return obj.account.user.username
     account_user.short_description = 'User'
     
     def mark_as_completed(self, request, queryset):
-        updated = 0
-        for transaction in queryset:
-            if transaction.status != 'completed':
-                transaction.status = 'completed'
-                transaction.save()
+        """Complete through ``complete_transaction``, which posts balances and the ledger"""
+        completable = [
+            status for status, targets in Transaction.STATUS_TRANSITIONS.items() if 'completed' in targets
+        ]
+        updated = skipped = 0
+        for transaction in queryset.filter(status__in=completable).select_related('account', 'to_account'):
+            try:
+                completed = transaction.complete_transaction()
+            except ValueError:
+                completed = False
+            if completed:
                 updated += 1
-        self.message_user(request, f'{updated} transactions marked as completed.')
+            else:
+                skipped += 1
+        message = f'{updated} transactions marked as completed.'
+        if skipped:
+            message += f' {skipped} skipped for insufficient funds or a concurrent status change.'
+        self.message_user(request, message)
     mark_as_completed.short_description = 'Mark selected transactions as completed'
     
     def mark_as_failed(self, request, queryset):
-        updated = queryset.update(status='failed')
+        """Fail pending and processing transactions; completed ones have moved money"""
+        failable = [status for status, targets in Transaction.STATUS_TRANSITIONS.items() if 'failed' in targets]
+        updated = sum(
+            1 for transaction in queryset.filter(status__in=failable).select_related('account', 'to_account')
+            if transaction.transition_to('failed')
+        )
         self.message_user(request, f'{updated} transactions marked as failed.')
     mark_as_failed.short_description = 'Mark selected transactions as failed'
 
 
+@admin.register(LedgerEntry)
+class LedgerEntryAdmin(admin.ModelAdmin):
+    list_display = ['posted_at', 'account', 'entry_type', 'amount', 'transaction', 'posting_id']
+    list_filter = ['entry_type', 'posted_at']
+    search_fields = ['account__name', 'account__account_number', 'transaction__reference_number']
+    list_select_related = ['account', 'transaction']
+    date_hierarchy = 'posted_at'
+    
+    # The ledger is append-only
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(MonthlyReport)
+class MonthlyReportAdmin(admin.ModelAdmin):
+    list_display = ['user', 'period', 'generated_at']
+    list_filter = ['period']
+    search_fields = ['user__username', 'user__email']
+    list_select_related = ['user']
+    readonly_fields = ['user', 'period', 'data', 'generated_at']
+
+
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
     list_display = ['name', 'parent', 'color_preview', 'is_active']
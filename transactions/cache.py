@@ -0,0 +1,49 @@
+"""
+Per-user caching for read-mostly pages
+
+Cached entries are keyed on a per-user version number. Any write to a
+user's accounts or transactions bumps the version, which orphans every
+cached page for that user at once; orphaned entries simply expire.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+
+def _version_key(user_id):
+    return f'user_cache_version:{user_id}'
+
+
+def get_user_cache_version(user_id) -> int:
+    """Return the current cache version for a user"""
+    return cache.get_or_set(_version_key(user_id), 1, timeout=None)
+
+
+def _bump(user_id):
+    try:
+        cache.incr(_version_key(user_id))
+    except ValueError:
+        # Missing or evicted: any fresh value orphans older entries
+        cache.set(_version_key(user_id), get_user_cache_version(user_id) + 1, timeout=None)
+
+
+def invalidate_user_cache(*user_ids):
+    """Invalidate cached pages for the given users
+    
+    Bumps immediately, so reads later in the same transaction miss, and again
+    on commit, so a page built from pre-commit data by a concurrent request is
+    not served after the write becomes visible.
+    """
+    for user_id in set(filter(None, user_ids)):
+        _bump(user_id)
+        transaction.on_commit(lambda user_id=user_id: _bump(user_id))
+
+
+def cached_user_context(name, user, build, timeout=None):
+    """Return ``build()`` for ``user``, cached until the user's data changes"""
+    key = f'view:{name}:{user.pk}:v{get_user_cache_version(user.pk)}'
+    context = cache.get(key)
+    if context is None:
+        context = build()
+        cache.set(key, context, settings.VIEW_CACHE_TTL if timeout is None else timeout)
+    return context
@@ -0,0 +1,258 @@
+"""
+Replay user-facing pages, explain the queries they run and recommend indexes
+"""
+import re
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.urls import NoReverseMatch, reverse
+
+from transactions.cache import invalidate_user_cache
+from transactions.models import Transaction
+
+DEFAULT_PAGES = (
+    'dashboard', 'account_list', 'transaction_list', 'analytics',
+    'transaction-list', 'account-list',
+)
+
+_WHITESPACE_RE = re.compile(r'\s+')
+_IN_LIST_RE = re.compile(r'IN \((?:%s, )*%s\)')
+
+
+def query_shape(sql: str) -> str:
+    """Return ``sql`` with whitespace collapsed and ``IN`` lists of any length folded"""
+    return _IN_LIST_RE.sub('IN (...)', _WHITESPACE_RE.sub(' ', sql).strip())
+
+
+class QueryRecorder:
+    """``execute_wrapper`` that collects each distinct SELECT with its first parameters"""
+    
+    def __init__(self):
+        self.queries = OrderedDict()
+    
+    def __call__(self, execute, sql, params, many, context):
+        if not many and sql.lstrip().upper().startswith('SELECT'):
+            shape = query_shape(sql)
+            if shape in self.queries:
+                self.queries[shape]['calls'] += 1
+            else:
+                self.queries[shape] = {'sql': sql, 'params': params, 'calls': 1}
+        return execute(sql, params, many, context)
+
+
+def explain(sql, params) -> str:
+    """Return the database's plan for ``sql`` as text"""
+    with connection.cursor() as cursor:
+        cursor.execute(f'{connection.ops.explain_query_prefix()} {sql}', params)
+        rows = cursor.fetchall()
+    return '\n'.join(str(row[-1]) for row in rows)
+
+
+def plan_problems(plan: str, table: str):
+    """Return the full scans of ``table`` and sorts in a PostgreSQL or SQLite plan"""
+    problems = []
+    if re.search(rf'Seq Scan on {table}\b|\bSCAN {table}\b', plan):
+        problems.append(f'full scan of {table}')
+    if re.search(r'(^|->)\s*(Incremental )?Sort\b|USE TEMP B-TREE FOR ORDER BY', plan, re.MULTILINE):
+        problems.append('sort')
+    return problems
+
+
+def join_filters(sql: str, table: str):
+    """Return ``(column, joined_table)`` for equalities reached through a join
+    
+    For ``account__user=...`` that is ``('user_id', 'transactions_account')``:
+    the filter is on the joined table, so no index on ``table`` can seek it.
+    """
+    where = sql.partition(' WHERE ')[2].partition(' ORDER BY ')[0]
+    filters = []
+    for joined in re.findall(rf'INNER JOIN "(\w+)" ON \("{table}"\."\w+" = "\w+"\."id"\)', sql):
+        for column in re.findall(rf'"{joined}"\."(\w+)" = ', where):
+            filters.append((column, joined))
+    return filters
+
+
+def suggest_columns(sql: str, table: str):
+    """Return index columns for ``table`` read off a query's WHERE and ORDER BY
+    
+    Equality filters come first, then the sort keys, or failing those the
+    first range filter, as an index can only seek on the columns before its
+    first range. ``IN`` lists are left out: each value is a separate index
+    prefix, so rows come back out of sort order. An equality on a joined
+    table, such as ``account__user``, is suggested as a column copied onto
+    ``table``, since only its own columns can order the index.
+    """
+    column = rf'"{table}"\."(\w+)"'
+    where, _, order_by = sql.partition(' ORDER BY ')
+    where = where.partition(' WHERE ')[2]
+    
+    equality = [name for name, _ in join_filters(sql, table)]
+    equality += re.findall(rf'{column} = ', where)
+    ranges = re.findall(rf'{column} (?:[<>]=? |BETWEEN )', where)
+    ordering = re.findall(column, order_by)
+    
+    columns = list(OrderedDict.fromkeys(equality))
+    for name in ordering or ranges[:1]:
+        if name not in columns:
+            columns.append(name)
+    return columns
+
+
+def covering_index(columns, indexes):
+    """Return the name of an index whose leading columns are ``columns``, if any"""
+    for name, index_columns in indexes.items():
+        if index_columns[:len(columns)] == columns:
+            return name
+    return None
+
+
+def redundant_indexes(indexes, unique, partial=()):
+    """Return ``(index, covered_by)`` pairs for plain indexes another index makes redundant
+    
+    An index is redundant when its columns lead a longer index, or equal the
+    columns of a unique constraint. Partial indexes are never redundant, as
+    they hold fewer rows than the index they seem to duplicate.
+    """
+    pairs = []
+    for name, columns in indexes.items():
+        if name in unique or name in partial:
+            continue
+        for other, other_columns in indexes.items():
+            if other == name or other in partial:
+                continue
+            longer = len(other_columns) > len(columns) and other_columns[:len(columns)] == columns
+            if longer or (other in unique and other_columns == columns):
+                pairs.append((name, other))
+                break
+    return pairs
+
+
+class Command(BaseCommand):
+    help = 'Capture the transaction queries pages run for a user, explain them and suggest indexes'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            required=True,
+            help='Username whose pages are replayed; use a user with realistic data.'
+        )
+        parser.add_argument(
+            '--page',
+            action='append',
+            dest='pages',
+            help='URL name or path to replay; repeatable. Defaults to the main pages and API lists.'
+        )
+        parser.add_argument(
+            '--host',
+            help='Host header for the replayed requests. Defaults to the first ALLOWED_HOSTS entry.'
+        )
+        parser.add_argument(
+            '--verbose-plans',
+            action='store_true',
+            help='Print the plan of every query, not only the ones with problems.'
+        )
+    
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f'User {options["user"]!r} does not exist')
+        
+        recorder = QueryRecorder()
+        host = options['host'] or next(
+            (host.lstrip('.') for host in settings.ALLOWED_HOSTS if host != '*'), 'localhost'
+        )
+        client = Client(HTTP_HOST=host)
+        client.force_login(user)
+        with connection.execute_wrapper(recorder):
+            for page in options['pages'] or DEFAULT_PAGES:
+                path = self._resolve(page)
+                # Cached page contexts would hide the queries behind them
+                invalidate_user_cache(user.pk)
+                response = client.get(path)
+                self.stdout.write(f'{path}: {response.status_code}')
+        
+        table = Transaction._meta.db_table
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, table)
+        indexes = {
+            name: constraint['columns']
+            for name, constraint in constraints.items()
+            if constraint['index'] or constraint['unique']
+        }
+        unique = {name for name, constraint in constraints.items() if constraint['unique']}
+        partial = {index.name for index in Transaction._meta.indexes if index.condition is not None}
+        full_indexes = {name: columns for name, columns in indexes.items() if name not in partial}
+        
+        recommendations = OrderedDict()
+        shapes = [shape for shape in recorder.queries if f'"{table}"' in shape]
+        for shape in shapes:
+            query = recorder.queries[shape]
+            plan = explain(query['sql'], query['params'])
+            problems = plan_problems(plan, table)
+            if not problems and not options['verbose_plans']:
+                continue
+            
+            self.stdout.write('')
+            self.stdout.write(f'{shape}  [{query["calls"]} call(s)]')
+            self.stdout.write(plan)
+            if not problems:
+                continue
+            
+            columns = suggest_columns(shape, table)
+            joined = join_filters(shape, table)
+            served_by = covering_index(columns, full_indexes) if columns else None
+            if not columns:
+                self.stdout.write(self.style.WARNING(f'{", ".join(problems)}; no filter on {table} to index'))
+            elif joined:
+                via = ', '.join(f'{joined_table}.{name}' for name, joined_table in joined)
+                usable = f'; filter on {table} directly to use {served_by}' if served_by else ''
+                self.stdout.write(self.style.WARNING(
+                    f'{", ".join(problems)}; filters through a join on {via}, which no index on {table} '
+                    f'can serve in order{usable}'
+                ))
+                recommendations.setdefault(tuple(columns), []).append(shape)
+            elif served_by:
+                self.stdout.write(self.style.WARNING(
+                    f'{", ".join(problems)} although {served_by} covers {columns}; '
+                    'the planner may prefer a scan on small tables'
+                ))
+            else:
+                self.stdout.write(self.style.WARNING(f'{", ".join(problems)}; no index on {columns}'))
+                recommendations.setdefault(tuple(columns), []).append(shape)
+        
+        self.stdout.write('')
+        self.stdout.write(f'Explained {len(shapes)} distinct queries on {table}')
+        for name, covered_by in redundant_indexes(indexes, unique, partial):
+            self.stdout.write(self.style.NOTICE(
+                f'Drop {name} {indexes[name]}: redundant with {covered_by} {indexes[covered_by]}'
+            ))
+        if not recommendations:
+            self.stdout.write(self.style.SUCCESS('No missing indexes found'))
+            return
+        table_columns = {field.column for field in Transaction._meta.concrete_fields}
+        for columns, matched in recommendations.items():
+            fields = [self._field_name(column) for column in columns]
+            copies = [column for column in columns if column not in table_columns]
+            self.stdout.write(self.style.NOTICE(
+                f'Recommend models.Index(fields={fields!r}) for {len(matched)} query shape(s)'
+                + (f', after copying {", ".join(copies)} onto {table}' if copies else '')
+            ))
+    
+    def _resolve(self, page):
+        if page.startswith('/'):
+            return page
+        try:
+            return reverse(page)
+        except NoReverseMatch:
+            raise CommandError(f'Unknown page {page!r}; pass a URL name or a path')
+    
+    def _field_name(self, column):
+        for field in Transaction._meta.concrete_fields:
+            if field.column == column:
+                return field.name
+        return column
@@ -0,0 +1,147 @@
+"""
+Measure the recurring transaction due scan with and without its index
+
+The index is dropped inside a transaction that is rolled back, so other
+sessions never see the table without it. On PostgreSQL they wait on the
+table's lock while the unindexed scan is timed instead.
+"""
+import statistics
+import time
+import uuid
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from transactions.models import Account, RecurringTransaction
+from transactions.services import RecurringTransactionService
+
+
+class Command(BaseCommand):
+    help = 'Seed recurring transactions and time the due scan before and after its index'
+    
+    INDEX_NAME = 'recurring_due_idx'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows',
+            type=int,
+            default=1000000,
+            help='Number of recurring transactions to seed.'
+        )
+        parser.add_argument(
+            '--due-fraction',
+            type=float,
+            default=0.01,
+            help='Share of seeded rows that are due now.'
+        )
+        parser.add_argument(
+            '--inactive-fraction',
+            type=float,
+            default=0.3,
+            help='Share of seeded rows that are inactive.'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=10000,
+            help='Rows inserted per bulk_create call.'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Timed scans per measurement; the median is reported.'
+        )
+        parser.add_argument(
+            '--keep',
+            action='store_true',
+            help='Keep the seeded rows instead of deleting them afterwards.'
+        )
+        parser.add_argument(
+            '--allow-production',
+            action='store_true',
+            help='Run even though DEBUG is off. The seeded rows and the index drop lock the table.'
+        )
+    
+    def handle(self, *args, **options):
+        index = next(
+            (index for index in RecurringTransaction._meta.indexes if index.name == self.INDEX_NAME),
+            None
+        )
+        if index is None:
+            raise CommandError(f'RecurringTransaction has no index named {self.INDEX_NAME}')
+        if not settings.DEBUG and not options['allow_production']:
+            raise CommandError(
+                'DEBUG is off; this command seeds rows and drops an index. '
+                'Pass --allow-production to run it anyway.'
+            )
+        
+        user = User.objects.create_user(username=f'recurring-benchmark-{uuid.uuid4().hex[:8]}')
+        try:
+            account = Account.objects.create(user=user, name='Recurring benchmark', account_type='checking')
+            self._seed(account, options)
+            
+            drop_sql = str(index.remove_sql(RecurringTransaction, connection.schema_editor()))
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    cursor.execute(drop_sql)
+                before = self._measure(options['repeat'])
+                # Restores the index without rebuilding it
+                transaction.set_rollback(True)
+            after = self._measure(options['repeat'])
+        finally:
+            if not options['keep']:
+                RecurringTransaction.objects.filter(account__user=user).delete()
+                user.delete()
+        
+        self.stdout.write(f'Without index: {before * 1000:.2f} ms')
+        self.stdout.write(f'With index:    {after * 1000:.2f} ms')
+        self.stdout.write(self.style.SUCCESS(
+            f'Due scan over {options["rows"]} rows is {before / after:.1f}x faster with {self.INDEX_NAME}'
+            if after else f'Due scan over {options["rows"]} rows measured'
+        ))
+    
+    def _seed(self, account, options):
+        now = timezone.now()
+        total = options['rows']
+        due_every = round(1 / options['due_fraction']) if options['due_fraction'] > 0 else 0
+        inactive_every = round(1 / options['inactive_fraction']) if options['inactive_fraction'] > 0 else 0
+        
+        for start in range(0, total, options['batch_size']):
+            rows = []
+            for i in range(start, min(start + options['batch_size'], total)):
+                due = due_every and i % due_every == 0
+                rows.append(RecurringTransaction(
+                    account=account,
+                    amount=Decimal('9.99'),
+                    description='Benchmark subscription',
+                    frequency='monthly',
+                    next_transaction_date=now - timezone.timedelta(hours=1) if due
+                    else now + timezone.timedelta(minutes=1 + i % 40000),
+                    is_active=not (inactive_every and i % inactive_every == 1),
+                ))
+            RecurringTransaction.objects.bulk_create(rows)
+        
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(f'ANALYZE {RecurringTransaction._meta.db_table}')
+        self.stdout.write(f'Seeded {total} recurring transactions')
+    
+    def _measure(self, repeat):
+        """Return the median time of the due scan and print its query plan"""
+        now = timezone.now()
+        self.stdout.write(RecurringTransaction.objects.filter(
+            is_active=True,
+            next_transaction_date__lte=now
+        ).order_by('pk').values_list('pk', flat=True).explain())
+        
+        timings = []
+        for _ in range(max(repeat, 1)):
+            started = time.perf_counter()
+            RecurringTransactionService.get_due_ids(now)
+            timings.append(time.perf_counter() - started)
+        return statistics.median(timings)
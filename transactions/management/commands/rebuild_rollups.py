@@ -0,0 +1,97 @@
+"""
+Backfill or rebuild DailyAccountRollup rows from completed transactions
+"""
+from datetime import datetime, time, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, Min, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from transactions.models import DailyAccountRollup, RollupCoverage, Transaction
+
+
+class Command(BaseCommand):
+    help = 'Rebuild daily per-account rollups from completed transactions'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--start',
+            help='First day to rebuild (YYYY-MM-DD). Defaults to the earliest transaction.'
+        )
+        parser.add_argument(
+            '--end',
+            help='Last day to rebuild (YYYY-MM-DD). Defaults to today.'
+        )
+        parser.add_argument(
+            '--days-per-batch',
+            type=int,
+            default=31,
+            help='Number of days rebuilt per database transaction.'
+        )
+    
+    def _parse_day(self, value, name):
+        day = parse_date(value) if value else None
+        if value and not day:
+            raise CommandError(f'--{name} must be in YYYY-MM-DD format')
+        return day
+    
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        start = self._parse_day(options['start'], 'start')
+        end = self._parse_day(options['end'], 'end') or today
+        batch_days = max(options['days_per_batch'], 1)
+        
+        if start is None:
+            earliest = Transaction.objects.aggregate(first=Min('transaction_date'))['first']
+            start = timezone.localtime(earliest).date() if earliest else today
+        
+        if start > end:
+            raise CommandError('--start must not be after --end')
+        
+        buckets = 0
+        batch_start = start
+        while batch_start <= end:
+            batch_end = min(batch_start + timedelta(days=batch_days - 1), end)
+            buckets += self._rebuild_batch(batch_start, batch_end)
+            self.stdout.write(f'Rebuilt {batch_start} to {batch_end}')
+            batch_start = batch_end + timedelta(days=1)
+        
+        # Rollups are only complete up to the present if the rebuild reached today
+        if end >= today:
+            covered_from = RollupCoverage.get_covered_from()
+            RollupCoverage.objects.all().delete()
+            RollupCoverage.objects.create(
+                covered_from=min(start, covered_from) if covered_from else start
+            )
+        
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {buckets} rollup rows from {start} to {end}'
+        ))
+    
+    @transaction.atomic
+    def _rebuild_batch(self, first_day, last_day):
+        """Replace the rollups for an inclusive range of days"""
+        range_start = timezone.make_aware(datetime.combine(first_day, time.min))
+        range_end = timezone.make_aware(datetime.combine(last_day + timedelta(days=1), time.min))
+        
+        DailyAccountRollup.objects.filter(day__range=[first_day, last_day]).delete()
+        
+        rows = Transaction.objects.filter(
+            status='completed',
+            transaction_date__gte=range_start,
+            transaction_date__lt=range_end
+        ).annotate(
+            day=TruncDate('transaction_date')
+        ).values(
+            'account_id', 'day', 'category_id', 'transaction_type'
+        ).annotate(
+            count=Count('id'),
+            total=Sum('amount')
+        ).order_by()
+        
+        rollups = [DailyAccountRollup(**row) for row in rows.iterator(chunk_size=2000)]
+        DailyAccountRollup.objects.bulk_create(rollups, batch_size=1000)
+        return len(rollups)
@@ -0,0 +1,89 @@
+"""
+Verify stored account balances against the ledger
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from transactions.models import Account, LedgerEntry
+
+
+class Command(BaseCommand):
+    help = 'Check every Account.balance against its ledger balance'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of accounts checked per query batch.'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=4,
+            help='Number of batches checked in parallel, each on its own connection.'
+        )
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Sum the whole ledger instead of starting from balance snapshots.'
+        )
+    
+    def handle(self, *args, **options):
+        batch_size = max(options['batch_size'], 1)
+        workers = max(options['workers'], 1)
+        use_snapshots = not options['full']
+        
+        account_ids = list(Account.objects.order_by('pk').values_list('pk', flat=True))
+        batches = [account_ids[i:i + batch_size] for i in range(0, len(account_ids), batch_size)]
+        
+        if workers == 1 or len(batches) <= 1:
+            results = [self._check_batch(batch, use_snapshots) for batch in batches]
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(
+                    lambda batch: self._check_in_thread(batch, use_snapshots), batches
+                ))
+        
+        mismatches = [mismatch for batch_mismatches in results for mismatch in batch_mismatches]
+        for pk, balance, ledger_balance in mismatches:
+            self.stderr.write(
+                f'Account {pk}: balance {balance}, ledger {ledger_balance} '
+                f'(difference {balance - ledger_balance})'
+            )
+        
+        summary = f'Checked {len(account_ids)} accounts in {len(batches)} batches'
+        if mismatches:
+            raise CommandError(f'{summary}: {len(mismatches)} accounts do not match the ledger')
+        self.stdout.write(self.style.SUCCESS(f'{summary}: all balances match the ledger'))
+    
+    def _check_in_thread(self, account_ids, use_snapshots):
+        try:
+            return self._check_batch(account_ids, use_snapshots)
+        finally:
+            # Each worker thread opened its own connection
+            connection.close()
+    
+    def _check_batch(self, account_ids, use_snapshots):
+        """Return ``(pk, balance, ledger_balance)`` for each mismatched account"""
+        suspects = self._compare(account_ids, use_snapshots)
+        if not suspects:
+            return []
+        
+        # A posting may have landed between the two reads; recheck with the
+        # rows locked, which postings also take before writing.
+        with transaction.atomic():
+            list(Account.objects.select_for_update().filter(pk__in=suspects).order_by('pk').values_list('pk'))
+            return self._compare(suspects, use_snapshots, with_details=True)
+    
+    def _compare(self, account_ids, use_snapshots, with_details=False):
+        balances = dict(Account.objects.filter(pk__in=account_ids).values_list('pk', 'balance'))
+        ledger = LedgerEntry.balances_at(balances, use_snapshots=use_snapshots)
+        mismatched = [
+            (pk, balance, ledger[pk]) for pk, balance in balances.items() if balance != ledger[pk]
+        ]
+        if with_details:
+            return mismatched
+        return [pk for pk, _, _ in mismatched]
@@ -0,0 +1,31 @@
+"""
+Middleware for the transactions app
+"""
+from django.utils.functional import SimpleLazyObject
+
+from .models import UserPreferences
+
+
+class UserPreferencesMiddleware:
+    """Attach lazily loaded preferences to the request as ``request.preferences``
+    
+    Preferences are loaded at most once per request, and only if something
+    reads them. Must come after ``AuthenticationMiddleware``.
+    """
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+    
+    def __call__(self, request):
+        if request.user.is_authenticated:
+            user = request.user
+            request.preferences = SimpleLazyObject(lambda: UserPreferences.get_for_user(user))
+        return self.get_response(request)
+
+
+def get_request_preferences(request):
+    """Return the request's memoized preferences, loading them if the middleware did not run"""
+    preferences = getattr(request, 'preferences', None)
+    if preferences is None:
+        preferences = UserPreferences.get_for_user(request.user)
+    return preferences
@@ -0,0 +1,19 @@
+"""
+Migration operations shared by the app's migrations
+"""
+from django.contrib.postgres.operations import AddIndexConcurrently
+
+
+class AddIndexConcurrentlyOnPostgres(AddIndexConcurrently):
+    """``CREATE INDEX CONCURRENTLY`` on PostgreSQL, a plain ``AddIndex`` elsewhere
+    
+    Needs ``atomic = False`` on the migration, like ``AddIndexConcurrently``.
+    """
+    
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        operation = super() if schema_editor.connection.vendor == 'postgresql' else super(AddIndexConcurrently, self)
+        operation.database_forwards(app_label, schema_editor, from_state, to_state)
+    
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        operation = super() if schema_editor.connection.vendor == 'postgresql' else super(AddIndexConcurrently, self)
+        operation.database_backwards(app_label, schema_editor, from_state, to_state)
@@ -0,0 +1,69 @@
+# Generated by Django 4.2.9 on 2026-10-18 11:39
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+
+
+def open_existing_balances(apps, schema_editor):
+    """Start the ledger from the balances accounts hold today"""
+    Account = apps.get_model('transactions', 'Account')
+    LedgerEntry = apps.get_model('transactions', 'LedgerEntry')
+    
+    now = django.utils.timezone.now()
+    entries = []
+    for pk, balance in Account.objects.exclude(balance=0).values_list('pk', 'balance').iterator():
+        posting_id = uuid.uuid4()
+        entries.append(LedgerEntry(
+            posting_id=posting_id, account_id=pk, entry_type='opening', amount=balance, posted_at=now
+        ))
+        entries.append(LedgerEntry(
+            posting_id=posting_id, account_id=None, entry_type='opening', amount=-balance, posted_at=now
+        ))
+        if len(entries) >= 2000:
+            LedgerEntry.objects.bulk_create(entries)
+            entries = []
+    LedgerEntry.objects.bulk_create(entries)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0004_daily_account_rollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('posting_id', models.UUIDField()),
+                ('entry_type', models.CharField(choices=[('opening', 'Opening Balance'), ('posting', 'Posting'), ('adjustment', 'Adjustment')], default='posting', max_length=20)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('posted_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('account', models.ForeignKey(blank=True, help_text='Null for the external clearing side of a posting', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='ledger_entries', to='transactions.account')),
+                ('transaction', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ledger_entries', to='transactions.transaction')),
+            ],
+            options={
+                'verbose_name_plural': 'ledger entries',
+                'ordering': ['posted_at', 'id'],
+                'indexes': [models.Index(fields=['account', 'posted_at'], name='transaction_account_47f40d_idx'), models.Index(fields=['posting_id'], name='transaction_posting_bc0586_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='BalanceSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('balance', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('as_of', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balance_snapshots', to='transactions.account')),
+            ],
+            options={
+                'ordering': ['-as_of'],
+                'indexes': [models.Index(fields=['account', 'as_of'], name='transaction_account_7e3494_idx')],
+            },
+        ),
+        migrations.RunPython(open_existing_balances, migrations.RunPython.noop),
+    ]
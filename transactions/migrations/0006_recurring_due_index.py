@@ -0,0 +1,17 @@
+# Generated by Django 4.2.9 on 2026-10-18 11:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0005_ledger'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recurringtransaction',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['next_transaction_date'], name='recurring_due_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.9 on 2026-10-18 11:46
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('transactions', '0006_recurring_due_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlyReport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.DateField(help_text='First day of the reported month')),
+                ('data', models.JSONField(default=dict)),
+                ('generated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_reports', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-period'],
+                'unique_together': {('user', 'period')},
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.9 on 2026-10-18 11:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0007_monthly_report'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StripeEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_id', models.CharField(max_length=255, unique=True)),
+                ('event_type', models.CharField(max_length=100)),
+                ('payment_intent_id', models.CharField(blank=True, max_length=255)),
+                ('stripe_created', models.DateTimeField(help_text='When Stripe created the event')),
+                ('payload', models.JSONField()),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+                ('error', models.TextField(blank=True)),
+            ],
+            options={
+                'ordering': ['stripe_created', 'id'],
+                'indexes': [models.Index(condition=models.Q(('processed_at__isnull', True)), fields=['payment_intent_id', 'stripe_created'], name='stripe_event_pending_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.9 on 2026-10-18 12:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0008_stripe_event'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['account', 'transaction_date', 'id'], name='txn_account_date_id_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='transaction',
+            name='transaction_account_201187_idx',
+        ),
+    ]
@@ -0,0 +1,107 @@
+from django.db import migrations
+
+# PostgreSQL only: a tsvector column a trigger fills on every write, and a GIN
+# index over it. Other databases use the fallback search.
+#
+# A stored generated column would rewrite the whole table under an ACCESS
+# EXCLUSIVE lock, blocking reads and writes until it finished. Instead the
+# column is added nullable, which only touches the catalog, existing rows are
+# backfilled in short batches that each lock just the rows they update, and
+# the index is built concurrently.
+SEARCH_VECTOR = """
+setweight(to_tsvector('simple'::regconfig, coalesce({row}reference_number, '')), 'A') ||
+setweight(to_tsvector('simple'::regconfig, coalesce({row}description, '')), 'B')
+"""
+
+ADD_COLUMN = 'ALTER TABLE transactions_transaction ADD COLUMN IF NOT EXISTS search_vector tsvector'
+
+ADD_FUNCTION = f"""
+CREATE OR REPLACE FUNCTION transaction_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := {SEARCH_VECTOR.format(row='NEW.')};
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql
+"""
+
+ADD_TRIGGERS = (
+    """
+    CREATE TRIGGER transaction_search_vector_insert
+    BEFORE INSERT ON transactions_transaction
+    FOR EACH ROW EXECUTE FUNCTION transaction_search_vector_update()
+    """,
+    """
+    CREATE TRIGGER transaction_search_vector_update
+    BEFORE UPDATE OF reference_number, description ON transactions_transaction
+    FOR EACH ROW
+    WHEN (OLD.reference_number IS DISTINCT FROM NEW.reference_number
+          OR OLD.description IS DISTINCT FROM NEW.description)
+    EXECUTE FUNCTION transaction_search_vector_update()
+    """,
+)
+
+BACKFILL = f"""
+UPDATE transactions_transaction SET search_vector = {SEARCH_VECTOR.format(row='')}
+WHERE id > %s AND id <= %s AND search_vector IS NULL
+"""
+
+BACKFILL_BATCH_SIZE = 5000
+
+ADD_INDEX = """
+CREATE INDEX CONCURRENTLY IF NOT EXISTS transaction_search_vector_idx
+ON transactions_transaction USING gin (search_vector)
+"""
+
+DROP_INDEX = 'DROP INDEX CONCURRENTLY IF EXISTS transaction_search_vector_idx'
+
+DROP_TRIGGERS = (
+    'DROP TRIGGER IF EXISTS transaction_search_vector_insert ON transactions_transaction',
+    'DROP TRIGGER IF EXISTS transaction_search_vector_update ON transactions_transaction',
+)
+
+DROP_FUNCTION = 'DROP FUNCTION IF EXISTS transaction_search_vector_update()'
+
+DROP_COLUMN = 'ALTER TABLE transactions_transaction DROP COLUMN IF EXISTS search_vector'
+
+
+def add_search_vector(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(ADD_COLUMN)
+    schema_editor.execute(ADD_FUNCTION)
+    for trigger in DROP_TRIGGERS + ADD_TRIGGERS:
+        schema_editor.execute(trigger)
+    
+    # Rows written from here on are filled by the trigger. The migration runs
+    # outside a transaction, so each batch commits on its own.
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('SELECT MAX(id) FROM transactions_transaction')
+        last_id = cursor.fetchone()[0] or 0
+    for start in range(0, last_id, BACKFILL_BATCH_SIZE):
+        schema_editor.execute(BACKFILL, (start, start + BACKFILL_BATCH_SIZE))
+    
+    schema_editor.execute(ADD_INDEX)
+
+
+def remove_search_vector(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(DROP_INDEX)
+    for trigger in DROP_TRIGGERS:
+        schema_editor.execute(trigger)
+    schema_editor.execute(DROP_FUNCTION)
+    schema_editor.execute(DROP_COLUMN)
+
+
+class Migration(migrations.Migration):
+    
+    # CREATE INDEX CONCURRENTLY and the batched backfill need autocommit
+    atomic = False
+    
+    dependencies = [
+        ('transactions', '0009_transaction_keyset_index'),
+    ]
+    
+    operations = [
+        migrations.RunPython(add_search_vector, remove_search_vector),
+    ]
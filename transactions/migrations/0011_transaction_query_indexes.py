@@ -0,0 +1,31 @@
+# Generated by Django 4.2.9 on 2026-10-18 12:21
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0010_transaction_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(condition=models.Q(('status', 'completed'), ('transaction_type', 'debit')), fields=['account', 'transaction_date'], include=('category', 'amount'), name='txn_completed_debit_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(condition=models.Q(('status__in', ['pending', 'processing'])), fields=['created_at'], name='txn_open_payment_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='transaction',
+            name='transaction_referen_2a6622_idx',
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='account',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='transactions', to='transactions.account'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.9 on 2026-10-18 12:34
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def merge_uncategorized_duplicates(apps, schema_editor):
+    """Collapse duplicate uncategorized buckets into one row per key"""
+    DailyAccountRollup = apps.get_model('transactions', 'DailyAccountRollup')
+    duplicates = DailyAccountRollup.objects.filter(category__isnull=True).values(
+        'account_id', 'day', 'transaction_type'
+    ).annotate(
+        rows=Count('id'), keep=Min('id'), total_count=Sum('count'), total_sum=Sum('total')
+    ).filter(rows__gt=1).order_by()
+    
+    for row in duplicates:
+        DailyAccountRollup.objects.filter(
+            category__isnull=True,
+            account_id=row['account_id'],
+            day=row['day'],
+            transaction_type=row['transaction_type'],
+        ).exclude(pk=row['keep']).delete()
+        DailyAccountRollup.objects.filter(pk=row['keep']).update(
+            count=row['total_count'], total=row['total_sum']
+        )
+
+
+class Migration(migrations.Migration):
+    
+    dependencies = [
+        ('transactions', '0011_transaction_query_indexes'),
+    ]
+    
+    operations = [
+        migrations.RunPython(merge_uncategorized_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='dailyaccountrollup',
+            constraint=models.UniqueConstraint(condition=models.Q(('category__isnull', True)), fields=('account', 'day', 'transaction_type'), name='rollup_uncategorized_unique'),
+        ),
+    ]
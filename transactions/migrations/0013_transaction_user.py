@@ -0,0 +1,118 @@
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+import django.db.models.deletion
+
+from transactions.migration_operations import AddIndexConcurrentlyOnPostgres
+
+# Transactions is the largest table, so on PostgreSQL nothing here holds a
+# lock that blocks writes while it scans or rewrites the table: the column
+# and its foreign key are added without validation, rows are backfilled in
+# short committed batches, NOT NULL is proved by a separately validated
+# CHECK constraint, and the index is built concurrently. Other databases
+# take the plain Django operations.
+
+BACKFILL_BATCH_SIZE = 5000
+
+FK_NAME = 'transactions_transaction_user_id_fk'
+CHECK_NAME = 'transactions_transaction_user_id_not_null'
+
+
+def copy_account_owners(apps, schema_editor):
+    """Copy each account's owner onto its transactions, one id range per commit"""
+    Account = apps.get_model('transactions', 'Account')
+    Transaction = apps.get_model('transactions', 'Transaction')
+    last_id = Transaction.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+    owner = Subquery(Account.objects.filter(pk=OuterRef('account_id')).values('user_id')[:1])
+    for start in range(0, last_id, BACKFILL_BATCH_SIZE):
+        Transaction.objects.filter(
+            user__isnull=True, pk__gt=start, pk__lte=start + BACKFILL_BATCH_SIZE
+        ).update(user_id=owner)
+
+
+class AddForeignKeyNotValid(migrations.AddField):
+    """Add a nullable foreign key whose constraint is not checked against existing rows
+    
+    A column without a default only changes the catalog, and a NOT VALID
+    constraint applies to new writes alone. ``RequireForeignKey`` validates it.
+    """
+    
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != 'postgresql':
+            return super().database_forwards(app_label, schema_editor, from_state, to_state)
+        model = to_state.apps.get_model(app_label, self.model_name)
+        field = model._meta.get_field(self.name)
+        quote = schema_editor.quote_name
+        table = quote(model._meta.db_table)
+        schema_editor.execute(
+            f'ALTER TABLE {table} ADD COLUMN {quote(field.column)} '
+            f'{field.db_type(schema_editor.connection)} NULL'
+        )
+        schema_editor.execute(
+            f'ALTER TABLE {table} ADD CONSTRAINT {quote(FK_NAME)} FOREIGN KEY ({quote(field.column)}) '
+            f'REFERENCES {quote(field.related_model._meta.db_table)} ({quote(field.target_field.column)}) '
+            'DEFERRABLE INITIALLY DEFERRED NOT VALID'
+        )
+
+
+class RequireForeignKey(migrations.AlterField):
+    """Make the backfilled foreign key NOT NULL and validate it without blocking writes
+    
+    ``VALIDATE CONSTRAINT`` scans under a lock that lets writes through, and
+    ``SET NOT NULL`` skips its own scan when a valid CHECK already proves it.
+    """
+    
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != 'postgresql':
+            return super().database_forwards(app_label, schema_editor, from_state, to_state)
+        model = to_state.apps.get_model(app_label, self.model_name)
+        quote = schema_editor.quote_name
+        table = quote(model._meta.db_table)
+        column = quote(model._meta.get_field(self.name).column)
+        for sql in (
+            f'ALTER TABLE {table} ADD CONSTRAINT {quote(CHECK_NAME)} CHECK ({column} IS NOT NULL) NOT VALID',
+            f'ALTER TABLE {table} VALIDATE CONSTRAINT {quote(CHECK_NAME)}',
+            f'ALTER TABLE {table} ALTER COLUMN {column} SET NOT NULL',
+            f'ALTER TABLE {table} DROP CONSTRAINT {quote(CHECK_NAME)}',
+            f'ALTER TABLE {table} VALIDATE CONSTRAINT {quote(FK_NAME)}',
+        ):
+            schema_editor.execute(sql)
+    
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != 'postgresql':
+            return super().database_backwards(app_label, schema_editor, from_state, to_state)
+        model = from_state.apps.get_model(app_label, self.model_name)
+        quote = schema_editor.quote_name
+        schema_editor.execute(
+            f'ALTER TABLE {quote(model._meta.db_table)} '
+            f'ALTER COLUMN {quote(model._meta.get_field(self.name).column)} DROP NOT NULL'
+        )
+
+
+class Migration(migrations.Migration):
+    
+    # The backfill batches and the concurrent index need autocommit
+    atomic = False
+    
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('transactions', '0012_rollup_uncategorized_unique'),
+    ]
+    
+    operations = [
+        AddForeignKeyNotValid(
+            model_name='transaction',
+            name='user',
+            field=models.ForeignKey(db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(copy_account_owners, migrations.RunPython.noop),
+        RequireForeignKey(
+            model_name='transaction',
+            name='user',
+            field=models.ForeignKey(db_index=False, editable=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        AddIndexConcurrentlyOnPostgres(
+            model_name='transaction',
+            index=models.Index(fields=['user', 'transaction_date', 'id'], name='txn_user_date_id_idx'),
+        ),
+    ]
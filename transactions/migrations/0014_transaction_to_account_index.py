@@ -0,0 +1,53 @@
+# Generated by Django 4.2.9 on 2026-10-18 13:04
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+from transactions.migration_operations import AddIndexConcurrentlyOnPostgres
+
+# The plain to_account index the foreign key had; txn_to_account_date_id_idx
+# leads with the same column. Dropped directly rather than through
+# AlterField, which would also drop and re-validate the foreign key.
+FK_INDEX = 'transactions_transaction_to_account_id_62a511c4'
+
+
+def drop_fk_index(apps, schema_editor):
+    concurrently = 'CONCURRENTLY ' if schema_editor.connection.vendor == 'postgresql' else ''
+    schema_editor.execute(f'DROP INDEX {concurrently}IF EXISTS {schema_editor.quote_name(FK_INDEX)}')
+
+
+def create_fk_index(apps, schema_editor):
+    concurrently = 'CONCURRENTLY ' if schema_editor.connection.vendor == 'postgresql' else ''
+    schema_editor.execute(
+        f'CREATE INDEX {concurrently}IF NOT EXISTS {schema_editor.quote_name(FK_INDEX)} '
+        'ON "transactions_transaction" ("to_account_id")'
+    )
+
+
+class Migration(migrations.Migration):
+    
+    # The indexes are built and dropped concurrently on PostgreSQL
+    atomic = False
+    
+    dependencies = [
+        ('transactions', '0013_transaction_user'),
+    ]
+    
+    operations = [
+        AddIndexConcurrentlyOnPostgres(
+            model_name='transaction',
+            index=models.Index(fields=['to_account', 'transaction_date', 'id'], name='txn_to_account_date_id_idx'),
+        ),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='transaction',
+                    name='to_account',
+                    field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='incoming_transfers', to='transactions.account'),
+                ),
+            ],
+            database_operations=[
+                migrations.RunPython(drop_fk_index, create_fk_index),
+            ],
+        ),
+    ]
@@ -1,10 +1,16 @@
+from datetime import timedelta
+
 from django.db import models
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator
 from decimal import Decimal
 from django.db.models import Sum, F
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
 from django.utils import timezone
 
+from .cache import invalidate_user_cache
+
 
 class Account(models.Model):
     """Bank account model with proper financial constraints"""
@@ -48,6 +54,52 @@ class Account(models.Model):
             return True  # Simplified for demo
         return current_balance >= amount
     
+    def get_balance_at(self, when=None):
+        """Compute the balance at a point in time from the ledger
+        
+        Starts from the latest BalanceSnapshot taken at or before ``when``
+        and adds the ledger entries posted since.
+        """
+        return LedgerEntry.balances_at([self.pk], when)[self.pk]
+    
+    @classmethod
+    def post_balance_deltas(cls, deltas, require_funds=(), transaction=None, entry_type='posting',
+                            record_ledger=True):
+        """Atomically add signed amounts to several account balances
+        
+        Rows are locked with ``SELECT ... FOR UPDATE`` in primary-key order,
+        so two transfers between the same pair of accounts cannot deadlock.
+        Accounts listed in ``require_funds`` are checked with ``can_debit``
+        against their locked balance. The posting is recorded in the ledger
+        in the same database transaction, unless the caller records it
+        itself (``record_ledger=False``). Returns the new balance per
+        account id.
+        """
+        from django.db import transaction as db_transaction
+        
+        deltas = {pk: delta for pk, delta in deltas.items() if delta}
+        if not deltas:
+            return {}
+        
+        with db_transaction.atomic():
+            locked = {
+                account.pk: account
+                for account in cls.objects.select_for_update().filter(pk__in=deltas).order_by('pk')
+            }
+            for pk in require_funds:
+                delta = deltas.get(pk, 0)
+                if delta < 0 and not locked[pk].can_debit(-delta):
+                    raise ValueError("Insufficient funds")
+            
+            now = timezone.now()
+            for pk in sorted(deltas):
+                cls.objects.filter(pk=pk).update(balance=F('balance') + deltas[pk], updated_at=now)
+            if record_ledger:
+                LedgerEntry.record(deltas, transaction=transaction, entry_type=entry_type)
+            
+            invalidate_user_cache(*(account.user_id for account in locked.values()))
+            return {pk: locked[pk].balance + delta for pk, delta in deltas.items()}
+    
     def get_transaction_count(self):
         """Get count of completed transactions"""
         return self.transactions.filter(status='completed').count()
@@ -58,7 +110,41 @@ class Account(models.Model):
             import uuid
             self.account_number = f"ACC{uuid.uuid4().hex[:8].upper()}"
         
-        super().save(*args, **kwargs)
+        from django.db import transaction as db_transaction
+        
+        adding = self._state.adding
+        loaded_user_id = getattr(self, '_loaded_user_id', self.user_id)
+        update_fields = kwargs.get('update_fields')
+        with db_transaction.atomic():
+            stored_balance = None
+            if not adding and (update_fields is None or 'balance' in update_fields):
+                stored_balance = Account.objects.select_for_update().filter(
+                    pk=self.pk
+                ).values_list('balance', flat=True).first()
+            super().save(*args, **kwargs)
+            if adding and self.balance:
+                LedgerEntry.record({self.pk: self.balance}, entry_type='opening')
+            if stored_balance is not None and stored_balance != self.balance:
+                # Balance edits outside postings, from the admin, the API or
+                # code, are recorded as adjustments so the ledger keeps up
+                LedgerEntry.record({self.pk: self.balance - stored_balance}, entry_type='adjustment')
+            if not adding and loaded_user_id != self.user_id:
+                # Keep the owner copied onto each transaction in step
+                self.transactions.update(user_id=self.user_id)
+                invalidate_user_cache(loaded_user_id)
+        self._loaded_user_id = self.user_id
+        invalidate_user_cache(self.user_id)
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_user_id = instance.__dict__.get('user_id')
+        return instance
+    
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        invalidate_user_cache(self.user_id)
+        return result
 
 
 class Category(models.Model):
@@ -84,6 +170,29 @@ class Category(models.Model):
         return self.name
 
 
+class TransactionQuerySet(models.QuerySet):
+    """Keeps each transaction's owner in step on bulk writes, which bypass ``save``"""
+    
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        Transaction.fill_users(objs)
+        return super().bulk_create(objs, *args, **kwargs)
+    
+    def update(self, **kwargs):
+        from django.db.models import OuterRef, Subquery
+        
+        # Moving rows to another account moves them to its owner
+        account = kwargs.get('account', kwargs.get('account_id'))
+        if account is not None and 'user' not in kwargs and 'user_id' not in kwargs:
+            if isinstance(account, Account):
+                kwargs['user_id'] = account.user_id
+            else:
+                if isinstance(account, F):
+                    account = OuterRef(account.name)
+                kwargs['user_id'] = Subquery(Account.objects.filter(pk=account).values('user_id')[:1])
+        return super().update(**kwargs)
+
+
 class Transaction(models.Model):
     """Core transaction model with financial integrity"""
     TRANSACTION_TYPES = [
@@ -100,11 +209,31 @@ class Transaction(models.Model):
         ('cancelled', 'Cancelled'),
     ]
     
+    # Allowed status changes; completed, failed and cancelled are final
+    STATUS_TRANSITIONS = {
+        'pending': {'processing', 'completed', 'failed', 'cancelled'},
+        'processing': {'processing', 'completed', 'failed'},
+        'completed': set(),
+        'failed': set(),
+        'cancelled': set(),
+    }
+    
     # Core fields
     account = models.ForeignKey(
         Account, 
         on_delete=models.CASCADE, 
-        related_name='transactions'
+        related_name='transactions',
+        # txn_account_date_id_idx leads with account and serves its lookups
+        db_index=False
+    )
+    # Copy of account.user, so user-scoped lists are served by
+    # txn_user_date_id_idx without a join; kept in step on save, update and bulk_create
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        editable=False,
+        db_index=False
     )
     transaction_type = models.CharField(max_length=10, choices=TRANSACTION_TYPES)
     amount = models.DecimalField(
@@ -130,7 +259,9 @@ class Transaction(models.Model):
         on_delete=models.SET_NULL, 
         null=True, 
         blank=True,
-        related_name='incoming_transfers'
+        related_name='incoming_transfers',
+        # txn_to_account_date_id_idx leads with to_account and serves its lookups
+        db_index=False
     )
     
     # External payment integration
@@ -145,45 +276,559 @@ class Transaction(models.Model):
     # Metadata
     metadata = models.JSONField(default=dict, blank=True)
     
+    objects = TransactionQuerySet.as_manager()
+    
     class Meta:
         ordering = ['-transaction_date']
         indexes = [
-            models.Index(fields=['account', 'transaction_date']),
+            # Serve the keyset pages of transactions.pagination, per account
+            # and across all of a user's accounts
+            models.Index(fields=['account', 'transaction_date', 'id'], name='txn_account_date_id_idx'),
+            models.Index(fields=['user', 'transaction_date', 'id'], name='txn_user_date_id_idx'),
+            # Incoming transfers in an account's history
+            models.Index(fields=['to_account', 'transaction_date', 'id'], name='txn_to_account_date_id_idx'),
             models.Index(fields=['status', 'transaction_date']),
-            models.Index(fields=['reference_number']),
+            # Spending analytics; on PostgreSQL the included columns let the
+            # category totals be read from the index alone
+            models.Index(
+                fields=['account', 'transaction_date'],
+                include=['category', 'amount'],
+                condition=models.Q(status='completed', transaction_type='debit'),
+                name='txn_completed_debit_idx',
+            ),
+            # Open payments scanned by PaymentReconciliationService.reconcile
+            models.Index(
+                fields=['created_at'],
+                condition=models.Q(status__in=['pending', 'processing']),
+                name='txn_open_payment_idx',
+            ),
         ]
     
     def __str__(self):
         return f"{self.transaction_type.title()} ${self.amount} - {self.description}"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._rollup_snapshot = instance._get_rollup_key()
+        instance._loaded_account_id = instance.__dict__.get('account_id')
+        return instance
+    
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self._rollup_snapshot = self._get_rollup_key()
+        self._loaded_account_id = self.__dict__.get('account_id')
+    
+    def _get_rollup_key(self):
+        """Return the rollup bucket this transaction counts towards, if completed"""
+        if self.status != 'completed':
+            return None
+        try:
+            return (
+                self.account_id,
+                timezone.localtime(self.transaction_date).date(),
+                self.category_id,
+                self.transaction_type,
+                Decimal(str(self.amount)),
+            )
+        except (AttributeError, ValueError):
+            # Deferred fields or naive dates: leave it to rebuild_rollups
+            return None
+    
+    @staticmethod
+    def generate_reference_number():
+        import uuid
+        return f"TXN{uuid.uuid4().hex[:8].upper()}"
+    
+    @classmethod
+    def generate_reference_numbers(cls, count):
+        """Generate ``count`` reference numbers unused in the batch and the database"""
+        references = set()
+        while len(references) < count:
+            candidates = {cls.generate_reference_number() for _ in range(count - len(references))}
+            candidates -= references
+            taken = set(cls.objects.filter(
+                reference_number__in=candidates
+            ).values_list('reference_number', flat=True))
+            references |= candidates - taken
+        return list(references)
+    
+    @classmethod
+    def fill_users(cls, transactions):
+        """Copy each account's owner onto transactions that lack it"""
+        missing = [txn for txn in transactions if txn.user_id is None]
+        unloaded = {txn.account_id for txn in missing if not cls.account.is_cached(txn)}
+        owners = dict(Account.objects.filter(pk__in=unloaded).values_list('pk', 'user_id')) if unloaded else {}
+        for txn in missing:
+            txn.user_id = txn.account.user_id if cls.account.is_cached(txn) else owners.get(txn.account_id)
+    
     def save(self, *args, **kwargs):
         # Generate reference number if not provided
         if not self.reference_number:
-            import uuid
-            self.reference_number = f"TXN{uuid.uuid4().hex[:8].upper()}"
+            self.reference_number = self.generate_reference_number()
+        # Copy the owner of the account, also when the account is reassigned
+        previous_user_id = self.user_id
+        if self.user_id is None or self.account_id != getattr(self, '_loaded_account_id', None):
+            self.user_id = self.account.user_id
         
-        super().save(*args, **kwargs)
+        from django.db import transaction as db_transaction
+        
+        previous = getattr(self, '_rollup_snapshot', None)
+        current = self._get_rollup_key()
+        
+        with db_transaction.atomic():
+            super().save(*args, **kwargs)
+            if previous != current:
+                if previous:
+                    DailyAccountRollup.apply(*previous, count=-1)
+                if current:
+                    DailyAccountRollup.apply(*current, count=1)
+            self._invalidate_user_caches()
+            if previous_user_id not in (None, self.user_id):
+                invalidate_user_cache(previous_user_id)
+        
+        self._rollup_snapshot = current
+        self._loaded_account_id = self.account_id
+    
+    def _invalidate_user_caches(self):
+        """Invalidate cached pages for the owners of both accounts involved"""
+        invalidate_user_cache(
+            self.account.user_id,
+            self.to_account.user_id if self.to_account_id else None
+        )
+    
+    def delete(self, *args, **kwargs):
+        from django.db import transaction as db_transaction
+        
+        previous = getattr(self, '_rollup_snapshot', None)
+        with db_transaction.atomic():
+            self._invalidate_user_caches()
+            result = super().delete(*args, **kwargs)
+            if previous:
+                DailyAccountRollup.apply(*previous, count=-1)
+        self._rollup_snapshot = None
+        return result
+    
+    def transition_to(self, status, **fields):
+        """Move to ``status`` only if the stored status allows it
+        
+        The check and the write are a single conditional ``UPDATE``, so of
+        two workers racing on the same transaction only one moves it.
+        Use ``complete_transaction`` to complete, as that posts balances.
+        Returns whether the transaction moved.
+        """
+        if status == 'completed':
+            raise ValueError("Use complete_transaction() to complete a transaction")
+        
+        allowed_from = [
+            current for current, targets in self.STATUS_TRANSITIONS.items() if status in targets
+        ]
+        updated = Transaction.objects.filter(pk=self.pk, status__in=allowed_from).update(
+            status=status, updated_at=timezone.now(), **fields
+        )
+        if not updated:
+            return False
+        
+        self.status = status
+        for name, value in fields.items():
+            setattr(self, name, value)
+        self._invalidate_user_caches()
+        return True
+    
+    def get_balance_deltas(self):
+        """Return the balance change this transaction applies to each account id"""
+        if self.transaction_type == 'credit':
+            return {self.account_id: self.amount}
+        if self.transaction_type == 'debit':
+            return {self.account_id: -self.amount}
+        if self.transaction_type == 'transfer' and self.to_account_id:
+            return {self.account_id: -self.amount, self.to_account_id: self.amount}
+        return {}
     
     def complete_transaction(self):
-        """Mark transaction as completed and update account balance"""
+        """Mark transaction as completed and update account balance
+        
+        The transaction row and the affected account rows are locked, and
+        balances are changed with ``F()`` expressions, so concurrent
+        completions can neither double-post nor lose updates. A stored
+        status that ``STATUS_TRANSITIONS`` does not allow to complete, such
+        as ``failed`` or ``cancelled``, is left alone. Returns whether the
+        transaction is completed.
+        """
+        from django.db import transaction as db_transaction
+        
         if self.status == 'completed':
+            return True
+        
+        with db_transaction.atomic():
+            current_status = Transaction.objects.select_for_update().filter(
+                pk=self.pk
+            ).values_list('status', flat=True).first()
+            if current_status == 'completed':
+                self.status = 'completed'
+                return True
+            if 'completed' not in self.STATUS_TRANSITIONS.get(current_status, ()):
+                if current_status is not None:
+                    self.status = current_status
+                return False
+            
+            deltas = self.get_balance_deltas()
+            balances = Account.post_balance_deltas(
+                deltas,
+                require_funds=[self.account_id] if self.transaction_type in ('debit', 'transfer') else (),
+                transaction=self
+            )
+            
+            # Keep the in-memory accounts in step with the database
+            if self.account_id in balances:
+                self.account.balance = balances[self.account_id]
+            if self.to_account_id in balances:
+                self.to_account.balance = balances[self.to_account_id]
+            
+            self.status = 'completed'
+            self.save()
+        return True
+
+
+class DailyAccountRollup(models.Model):
+    """Per-day totals of completed transactions, kept in step with Transaction.save
+    
+    Rows are keyed by account, day (in the current time zone), category and
+    transaction type. Readers always ``Sum`` over rows, so analytics cost
+    depends on the number of days rather than the number of transactions.
+    """
+    account = models.ForeignKey(
+        Account, 
+        on_delete=models.CASCADE, 
+        related_name='daily_rollups'
+    )
+    day = models.DateField()
+    category = models.ForeignKey(
+        Category, 
+        on_delete=models.SET_NULL, 
+        null=True, 
+        blank=True
+    )
+    transaction_type = models.CharField(max_length=10, choices=Transaction.TRANSACTION_TYPES)
+    count = models.IntegerField(default=0)
+    total = models.DecimalField(max_digits=17, decimal_places=2, default=Decimal('0.00'))
+    
+    class Meta:
+        unique_together = ['account', 'day', 'category', 'transaction_type']
+        constraints = [
+            # NULLs are distinct in unique_together, so uncategorized buckets
+            # need their own constraint to stay one row per key
+            models.UniqueConstraint(
+                fields=['account', 'day', 'transaction_type'],
+                condition=models.Q(category__isnull=True),
+                name='rollup_uncategorized_unique',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['account', 'day']),
+        ]
+    
+    def __str__(self):
+        return f"{self.account_id} {self.day} {self.transaction_type}: {self.count} / ${self.total}"
+    
+    @classmethod
+    def apply(cls, account_id, day, category_id, transaction_type, amount, count=1):
+        """Add ``count`` transactions of ``amount`` each to a rollup bucket
+        
+        Pass a negative ``count`` to remove transactions from the bucket.
+        """
+        cls.add_to_bucket(account_id, day, category_id, transaction_type, count, amount * count)
+    
+    @classmethod
+    def add_to_bucket(cls, account_id, day, category_id, transaction_type, count, total):
+        """Atomically add a count and total to a bucket, creating it if needed"""
+        from django.db import IntegrityError, transaction as db_transaction
+        
+        bucket = cls.objects.filter(
+            account_id=account_id,
+            day=day,
+            category_id=category_id,
+            transaction_type=transaction_type,
+        )
+        if bucket.update(count=F('count') + count, total=F('total') + total):
             return
         
-        # Update account balance
-        if self.transaction_type == 'credit':
-            self.account.balance += self.amount
-        elif self.transaction_type == 'debit':
-            if not self.account.can_debit(self.amount):
-                raise ValueError("Insufficient funds")
-            self.account.balance -= self.amount
-        elif self.transaction_type == 'transfer' and self.to_account:
-            self.account.balance -= self.amount
-            self.to_account.balance += self.amount
-            self.to_account.save()
-        
-        self.status = 'completed'
-        self.account.save()
-        self.save()
+        try:
+            with db_transaction.atomic():
+                cls.objects.create(
+                    account_id=account_id,
+                    day=day,
+                    category_id=category_id,
+                    transaction_type=transaction_type,
+                    count=count,
+                    total=total,
+                )
+        except IntegrityError:
+            # Another writer created the bucket first
+            bucket.update(count=F('count') + count, total=F('total') + total)
+    
+    @classmethod
+    def merge_into_uncategorized(cls, category_id):
+        """Move a category's buckets into the matching uncategorized buckets
+        
+        Deleting a category sets its transactions' category to NULL; running
+        this first keeps one bucket per key instead of a duplicate NULL row.
+        """
+        buckets = cls.objects.filter(category_id=category_id)
+        rows = list(buckets.values_list('account_id', 'day', 'transaction_type', 'count', 'total'))
+        buckets.delete()
+        for account_id, day, transaction_type, count, total in rows:
+            cls.add_to_bucket(account_id, day, None, transaction_type, count, total)
+    
+    @classmethod
+    def apply_transactions(cls, transactions, sign=1):
+        """Fold many completed transactions into the rollups, one update per bucket
+        
+        Use this after ``bulk_create``/``update`` calls, which bypass ``save``.
+        Pass ``sign=-1`` to remove the transactions instead.
+        """
+        buckets = {}
+        for txn in transactions:
+            key = txn._get_rollup_key()
+            if not key:
+                continue
+            count, total = buckets.get(key[:4], (0, Decimal('0.00')))
+            buckets[key[:4]] = (count + sign, total + key[4] * sign)
+        
+        for bucket_key, (count, total) in buckets.items():
+            cls.add_to_bucket(*bucket_key, count, total)
+
+
+
+@receiver(pre_delete, sender=Category)
+def merge_category_rollups(sender, instance, using, **kwargs):
+    """Fold a deleted category's rollups into the uncategorized buckets"""
+    DailyAccountRollup.merge_into_uncategorized(instance.pk)
+
+
+class RollupCoverage(models.Model):
+    """Records from which day DailyAccountRollup rows are complete
+    
+    Set by the ``rebuild_rollups`` command; analytics fall back to scanning
+    transactions for any range that starts before ``covered_from``.
+    """
+    covered_from = models.DateField()
+    rebuilt_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Rollups complete from {self.covered_from}"
+    
+    @classmethod
+    def get_covered_from(cls):
+        """Return the first fully covered day, or None if rollups were never built"""
+        return cls.objects.order_by('-rebuilt_at').values_list('covered_from', flat=True).first()
+
+
+class LedgerEntry(models.Model):
+    """Append-only double-entry record of every balance change
+    
+    Each posting writes one entry per affected account, sharing a
+    ``posting_id``, plus a balancing entry against the external clearing
+    side (``account`` is null) when money enters or leaves the system, so
+    the entries of a posting always sum to zero. Entries are never updated
+    or deleted; corrections are new ``adjustment`` postings.
+    """
+    ENTRY_TYPES = [
+        ('opening', 'Opening Balance'),
+        ('posting', 'Posting'),
+        ('adjustment', 'Adjustment'),
+    ]
+    
+    posting_id = models.UUIDField()
+    account = models.ForeignKey(
+        Account, 
+        on_delete=models.CASCADE, 
+        null=True, 
+        blank=True,
+        related_name='ledger_entries',
+        help_text="Null for the external clearing side of a posting"
+    )
+    transaction = models.ForeignKey(
+        Transaction, 
+        on_delete=models.SET_NULL, 
+        null=True, 
+        blank=True,
+        related_name='ledger_entries'
+    )
+    entry_type = models.CharField(max_length=20, choices=ENTRY_TYPES, default='posting')
+    amount = models.DecimalField(max_digits=15, decimal_places=2)
+    posted_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        verbose_name_plural = 'ledger entries'
+        ordering = ['posted_at', 'id']
+        indexes = [
+            models.Index(fields=['account', 'posted_at']),
+            models.Index(fields=['posting_id']),
+        ]
+    
+    def __str__(self):
+        side = self.account_id or 'external'
+        return f"{self.entry_type} {side}: {self.amount}"
+    
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Ledger entries are append-only")
+        super().save(*args, **kwargs)
+    
+    def delete(self, *args, **kwargs):
+        raise ValueError("Ledger entries are append-only")
+    
+    @classmethod
+    def build_posting(cls, deltas, transaction=None, entry_type='posting', posted_at=None):
+        """Return the unsaved, balanced legs for a mapping of account id to signed amount"""
+        import uuid
+        
+        deltas = {pk: delta for pk, delta in deltas.items() if delta}
+        if not deltas:
+            return []
+        
+        posting_id = uuid.uuid4()
+        posted_at = posted_at or timezone.now()
+        legs = dict(deltas)
+        external = -sum(deltas.values())
+        if external:
+            legs[None] = external
+        
+        return [
+            cls(
+                posting_id=posting_id,
+                account_id=pk,
+                transaction=transaction,
+                entry_type=entry_type,
+                amount=amount,
+                posted_at=posted_at,
+            )
+            for pk, amount in legs.items()
+        ]
+    
+    @classmethod
+    def record(cls, deltas, transaction=None, entry_type='posting', posted_at=None):
+        """Write one balanced posting for a mapping of account id to signed amount"""
+        return cls.objects.bulk_create(cls.build_posting(deltas, transaction, entry_type, posted_at))
+    
+    @classmethod
+    def record_transactions(cls, transactions, batch_size=1000):
+        """Write one posting per saved transaction in a single bulk insert
+        
+        For callers that post many transactions' balance changes at once
+        with ``Account.post_balance_deltas(..., record_ledger=False)``.
+        """
+        posted_at = timezone.now()
+        entries = []
+        for txn in transactions:
+            entries.extend(cls.build_posting(txn.get_balance_deltas(), transaction=txn, posted_at=posted_at))
+        return cls.objects.bulk_create(entries, batch_size=batch_size)
+    
+    @classmethod
+    def balances_at(cls, account_ids, when=None, use_snapshots=True):
+        """Return ``{account_id: balance}`` as of ``when`` (default: now)
+        
+        Accounts are grouped by the ``as_of`` of their latest usable
+        snapshot, which is shared by every snapshot taken in the same run,
+        so the entries since are summed with one grouped query per group.
+        """
+        from django.db.models import OuterRef, Subquery
+        
+        account_ids = list(account_ids)
+        when = when or timezone.now()
+        balances = {pk: Decimal('0.00') for pk in account_ids}
+        groups = {None: []}
+        
+        if use_snapshots:
+            latest = BalanceSnapshot.objects.filter(
+                account=OuterRef('pk'), as_of__lte=when
+            ).order_by('-as_of')
+            rows = Account.objects.filter(pk__in=account_ids).annotate(
+                snapshot_as_of=Subquery(latest.values('as_of')[:1]),
+                snapshot_balance=Subquery(latest.values('balance')[:1]),
+            ).values_list('pk', 'snapshot_as_of', 'snapshot_balance')
+            for pk, as_of, balance in rows:
+                groups.setdefault(as_of, []).append(pk)
+                if as_of is not None:
+                    balances[pk] = balance
+        else:
+            groups[None] = account_ids
+        
+        for as_of, ids in groups.items():
+            if not ids:
+                continue
+            entries = cls.objects.filter(account_id__in=ids, posted_at__lte=when)
+            if as_of is not None:
+                entries = entries.filter(posted_at__gt=as_of)
+            totals = entries.values('account_id').annotate(total=Sum('amount')).order_by()
+            for row in totals:
+                balances[row['account_id']] += row['total']
+        return balances
+
+
+class BalanceSnapshot(models.Model):
+    """Checkpoint of an account's ledger balance at ``as_of``
+    
+    Point-in-time balances start from the latest snapshot and only add the
+    ledger entries posted after it.
+    """
+    # Entries posted less than this long ago may still be uncommitted
+    SETTLE_DELAY = timedelta(minutes=5)
+    
+    account = models.ForeignKey(
+        Account, 
+        on_delete=models.CASCADE, 
+        related_name='balance_snapshots'
+    )
+    balance = models.DecimalField(max_digits=15, decimal_places=2)
+    as_of = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-as_of']
+        indexes = [
+            models.Index(fields=['account', 'as_of']),
+        ]
+    
+    def __str__(self):
+        return f"{self.account_id} at {self.as_of}: ${self.balance}"
+    
+    @classmethod
+    def take(cls, account_ids=None, as_of=None, batch_size=500):
+        """Snapshot ledger balances in batches, skipping accounts with no new entries
+        
+        ``as_of`` defaults to ``SETTLE_DELAY`` ago so that postings still in
+        flight are not left out of the checkpoint. Returns the number of
+        snapshots written.
+        """
+        as_of = as_of or timezone.now() - cls.SETTLE_DELAY
+        if account_ids is None:
+            account_ids = Account.objects.order_by('pk').values_list('pk', flat=True)
+        account_ids = list(account_ids)
+        
+        written = 0
+        for start in range(0, len(account_ids), batch_size):
+            batch = account_ids[start:start + batch_size]
+            last_taken = dict(
+                cls.objects.filter(account_id__in=batch).values('account_id').annotate(
+                    last=models.Max('as_of')
+                ).values_list('account_id', 'last').order_by()
+            )
+            last_posted = LedgerEntry.objects.filter(
+                account_id__in=batch, posted_at__lte=as_of
+            ).values('account_id').annotate(
+                last=models.Max('posted_at')
+            ).values_list('account_id', 'last').order_by()
+            batch = [pk for pk, last in last_posted if pk not in last_taken or last > last_taken[pk]]
+            if not batch:
+                continue
+            balances = LedgerEntry.balances_at(batch, as_of)
+            cls.objects.bulk_create([
+                cls(account_id=pk, balance=balances[pk], as_of=as_of) for pk in batch
+            ])
+            written += len(batch)
+        return written
 
 
 class RecurringTransaction(models.Model):
@@ -205,8 +850,86 @@ class RecurringTransaction(models.Model):
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     
+    class Meta:
+        indexes = [
+            # Serves the due scan in process_recurring_transactions; inactive
+            # schedules are left out so the index only grows with live rows.
+            models.Index(
+                fields=['next_transaction_date'],
+                condition=models.Q(is_active=True),
+                name='recurring_due_idx',
+            ),
+        ]
+    
     def __str__(self):
         return f"Recurring: {self.description} - ${self.amount} {self.frequency}"
+    
+    def get_interval(self):
+        from dateutil.relativedelta import relativedelta
+        
+        return {
+            'daily': relativedelta(days=1),
+            'weekly': relativedelta(weeks=1),
+            'monthly': relativedelta(months=1),
+            'quarterly': relativedelta(months=3),
+            'yearly': relativedelta(years=1),
+        }[self.frequency]
+    
+    def get_due_dates(self, now=None):
+        """Return every scheduled date up to ``now`` and the first date after it
+        
+        Dates are offsets from ``next_transaction_date`` rather than repeated
+        additions, so monthly schedules anchored on the 31st do not drift.
+        """
+        now = now or timezone.now()
+        interval = self.get_interval()
+        due_dates = []
+        scheduled = self.next_transaction_date
+        while scheduled <= now:
+            due_dates.append(scheduled)
+            scheduled = self.next_transaction_date + interval * len(due_dates)
+        return due_dates, scheduled
+
+
+class MonthlyReport(models.Model):
+    """Stored month-end report for a user, written by the monthly report pipeline"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='monthly_reports')
+    period = models.DateField(help_text="First day of the reported month")
+    data = models.JSONField(default=dict)
+    generated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = ['user', 'period']
+        ordering = ['-period']
+    
+    def __str__(self):
+        return f"{self.user_id} {self.period:%Y-%m}"
+
+
+class StripeEvent(models.Model):
+    """Raw Stripe webhook event, stored on receipt and processed asynchronously"""
+    event_id = models.CharField(max_length=255, unique=True)
+    event_type = models.CharField(max_length=100)
+    payment_intent_id = models.CharField(max_length=255, blank=True)
+    stripe_created = models.DateTimeField(help_text="When Stripe created the event")
+    payload = models.JSONField()
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    
+    class Meta:
+        ordering = ['stripe_created', 'id']
+        indexes = [
+            # Unprocessed events, consumed in order per payment intent
+            models.Index(
+                fields=['payment_intent_id', 'stripe_created'],
+                condition=models.Q(processed_at__isnull=True),
+                name='stripe_event_pending_idx',
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.event_type} ({self.event_id})"
 
 
 class PaymentMethod(models.Model):
@@ -258,9 +981,42 @@ class UserPreferences(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    CACHE_TIMEOUT = 3600
+    
     def __str__(self):
         return f"{self.user.username}'s preferences"
     
+    @staticmethod
+    def cache_key(user_id):
+        return f'user_preferences:{user_id}'
+    
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        from django.core.cache import cache
+        cache.delete(self.cache_key(self.user_id))
+    
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        from django.core.cache import cache
+        cache.delete(self.cache_key(self.user_id))
+        return result
+    
+    @classmethod
+    def get_for_user(cls, user):
+        """Get preferences for a user without writing to the database
+        
+        Reads through a per-user cache entry that ``save`` invalidates. Users
+        without a stored row get an unsaved instance carrying the defaults.
+        """
+        from django.core.cache import cache
+        
+        key = cls.cache_key(user.pk)
+        preferences = cache.get(key)
+        if preferences is None:
+            preferences = cls.objects.filter(user=user).first() or cls(user_id=user.pk)
+            cache.set(key, preferences, cls.CACHE_TIMEOUT)
+        return preferences
+    
     @classmethod
     def get_or_create_for_user(cls, user):
         """Get or create preferences for a user"""
@@ -0,0 +1,236 @@
+"""
+Keyset pagination for transaction history
+
+Pages are addressed by an opaque cursor holding the ``(transaction_date, id)``
+of the row they continue from, instead of a page number. A page is then a
+range scan that stops after one page of rows, so a deep page costs the same
+as the first one and no ``COUNT(*)`` is needed to render it. This holds as
+long as the queryset pins one index prefix: ``user`` for a user's whole
+history (``txn_user_date_id_idx``) or ``account`` for a single account
+(``txn_account_date_id_idx``). Filtering through a join such as
+``account__user`` or on several accounts makes the database sort every
+matching row instead. An ``OR`` of two such prefixes can be paged as two
+branches, each read in order from its own index and merged.
+
+The REST API keeps page numbers by default and opts into cursors per request.
+"""
+import base64
+import heapq
+import json
+
+from django.core.paginator import Paginator as DjangoPaginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+# Newest first; ``id`` breaks ties between transactions with the same date
+KEYSET_ORDERING = ('-transaction_date', '-id')
+
+
+def encode_cursor(transaction, reverse=False) -> str:
+    """Return a cursor continuing from ``transaction``, backwards if ``reverse``"""
+    position = [transaction.transaction_date.isoformat(), transaction.pk, reverse]
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str):
+    """Return ``(transaction_date, id, reverse)``; raises ``ValueError`` for bad cursors"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        date, pk, reverse = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        transaction_date = parse_datetime(date)
+    except (TypeError, ValueError, UnicodeError) as e:
+        raise ValueError(f'Invalid cursor: {cursor!r}') from e
+    if transaction_date is None or not isinstance(pk, int) or not isinstance(reverse, bool):
+        raise ValueError(f'Invalid cursor: {cursor!r}')
+    return transaction_date, pk, reverse
+
+
+class KeysetPage:
+    """One page of transactions plus the cursors of its neighbours"""
+    
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+    
+    @property
+    def has_next(self) -> bool:
+        return self.next_cursor is not None
+    
+    @property
+    def has_previous(self) -> bool:
+        return self.previous_cursor is not None
+    
+    def has_other_pages(self) -> bool:
+        return self.has_next or self.has_previous
+    
+    def __iter__(self):
+        return iter(self.object_list)
+    
+    def __len__(self):
+        return len(self.object_list)
+    
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+
+def paginate_keyset(queryset, cursor=None, page_size=25) -> KeysetPage:
+    """Return the page of ``queryset`` that ``cursor`` points at, newest first
+    
+    Fetches one row beyond the page to learn whether another page follows.
+    ``queryset`` may also be a list of querysets selecting disjoint rows;
+    each branch fetches one page in order and the branches are merged.
+    Raises ``ValueError`` for a malformed cursor.
+    """
+    branches = queryset if isinstance(queryset, (list, tuple)) else [queryset]
+    
+    def fetch(bounds, ordering, descending):
+        pages = [list(branch.filter(*bounds).order_by(*ordering)[:page_size + 1]) for branch in branches]
+        if len(pages) == 1:
+            return pages[0]
+        merged = heapq.merge(*pages, key=lambda txn: (txn.transaction_date, txn.pk), reverse=descending)
+        return list(merged)[:page_size + 1]
+    
+    if not cursor:
+        rows = fetch((), KEYSET_ORDERING, True)
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        return KeysetPage(
+            rows,
+            next_cursor=encode_cursor(rows[-1]) if has_more else None,
+        )
+    
+    transaction_date, pk, reverse = decode_cursor(cursor)
+    if reverse:
+        # The page before the cursor: rows after it in ascending order, flipped
+        rows = fetch((
+            Q(transaction_date__gt=transaction_date) | Q(transaction_date=transaction_date, pk__gt=pk),
+            Q(transaction_date__gte=transaction_date),
+        ), ('transaction_date', 'id'), False)
+        has_more = len(rows) > page_size
+        rows = rows[:page_size][::-1]
+        return KeysetPage(
+            rows,
+            next_cursor=encode_cursor(rows[-1]) if rows else None,
+            previous_cursor=encode_cursor(rows[0], reverse=True) if has_more else None,
+        )
+    
+    # The redundant ``__lte`` bound lets the database range-scan the index
+    rows = fetch((
+        Q(transaction_date__lt=transaction_date) | Q(transaction_date=transaction_date, pk__lt=pk),
+        Q(transaction_date__lte=transaction_date),
+    ), KEYSET_ORDERING, True)
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    return KeysetPage(
+        rows,
+        next_cursor=encode_cursor(rows[-1]) if has_more else None,
+        previous_cursor=encode_cursor(rows[0], reverse=True) if rows else None,
+    )
+
+
+def estimate_count(queryset) -> int:
+    """Return the planner's row estimate for ``queryset`` on PostgreSQL
+    
+    Costs one ``EXPLAIN`` rather than a scan of every matching row; other
+    databases have no cheap estimate and fall back to an exact count.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return queryset.count()
+    
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class EstimatedCountPaginator(DjangoPaginator):
+    """Django paginator whose total comes from ``estimate_count``
+    
+    Page numbers past an underestimated total are reported as out of range,
+    and the last page may stop short; ``?count=exact`` gives true bounds.
+    """
+    
+    @cached_property
+    def count(self):
+        return estimate_count(self.object_list)
+
+
+class TransactionKeysetPagination(PageNumberPagination):
+    """Page-number pagination that switches to ``(transaction_date, id)`` cursors
+    
+    Without a ``cursor`` parameter this is ``PageNumberPagination``: ``?page=N``
+    and an exact ``count``, or the planner's estimate with ``?count=estimate``.
+    Passing ``cursor`` (empty for the newest page) pages by keyset instead,
+    where deep pages cost the same as the first; ``count`` is then only added
+    on request, as ``?count=exact`` or ``?count=estimate``.
+    """
+    
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    COUNT_MODES = ('exact', 'estimate', 'none')
+    
+    def get_count_mode(self, request, default):
+        count_mode = request.query_params.get(self.count_query_param)
+        return count_mode if count_mode in self.COUNT_MODES else default
+    
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.keyset = self.cursor_query_param in request.query_params
+        if not self.keyset:
+            count_mode = self.get_count_mode(request, 'exact')
+            self.django_paginator_class = (
+                EstimatedCountPaginator if count_mode == 'estimate' else DjangoPaginator
+            )
+            return super().paginate_queryset(queryset, request, view)
+        
+        cursor = request.query_params.get(self.cursor_query_param)
+        try:
+            self.page = paginate_keyset(queryset, cursor, self.get_page_size(request))
+        except ValueError:
+            raise NotFound('Invalid cursor')
+        
+        count_mode = self.get_count_mode(request, 'none')
+        if count_mode == 'exact':
+            self.count = queryset.count()
+        elif count_mode == 'estimate':
+            self.count = estimate_count(queryset)
+        else:
+            self.count = None
+        
+        return list(self.page)
+    
+    def _link(self, cursor):
+        if cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(remove_query_param(url, 'page'), self.cursor_query_param, cursor)
+    
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return super().get_paginated_response(data)
+        body = {}
+        if self.count is not None:
+            body['count'] = self.count
+        body.update({
+            'next': self._link(self.page.next_cursor),
+            'previous': self._link(self.page.previous_cursor),
+            'results': data,
+        })
+        return Response(body)
+    
+    def get_paginated_response_schema(self, schema):
+        # ``count`` is left out of keyset pages unless requested
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema['required'] = ['results']
+        return response_schema
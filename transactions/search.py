@@ -0,0 +1,194 @@
+"""
+Transaction search over descriptions and reference numbers
+
+On PostgreSQL, migration 0010 adds ``search_vector``, a ``tsvector`` column
+with a GIN index that a trigger keeps current on every write, bulk inserts
+and queryset updates included. Queries match every term as a prefix, so
+typeahead works from the first keystroke, and rank by ``ts_rank``. The
+column is not a model field: Django never selects or writes it.
+
+Other databases, and PostgreSQL before the migration has run, fall back to
+``icontains`` filters that need every term in the description or reference.
+
+``typeahead_search`` serves keystroke traffic from a per-user cache: a longer
+prefix is answered by filtering the cached rows of a shorter one in memory,
+against the lexemes the database indexed for each row.
+"""
+import hashlib
+import re
+
+from django.conf import settings
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVectorField
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import Q, TextField
+from django.db.models.expressions import RawSQL
+
+from .cache import get_user_cache_version
+from .models import Transaction
+
+SEARCH_VECTOR_COLUMN = 'search_vector'
+
+# Unstemmed, so prefixes of merchant names and reference numbers still match
+SEARCH_CONFIG = 'simple'
+
+# Split like the text search parser, which also breaks words on underscores
+_TERM_RE = re.compile(r'[^\W_]+', re.UNICODE)
+
+_column_present = {}
+
+
+def get_search_terms(query: str):
+    """Split a free-text query into lowercase word terms"""
+    return _TERM_RE.findall((query or '').lower())
+
+
+class FallbackSearchBackend:
+    """Substring search for databases without full-text indexes"""
+    
+    # Extra ``values()`` fields ``matches`` needs beyond ``SEARCH_FIELDS``
+    MATCH_FIELDS = ()
+    
+    def with_match_fields(self, queryset):
+        return queryset
+    
+    def filter(self, queryset, terms, rank=False):
+        for term in terms:
+            queryset = queryset.filter(
+                Q(description__icontains=term) | Q(reference_number__icontains=term)
+            )
+        if rank:
+            queryset = queryset.order_by('-transaction_date', '-id')
+        return queryset
+    
+    def matches(self, row, terms) -> bool:
+        """Apply ``filter`` to an already fetched ``values()`` row"""
+        text = f"{row['description']} {row['reference_number']}".lower()
+        return all(term in text for term in terms)
+
+
+class PostgresSearchBackend:
+    """Prefix full-text search on the GIN-indexed ``search_vector`` column"""
+    
+    MATCH_FIELDS = ('search_lexemes',)
+    
+    def _vector(self, queryset):
+        table = queryset.model._meta.db_table
+        return RawSQL(f'"{table}"."{SEARCH_VECTOR_COLUMN}"', [], output_field=SearchVectorField())
+    
+    def with_match_fields(self, queryset):
+        """Annotate each row with the lexemes its ``search_vector`` holds"""
+        table = queryset.model._meta.db_table
+        return queryset.annotate(search_lexemes=RawSQL(
+            f'tsvector_to_array("{table}"."{SEARCH_VECTOR_COLUMN}")', [],
+            output_field=ArrayField(TextField())
+        ))
+    
+    def filter(self, queryset, terms, rank=False):
+        if not terms:
+            return queryset
+        
+        # ``term:*`` is a prefix match; terms are \w+ so need no escaping
+        search_query = SearchQuery(
+            ' & '.join(f'{term}:*' for term in terms),
+            search_type='raw',
+            config=SEARCH_CONFIG,
+        )
+        vector = self._vector(queryset)
+        queryset = queryset.alias(search_document=vector).filter(search_document=search_query)
+        if rank:
+            queryset = queryset.annotate(
+                search_rank=SearchRank(vector, search_query)
+            ).order_by('-search_rank', '-transaction_date', '-id')
+        return queryset
+    
+    def matches(self, row, terms) -> bool:
+        """Apply ``filter`` to a ``values()`` row fetched with ``with_match_fields``
+        
+        ``term:*`` matches any lexeme starting with the term, so testing the
+        row's indexed lexemes agrees with the database's own tokenization.
+        """
+        lexemes = row['search_lexemes']
+        return all(any(lexeme.startswith(term) for lexeme in lexemes) for term in terms)
+
+
+def _has_search_column(alias) -> bool:
+    if alias not in _column_present:
+        connection = connections[alias]
+        with connection.cursor() as cursor:
+            columns = connection.introspection.get_table_description(cursor, Transaction._meta.db_table)
+        _column_present[alias] = any(column.name == SEARCH_VECTOR_COLUMN for column in columns)
+    return _column_present[alias]
+
+
+def get_search_backend(alias='default'):
+    """Return the search backend for a database alias"""
+    if connections[alias].vendor == 'postgresql' and _has_search_column(alias):
+        return PostgresSearchBackend()
+    return FallbackSearchBackend()
+
+
+def search_transactions(queryset, query: str, rank: bool = False):
+    """Filter ``queryset`` to transactions matching every term of ``query``
+    
+    With ``rank`` the best matches come first, newest first among equals;
+    without it the queryset keeps its ordering. A blank query matches all.
+    """
+    terms = get_search_terms(query)
+    if not terms:
+        return queryset
+    return get_search_backend(queryset.db).filter(queryset, terms, rank=rank)
+
+
+# Compact row shape returned by the search endpoint
+SEARCH_FIELDS = (
+    'id', 'description', 'reference_number', 'amount', 'transaction_type', 'status',
+    'transaction_date', 'account__name', 'category__name',
+)
+
+
+def _typeahead_key(user_id, version, account_id, prefix):
+    digest = hashlib.md5(prefix.encode()).hexdigest()
+    return f'typeahead:{user_id}:v{version}:{account_id or "all"}:{digest}'
+
+
+def typeahead_search(user, query: str, account_id=None, limit: int = 20):
+    """Return up to ``limit`` ranked ``SEARCH_FIELDS`` rows for a typeahead query
+    
+    Each normalized prefix caches up to ``TYPEAHEAD_CANDIDATES`` matches for
+    ``TYPEAHEAD_CACHE_TTL`` seconds. A longer prefix is answered in memory
+    from the longest cached shorter prefix whose matches were all kept, as
+    its matches can only be a subset. Keys carry the user's cache version,
+    so any write to the user's transactions orphans them.
+    """
+    terms = get_search_terms(query)
+    prefix = ' '.join(terms)
+    if not prefix:
+        return []
+    
+    version = get_user_cache_version(user.pk)
+    keys = [
+        _typeahead_key(user.pk, version, account_id, prefix[:end])
+        for end in range(len(prefix), 0, -1)
+    ]
+    cached = cache.get_many(keys)
+    if keys[0] in cached:
+        return cached[keys[0]]['rows'][:limit]
+    
+    backend = get_search_backend()
+    shorter = next((cached[key] for key in keys[1:] if key in cached and cached[key]['complete']), None)
+    if shorter is not None:
+        entry = {'rows': [row for row in shorter['rows'] if backend.matches(row, terms)], 'complete': True}
+    else:
+        queryset = Transaction.objects.filter(user=user)
+        if account_id:
+            queryset = queryset.filter(account_id=account_id)
+        candidates = settings.TYPEAHEAD_CANDIDATES
+        queryset = backend.with_match_fields(backend.filter(queryset, terms, rank=True))
+        rows = list(queryset.values(*SEARCH_FIELDS, *backend.MATCH_FIELDS)[:candidates + 1])
+        entry = {'rows': rows[:candidates], 'complete': len(rows) <= candidates}
+    
+    cache.set(keys[0], entry, settings.TYPEAHEAD_CACHE_TTL)
+    return entry['rows'][:limit]
+
@@ -39,7 +39,11 @@ class AccountSerializer(serializers.ModelSerializer):
         return instance
     
     def get_transaction_count(self, obj):
-        return obj.transactions.count()
+        # Prefer the count annotated by AccountViewSet.get_queryset
+        count = getattr(obj, 'transaction_count', None)
+        if count is None:
+            count = obj.transactions.count()
+        return count
 
 
 class TransactionSerializer(serializers.ModelSerializer):
@@ -3,36 +3,88 @@ Service layer for handling complex business logic and third-party integrations
 """
 import stripe
 import logging
+import time
 from decimal import Decimal
 from django.conf import settings
 from django.db import transaction
-from typing import Dict, Any, Optional
-from .models import Transaction, Account, PaymentMethod
+from django.db.models import Case, DecimalField, F, Q, Sum, Value, When
+from django.utils import timezone
+from typing import Dict, Any, List, Optional, Tuple
+from .models import (
+    Transaction, Account, PaymentMethod, DailyAccountRollup, RollupCoverage, LedgerEntry,
+    RecurringTransaction, MonthlyReport, StripeEvent
+)
+from .stripe_client import build_stripe_http_client
 # Removed circular import - will import in method
 
 logger = logging.getLogger(__name__)
 
 stripe.api_key = settings.STRIPE_SECRET_KEY
+stripe.default_http_client = build_stripe_http_client(settings)
+
+
+class PaymentServiceUnavailable(Exception):
+    """Stripe could not be reached or asked us to slow down; the call can be retried"""
+
+
+class PaymentPending(Exception):
+    """The payment intent has not reached a final state yet"""
+
+
+# Errors worth retrying: network failures, rate limiting and Stripe-side 5xx
+TRANSIENT_STRIPE_ERRORS = (
+    stripe.error.APIConnectionError,
+    stripe.error.RateLimitError,
+    stripe.error.APIError,
+)
 
 
 class StripePaymentService:
-    """Handle Stripe payment processing"""
+    """Handle Stripe payment processing
+    
+    Transient Stripe failures raise ``PaymentServiceUnavailable`` so callers
+    can retry; every other Stripe error is returned as ``{'success': False}``.
+    Calls go through the pooled transport from ``transactions.stripe_client``,
+    which also refuses calls while Stripe is failing or saturated.
+    """
+    
+    # Intent statuses that may still turn into a success or a failure
+    PENDING_STATUSES = ('processing', 'requires_action', 'requires_confirmation', 'requires_capture')
+    
+    @staticmethod
+    def configure(http_client: Optional[stripe.HTTPClient] = None) -> stripe.HTTPClient:
+        """Send Stripe calls through ``http_client``, or a fresh one built from settings"""
+        previous = stripe.default_http_client
+        stripe.default_http_client = http_client or build_stripe_http_client(settings)
+        if previous is not None and previous is not stripe.default_http_client:
+            previous.close()
+        return stripe.default_http_client
     
     @staticmethod
     def create_payment_intent(amount: Decimal, currency: str = 'usd', 
-                            metadata: Dict[str, Any] = None) -> Dict[str, Any]:
-        """Create a Stripe payment intent"""
+                            metadata: Dict[str, Any] = None,
+                            idempotency_key: Optional[str] = None) -> Dict[str, Any]:
+        """Create a Stripe payment intent
+        
+        Retries carrying the same ``idempotency_key`` get the original intent
+        back from Stripe instead of creating a second one.
+        """
+        options = {'idempotency_key': idempotency_key} if idempotency_key else {}
         try:
             intent = stripe.PaymentIntent.create(
                 amount=int(amount * 100),  # Convert to cents
                 currency=currency,
-                metadata=metadata or {}
+                metadata=metadata or {},
+                **options
             )
             return {
                 'success': True,
                 'client_secret': intent.client_secret,
                 'payment_intent_id': intent.id
             }
+        except TRANSIENT_STRIPE_ERRORS as e:
+            logger.warning(f"Stripe unavailable creating payment intent: {e}")
+            raise PaymentServiceUnavailable(str(e)) from e
         except stripe.error.StripeError as e:
             logger.error(f"Stripe error: {e}")
             return {
@@ -56,6 +108,9 @@ class StripePaymentService:
                 'status': intent.status,
                 'error': 'Payment not successful'
             }
+        except TRANSIENT_STRIPE_ERRORS as e:
+            logger.warning(f"Stripe unavailable confirming {payment_intent_id}: {e}")
+            raise PaymentServiceUnavailable(str(e)) from e
         except stripe.error.StripeError as e:
             logger.error(f"Stripe confirmation error: {e}")
             return {
@@ -64,12 +119,42 @@ class StripePaymentService:
             }
     
     @staticmethod
-    def create_customer(user_id: int, email: str) -> Dict[str, Any]:
+    def retrieve_payment_intent(payment_intent_id: str):
+        """Return a payment intent, or None if Stripe rejects the request"""
+        try:
+            return stripe.PaymentIntent.retrieve(payment_intent_id)
+        except TRANSIENT_STRIPE_ERRORS as e:
+            logger.warning(f"Stripe unavailable retrieving {payment_intent_id}: {e}")
+            raise PaymentServiceUnavailable(str(e)) from e
+        except stripe.error.StripeError as e:
+            logger.error(f"Stripe retrieval error for {payment_intent_id}: {e}")
+            return None
+    
+    @staticmethod
+    def list_payment_intents(created_since: int, page_size: int = 100):
+        """Yield pages of payment intents created at or after a Unix timestamp, newest first"""
+        params = {'created': {'gte': created_since}, 'limit': page_size}
+        while True:
+            try:
+                page = stripe.PaymentIntent.list(**params)
+            except TRANSIENT_STRIPE_ERRORS as e:
+                logger.warning(f"Stripe unavailable listing payment intents: {e}")
+                raise PaymentServiceUnavailable(str(e)) from e
+            yield page.data
+            if not page.has_more or not page.data:
+                return
+            params['starting_after'] = page.data[-1].id
+    
+    @staticmethod
+    def create_customer(user_id: int, email: str,
+                        idempotency_key: Optional[str] = None) -> Dict[str, Any]:
         """Create a Stripe customer"""
+        options = {'idempotency_key': idempotency_key} if idempotency_key else {}
         try:
             customer = stripe.Customer.create(
                 email=email,
-                metadata={'user_id': user_id}
+                metadata={'user_id': user_id},
+                **options
             )
             return {
                 'success': True,
@@ -90,7 +175,8 @@ class TransactionService:
     @transaction.atomic
     def create_transaction(account: Account, amount: Decimal, 
                          description: str, transaction_type: str = 'debit',
-                         category=None, metadata: Dict[str, Any] = None) -> Transaction:
+                         category=None, metadata: Dict[str, Any] = None,
+                         reference_number: str = '') -> Transaction:
         """Create a new transaction with proper validation"""
         
         # Validate transaction
@@ -104,45 +190,234 @@ class TransactionService:
             description=description,
             transaction_type=transaction_type,
             category=category,
-            metadata=metadata or {}
+            metadata=metadata or {},
+            reference_number=reference_number
         )
         
         logger.info(f"Transaction created: {txn.reference_number}")
         return txn
     
+    BULK_TRANSACTION_TYPES = ('credit', 'debit')
+    
+    @staticmethod
+    def _validate_bulk_row(row) -> Tuple[Optional[Dict[str, Any]], Dict[str, str]]:
+        """Validate and coerce one bulk ingestion row without touching the database"""
+        from decimal import InvalidOperation
+        from django.utils import timezone
+        from django.utils.dateparse import parse_datetime
+        
+        if not isinstance(row, dict):
+            return None, {'non_field_errors': 'Expected an object'}
+        
+        errors = {}
+        data = {}
+        
+        try:
+            data['account_id'] = int(row.get('account_id'))
+        except (TypeError, ValueError):
+            errors['account_id'] = 'A valid integer is required'
+        
+        try:
+            amount = Decimal(str(row.get('amount')))
+            if not amount.is_finite() or amount <= 0:
+                errors['amount'] = 'Amount must be positive'
+            elif amount != amount.quantize(Decimal('0.01')) or amount >= Decimal('1e13'):
+                errors['amount'] = 'Amount must have at most 13 digits and 2 decimal places'
+            else:
+                data['amount'] = amount
+        except (InvalidOperation, ValueError):
+            errors['amount'] = 'A valid number is required'
+        
+        description = row.get('description')
+        if not isinstance(description, str) or not description.strip():
+            errors['description'] = 'This field is required'
+        elif len(description) > 255:
+            errors['description'] = 'Ensure this field has no more than 255 characters'
+        else:
+            data['description'] = description
+        
+        transaction_type = row.get('transaction_type', 'debit')
+        if transaction_type not in TransactionService.BULK_TRANSACTION_TYPES:
+            errors['transaction_type'] = f'"{transaction_type}" is not a valid choice'
+        else:
+            data['transaction_type'] = transaction_type
+        
+        category_id = row.get('category_id')
+        if category_id is not None:
+            try:
+                data['category_id'] = int(category_id)
+            except (TypeError, ValueError):
+                errors['category_id'] = 'A valid integer is required'
+        
+        transaction_date = row.get('transaction_date')
+        if transaction_date is not None:
+            parsed = parse_datetime(transaction_date) if isinstance(transaction_date, str) else None
+            if parsed is None:
+                errors['transaction_date'] = 'Datetime must be in ISO 8601 format'
+            else:
+                data['transaction_date'] = parsed if timezone.is_aware(parsed) else timezone.make_aware(parsed)
+        
+        metadata = row.get('metadata', {})
+        if not isinstance(metadata, dict):
+            errors['metadata'] = 'Expected an object'
+        else:
+            data['metadata'] = metadata
+        
+        return (None if errors else data), errors
+    
+    @staticmethod
+    def bulk_create_transactions(user, rows: List[Any], chunk_size: int = 1000) -> List[Dict[str, Any]]:
+        """Validate and insert many pending transactions for a user
+        
+        Accounts and categories are looked up once for the whole batch,
+        reference numbers are generated in bulk, and valid rows are inserted
+        with ``bulk_create`` in chunks, each chunk in its own database
+        transaction. Invalid rows are skipped. Returns one result per input
+        row, in input order.
+        """
+        from .models import Category
+        from .cache import invalidate_user_cache
+        
+        results = [None] * len(rows)
+        validated = []
+        for index, row in enumerate(rows):
+            data, errors = TransactionService._validate_bulk_row(row)
+            if errors:
+                results[index] = {'index': index, 'success': False, 'errors': errors}
+            else:
+                validated.append((index, data))
+        
+        accounts = Account.objects.filter(
+            user=user,
+            id__in={data['account_id'] for _, data in validated}
+        ).in_bulk()
+        category_ids = set(Category.objects.filter(
+            id__in={data['category_id'] for _, data in validated if 'category_id' in data}
+        ).values_list('id', flat=True))
+        
+        pending = []
+        for index, data in validated:
+            account = accounts.get(data['account_id'])
+            if account is None:
+                results[index] = {'index': index, 'success': False, 'errors': {'account_id': 'Account not found'}}
+            elif data.get('category_id') is not None and data['category_id'] not in category_ids:
+                results[index] = {'index': index, 'success': False, 'errors': {'category_id': 'Category not found'}}
+            elif data['transaction_type'] == 'debit' and not account.can_debit(data['amount']):
+                results[index] = {'index': index, 'success': False, 'errors': {'amount': 'Insufficient funds'}}
+            else:
+                pending.append((index, data))
+        
+        for start in range(0, len(pending), chunk_size):
+            chunk = pending[start:start + chunk_size]
+            references = Transaction.generate_reference_numbers(len(chunk))
+            objects = [
+                Transaction(reference_number=reference, status='pending', **data)
+                for (_, data), reference in zip(chunk, references)
+            ]
+            with transaction.atomic():
+                Transaction.objects.bulk_create(objects)
+            for (index, _), txn in zip(chunk, objects):
+                results[index] = {
+                    'index': index,
+                    'success': True,
+                    'id': txn.pk,
+                    'reference_number': txn.reference_number,
+                }
+        
+        if pending:
+            invalidate_user_cache(user.pk)
+        
+        logger.info(f"Bulk ingestion for user {user.pk}: {len(pending)} of {len(rows)} rows created")
+        return results
+    
+    @staticmethod
+    def allocate_funds(transactions: List[Transaction]) -> List[Transaction]:
+        """Mark each transaction completed or failed against a running account balance
+        
+        Transactions are taken in order, and each debit or outgoing transfer
+        is checked with ``can_debit`` against what the earlier ones left.
+        The caller must hold row locks on the transactions' accounts, whose
+        in-memory balances are drawn down. Nothing is saved; pass the
+        returned completed transactions to ``post_completed`` once stored.
+        """
+        completed = []
+        for txn in transactions:
+            account = txn.account
+            if txn.transaction_type in ('debit', 'transfer') and not account.can_debit(txn.amount):
+                txn.status = 'failed'
+                txn.metadata = {**txn.metadata, 'error': 'Insufficient funds'}
+                continue
+            account.balance += txn.get_balance_deltas().get(account.pk, Decimal('0.00'))
+            txn.status = 'completed'
+            completed.append(txn)
+        return completed
+    
+    @staticmethod
+    def post_completed(transactions: List[Transaction]) -> None:
+        """Post balances, ledger entries and rollups for stored, newly completed transactions
+        
+        The batch counterpart of ``complete_transaction`` for rows written
+        with ``bulk_create``/``bulk_update``: one balance update per
+        account, one ledger insert and one rollup update per bucket.
+        """
+        deltas = {}
+        for txn in transactions:
+            for pk, delta in txn.get_balance_deltas().items():
+                deltas[pk] = deltas.get(pk, Decimal('0.00')) + delta
+        Account.post_balance_deltas(deltas, record_ledger=False)
+        LedgerEntry.record_transactions(transactions)
+        DailyAccountRollup.apply_transactions(transactions)
+    
     @staticmethod
-    @transaction.atomic
     def process_payment(account: Account, amount: Decimal, 
                        payment_method_id: str, description: str) -> Dict[str, Any]:
-        """Process a payment using Stripe"""
+        """Process a payment using Stripe
+        
+        The pending transaction is committed before Stripe is called and the
+        intent id is recorded afterwards, so no database transaction or row
+        lock is held across the network round trip (provided the caller is
+        not itself inside an atomic block). If the intent cannot be created
+        the transaction is marked failed.
+        """
+        # The reference number doubles as the Stripe idempotency key
+        with transaction.atomic():
+            txn = TransactionService.create_transaction(
+                account=account,
+                amount=amount,
+                description=description,
+                transaction_type='debit',
+                metadata={'payment_method': payment_method_id},
+                reference_number=Transaction.generate_reference_number()
+            )
         
         # Create payment intent
-        result = StripePaymentService.create_payment_intent(
-            amount=amount,
-            metadata={
-                'account_id': account.id,
-                'user_id': account.user.id
-            }
-        )
+        try:
+            result = StripePaymentService.create_payment_intent(
+                amount=amount,
+                metadata={
+                    'account_id': account.id,
+                    'user_id': account.user_id,
+                    'reference_number': txn.reference_number
+                },
+                idempotency_key=f"payment-intent-{txn.reference_number}"
+            )
+        except PaymentServiceUnavailable as e:
+            result = {'success': False, 'error': str(e)}
         
         if not result['success']:
-            return result
-        
-        # Create pending transaction
-        txn = TransactionService.create_transaction(
-            account=account,
-            amount=amount,
-            description=description,
-            transaction_type='debit',
-            metadata={
-                'payment_intent_id': result['payment_intent_id'],
-                'payment_method': payment_method_id
-            }
-        )
+            txn.transition_to('failed', metadata={**txn.metadata, 'error': result['error']})
+            logger.error(f"Payment intent not created: {txn.reference_number} - {result['error']}")
+            return {**result, 'transaction_id': txn.id}
         
-        # Process payment asynchronously
+        # Process payment asynchronously once the intent id is visible
         from .tasks import process_payment_async
-        process_payment_async.delay(txn.id, result['payment_intent_id'])
+        payment_intent_id = result['payment_intent_id']
+        with transaction.atomic():
+            Transaction.objects.filter(pk=txn.pk).update(
+                metadata={**txn.metadata, 'payment_intent_id': payment_intent_id},
+                updated_at=timezone.now()
+            )
+            transaction.on_commit(lambda: process_payment_async.delay(txn.id, payment_intent_id))
         
         return {
             'success': True,
@@ -175,57 +450,858 @@ class TransactionService:
         return txn
 
 
+class RecurringTransactionService:
+    """Generate the transactions owed by due recurring transactions, in batches"""
+    
+    @staticmethod
+    def get_due_ids(now=None) -> List[int]:
+        return list(RecurringTransaction.objects.filter(
+            is_active=True,
+            next_transaction_date__lte=now or timezone.now()
+        ).order_by('pk').values_list('pk', flat=True))
+    
+    @staticmethod
+    def process_batch(recurring_ids: List[int], now=None) -> Dict[str, Any]:
+        """Claim and process a batch of recurring transactions in one database transaction
+        
+        Rows locked by a concurrent run are skipped rather than waited on.
+        Every period missed since ``next_transaction_date`` is generated,
+        dated on its schedule, and inserted with ``bulk_create``; balances,
+        ledger and rollups are then updated once per batch. Debits the
+        account cannot cover are recorded as failed and the schedule still
+        moves on. Returns the batch's metrics.
+        """
+        from .cache import invalidate_user_cache
+        
+        started = time.monotonic()
+        now = now or timezone.now()
+        
+        with transaction.atomic():
+            claimed = list(RecurringTransaction.objects.select_for_update(skip_locked=True).filter(
+                pk__in=recurring_ids,
+                is_active=True,
+                next_transaction_date__lte=now
+            ).order_by('pk'))
+            
+            occurrences = []
+            for recurring in claimed:
+                due_dates, recurring.next_transaction_date = recurring.get_due_dates(now)
+                occurrences.extend((scheduled, recurring.pk, recurring) for scheduled in due_dates)
+            occurrences.sort(key=lambda occurrence: occurrence[:2])
+            
+            accounts = {
+                account.pk: account
+                for account in Account.objects.select_for_update().filter(
+                    pk__in={recurring.account_id for recurring in claimed}
+                ).order_by('pk')
+            }
+            
+            references = Transaction.generate_reference_numbers(len(occurrences))
+            objects = [
+                Transaction(
+                    account=accounts[recurring.account_id],
+                    amount=recurring.amount,
+                    description=f"Recurring: {recurring.description}",
+                    transaction_type='debit',
+                    category_id=recurring.category_id,
+                    reference_number=reference,
+                    transaction_date=scheduled,
+                    metadata={'recurring_id': recurring.id}
+                )
+                for (scheduled, _, recurring), reference in zip(occurrences, references)
+            ]
+            completed = TransactionService.allocate_funds(objects)
+            
+            Transaction.objects.bulk_create(objects, batch_size=1000)
+            TransactionService.post_completed(completed)
+            RecurringTransaction.objects.bulk_update(claimed, ['next_transaction_date'], batch_size=1000)
+            invalidate_user_cache(*(account.user_id for account in accounts.values()))
+        
+        return {
+            'recurring': len(claimed),
+            'transactions': len(objects),
+            'failed': len(objects) - len(completed),
+            'seconds': time.monotonic() - started,
+        }
+
+
+class PaymentReconciliationService:
+    """Settle pending card payments from pages of Stripe payment intents
+    
+    One list call returns up to a hundred intents, so confirming payments
+    this way costs a few requests per run instead of one per transaction.
+    Each run lists only the intents created since the previous run; pending
+    transactions from before it are retrieved one by one, so a payment
+    stuck pending for hours costs one request per run, not a day of pages.
+    """
+    
+    # Pending transactions older than this are left to manual follow-up
+    LOOKBACK = timezone.timedelta(hours=24)
+    # Payment intents are created just before their transaction
+    CLOCK_MARGIN = timezone.timedelta(minutes=5)
+    # Start time of the last completed run; intents created before it were listed then
+    LAST_RUN_CACHE_KEY = 'payment_reconciliation:last_run'
+    
+    @staticmethod
+    def get_outcome(intent) -> Optional[Tuple[str, str]]:
+        """Return ``(status, error)`` for a settled intent, or None while it may still change
+        
+        A declined intent is back in ``requires_payment_method`` and can still
+        succeed if the customer retries, so it stays pending until canceled.
+        """
+        if intent.status == 'succeeded':
+            return 'completed', ''
+        if intent.status == 'canceled':
+            return 'failed', 'Payment canceled'
+        return None
+    
+    @staticmethod
+    def reconcile(page_size: int = 100, now=None) -> Dict[str, int]:
+        """Match recent payment intents to pending transactions and settle them page by page
+        
+        Transactions created since the last run are matched against the
+        intents listed since then, less ``CLOCK_MARGIN``; older ones are
+        retrieved individually. Without a recorded last run, for example
+        after a cache flush, every pending transaction is matched by listing.
+        """
+        from django.core.cache import cache
+        
+        now = now or timezone.now()
+        last_run = cache.get(PaymentReconciliationService.LAST_RUN_CACHE_KEY)
+        pending = dict(Transaction.objects.filter(
+            status__in=('pending', 'processing'),
+            metadata__has_key='payment_intent_id',
+            created_at__gte=now - PaymentReconciliationService.LOOKBACK
+        ).values_list('metadata__payment_intent_id', 'created_at'))
+        stragglers = [
+            intent_id for intent_id, created_at in pending.items()
+            if last_run and created_at < last_run
+        ]
+        for intent_id in stragglers:
+            del pending[intent_id]
+        
+        metrics = {
+            'pending': len(pending) + len(stragglers), 'pages': 0, 'intents': 0, 'retrieved': 0,
+            'completed': 0, 'failed': 0,
+        }
+        
+        def settle(outcomes):
+            if outcomes:
+                completed, failed = PaymentReconciliationService.settle(outcomes)
+                metrics['completed'] += completed
+                metrics['failed'] += failed
+        
+        if pending:
+            created_since = int((min(pending.values()) - PaymentReconciliationService.CLOCK_MARGIN).timestamp())
+            for page in StripePaymentService.list_payment_intents(created_since, page_size):
+                metrics['pages'] += 1
+                metrics['intents'] += len(page)
+                outcomes = {}
+                for intent in page:
+                    outcome = PaymentReconciliationService.get_outcome(intent)
+                    if intent.id in pending and outcome:
+                        outcomes[intent.id] = outcome
+                        del pending[intent.id]
+                settle(outcomes)
+                if not pending:
+                    break
+        
+        outcomes = {}
+        for intent_id in stragglers:
+            intent = StripePaymentService.retrieve_payment_intent(intent_id)
+            metrics['retrieved'] += 1
+            outcome = PaymentReconciliationService.get_outcome(intent) if intent else None
+            if outcome:
+                outcomes[intent_id] = outcome
+        settle(outcomes)
+        
+        cache.set(
+            PaymentReconciliationService.LAST_RUN_CACHE_KEY, now,
+            int(PaymentReconciliationService.LOOKBACK.total_seconds())
+        )
+        return metrics
+    
+    @staticmethod
+    @transaction.atomic
+    def settle(outcomes: Dict[str, Tuple[str, str]]) -> Tuple[int, int]:
+        """Complete or fail the transactions of a page of settled intents in one batch
+        
+        Rows are locked and re-checked, so transactions settled meanwhile
+        by ``process_payment_async`` are left alone. Returns the number of
+        transactions completed and failed.
+        """
+        from .cache import invalidate_user_cache
+        
+        transactions = list(Transaction.objects.select_for_update().filter(
+            status__in=('pending', 'processing'),
+            metadata__payment_intent_id__in=list(outcomes)
+        ).order_by('transaction_date', 'pk'))
+        accounts = Account.objects.select_for_update().filter(
+            pk__in={txn.account_id for txn in transactions} | {txn.to_account_id for txn in transactions}
+        ).order_by('pk').in_bulk()
+        
+        succeeded = []
+        failed = []
+        for txn in transactions:
+            txn.account = accounts[txn.account_id]
+            if txn.to_account_id:
+                txn.to_account = accounts[txn.to_account_id]
+            status, error = outcomes[txn.metadata['payment_intent_id']]
+            txn.external_payment_id = txn.metadata['payment_intent_id']
+            if status == 'completed':
+                succeeded.append(txn)
+            else:
+                txn.status = 'failed'
+                txn.metadata = {**txn.metadata, 'error': error}
+                failed.append(txn)
+        
+        completed = TransactionService.allocate_funds(succeeded)
+        now = timezone.now()
+        for txn in transactions:
+            txn.updated_at = now
+        Transaction.objects.bulk_update(
+            transactions, ['status', 'metadata', 'external_payment_id', 'updated_at'], batch_size=1000
+        )
+        TransactionService.post_completed(completed)
+        invalidate_user_cache(*(account.user_id for account in accounts.values()))
+        
+        return len(completed), len(transactions) - len(completed)
+
+
+class StripeWebhookService:
+    """Receive Stripe webhook events durably and apply them in order per payment intent"""
+    
+    @staticmethod
+    def get_outcome(event: StripeEvent) -> Optional[Tuple[str, str]]:
+        """Return the ``(status, error)`` an event settles its transactions with, if any
+        
+        ``payment_intent.payment_failed`` settles nothing: the intent goes
+        back to ``requires_payment_method`` and may still succeed when the
+        customer retries, so only ``canceled`` fails the transaction.
+        """
+        if event.event_type == 'payment_intent.succeeded':
+            return 'completed', ''
+        if event.event_type == 'payment_intent.canceled':
+            return 'failed', 'Payment canceled'
+        return None
+    
+    @staticmethod
+    def receive(payload: bytes, signature: str) -> StripeEvent:
+        """Verify a webhook delivery and store it with a single insert
+        
+        Redeliveries of a stored event are ignored by the insert. Raises
+        ``ValueError`` for malformed payloads and
+        ``stripe.error.SignatureVerificationError`` for bad signatures.
+        """
+        import json
+        from datetime import datetime, timezone as dt_timezone
+        
+        if not settings.STRIPE_WEBHOOK_SECRET:
+            raise ValueError("STRIPE_WEBHOOK_SECRET is not configured")
+        
+        payload = payload.decode('utf-8')
+        stripe.WebhookSignature.verify_header(
+            payload, signature, settings.STRIPE_WEBHOOK_SECRET,
+            tolerance=settings.STRIPE_WEBHOOK_TOLERANCE
+        )
+        
+        try:
+            data = json.loads(payload)
+            obj = data['data']['object']
+            intent_id = obj['id'] if obj.get('object') == 'payment_intent' else obj.get('payment_intent')
+            event = StripeEvent(
+                event_id=data['id'],
+                event_type=data['type'],
+                payment_intent_id=intent_id or '',
+                stripe_created=datetime.fromtimestamp(data['created'], tz=dt_timezone.utc),
+                payload=data,
+            )
+        except (KeyError, TypeError) as e:
+            raise ValueError(f"Malformed Stripe event: {e}") from e
+        
+        StripeEvent.objects.bulk_create([event], ignore_conflicts=True)
+        return event
+    
+    @staticmethod
+    @transaction.atomic
+    def process_events(payment_intent_id: str) -> int:
+        """Apply the unprocessed events of one payment intent in the order Stripe created them
+        
+        The events are locked first, so concurrent consumers for the same
+        intent run one after the other. Returns the number of events applied.
+        """
+        events = list(StripeEvent.objects.select_for_update().filter(
+            payment_intent_id=payment_intent_id,
+            processed_at__isnull=True
+        ).order_by('stripe_created', 'id'))
+        
+        for event in events:
+            outcome = StripeWebhookService.get_outcome(event)
+            if outcome and payment_intent_id:
+                PaymentReconciliationService.settle({payment_intent_id: outcome})
+            event.processed_at = timezone.now()
+        
+        StripeEvent.objects.bulk_update(events, ['processed_at'])
+        return len(events)
+    
+    @staticmethod
+    def get_pending_intent_ids() -> List[str]:
+        return list(StripeEvent.objects.filter(
+            processed_at__isnull=True
+        ).order_by().values_list('payment_intent_id', flat=True).distinct())
+
+
+class AdminStatsService:
+    """Site-wide statistics for the admin dashboard, served from the cache
+    
+    A Celery beat task keeps the snapshot fresh. Readers get the cached copy
+    immediately; once it is older than ``ADMIN_STATS_CACHE_TTL`` a single
+    background refresh is queued while the stale copy keeps being served, up
+    to ``ADMIN_STATS_STALE_TTL`` when the cache entry expires.
+    """
+    CACHE_KEY = 'admin_stats:snapshot'
+    REFRESH_LOCK_KEY = 'admin_stats:refreshing'
+    
+    @staticmethod
+    def compute() -> Dict[str, Any]:
+        """Run the statistics queries"""
+        import json
+        from django.contrib.auth.models import User
+        from django.db.models import Sum, Count
+        from django.db.models.functions import TruncMonth
+        from django.utils import timezone
+        from dateutil.relativedelta import relativedelta
+        from .models import Category
+        
+        today = timezone.localdate()
+        now = timezone.now()
+        
+        account_totals = Account.objects.aggregate(count=Count('id'), total=Sum('balance'))
+        transaction_totals = Transaction.objects.aggregate(
+            count=Count('id'),
+            pending=Count('id', filter=Q(status='pending')),
+            today=Count('id', filter=Q(created_at__date=today))
+        )
+        
+        # Monthly transaction counts for the last six calendar months
+        current_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        month_starts = [current_month - relativedelta(months=i) for i in range(5, -1, -1)]
+        monthly_counts = {
+            (row['month'].year, row['month'].month): row['count']
+            for row in Transaction.objects.filter(
+                created_at__gte=month_starts[0]
+            ).annotate(
+                month=TruncMonth('created_at')
+            ).values('month').annotate(count=Count('id')).order_by()
+        }
+        
+        account_types = Account.objects.values('account_type').annotate(
+            count=Count('id')
+        ).order_by('account_type')
+        
+        return {
+            'user_count': User.objects.count(),
+            'account_count': account_totals['count'],
+            'transaction_count': transaction_totals['count'],
+            'category_count': Category.objects.count(),
+            'total_balance': account_totals['total'] or 0,
+            'pending_transactions': transaction_totals['pending'],
+            'recent_user_count': User.objects.filter(date_joined__date=today).count(),
+            'recent_account_count': Account.objects.filter(created_at__date=today).count(),
+            'recent_transaction_count': transaction_totals['today'],
+            'monthly_labels': json.dumps([month.strftime('%b') for month in month_starts]),
+            'monthly_transactions': json.dumps([
+                monthly_counts.get((month.year, month.month), 0) for month in month_starts
+            ]),
+            'account_type_labels': json.dumps([row['account_type'].title() for row in account_types]),
+            'account_type_data': json.dumps([row['count'] for row in account_types]),
+        }
+    
+    @staticmethod
+    def refresh() -> Dict[str, Any]:
+        """Recompute the statistics and store them in the cache"""
+        from django.core.cache import cache
+        from django.utils import timezone
+        
+        stats = AdminStatsService.compute()
+        cache.set(
+            AdminStatsService.CACHE_KEY,
+            {'computed_at': timezone.now(), 'stats': stats},
+            timeout=settings.ADMIN_STATS_STALE_TTL
+        )
+        cache.delete(AdminStatsService.REFRESH_LOCK_KEY)
+        return stats
+    
+    @staticmethod
+    def get_snapshot() -> Dict[str, Any]:
+        """Return cached statistics, scheduling a refresh when they are stale"""
+        from django.core.cache import cache
+        from django.utils import timezone
+        
+        snapshot = cache.get(AdminStatsService.CACHE_KEY)
+        if snapshot is None:
+            # Cold cache: compute once inline so the page has something to show
+            return AdminStatsService.refresh()
+        
+        age = (timezone.now() - snapshot['computed_at']).total_seconds()
+        if age > settings.ADMIN_STATS_CACHE_TTL and cache.add(
+            AdminStatsService.REFRESH_LOCK_KEY, True, timeout=settings.ADMIN_STATS_CACHE_TTL
+        ):
+            try:
+                from .tasks import refresh_admin_stats
+                refresh_admin_stats.delay()
+            except Exception as e:
+                logger.error(f"Could not queue admin stats refresh: {e}")
+                cache.delete(AdminStatsService.REFRESH_LOCK_KEY)
+        
+        return snapshot['stats']
+
+
+class AccountHistoryService:
+    """Page through one account's transactions with a running balance per row"""
+    
+    PAGE_SIZE = 25
+    
+    @staticmethod
+    def get_history(account: Account):
+        """Return every transaction moving money in or out of ``account``
+        
+        Only transfers credit ``to_account``. The debit leg that
+        ``transfer_funds_ajax`` writes also names it, but the money arrives
+        through that transfer's separate credit leg, which is already listed.
+        """
+        return Transaction.objects.filter(
+            Q(account=account) | Q(to_account=account, transaction_type='transfer')
+        )
+    
+    @staticmethod
+    def get_branches(account: Account) -> List:
+        """Split ``get_history`` into disjoint querysets, each served in order by one index"""
+        return [
+            Transaction.objects.filter(account=account),
+            Transaction.objects.filter(to_account=account, transaction_type='transfer').exclude(account=account),
+        ]
+    
+    @staticmethod
+    def signed_amount(account: Account) -> Case:
+        """Expression for the change a transaction made to ``account``'s balance
+        
+        Mirrors ``Transaction.get_balance_deltas``; only completed
+        transactions have moved the balance.
+        """
+        return Case(
+            When(~Q(status='completed'), then=Value(Decimal('0.00'))),
+            When(transaction_type='credit', account=account, then=F('amount')),
+            When(transaction_type='debit', account=account, then=-F('amount')),
+            When(transaction_type='transfer', account=account, to_account__isnull=False, then=-F('amount')),
+            When(transaction_type='transfer', to_account=account, then=F('amount')),
+            default=Value(Decimal('0.00')),
+            output_field=DecimalField(max_digits=15, decimal_places=2),
+        )
+    
+    @classmethod
+    def get_balance_after(cls, account: Account, txn: Transaction) -> Decimal:
+        """Return ``account``'s balance right after ``txn`` in history order
+        
+        Reads the ledger balance before ``txn``'s date, from the nearest
+        ``BalanceSnapshot``, and adds the history rows sharing that date up
+        to ``txn``. The cost does not depend on how old ``txn`` is.
+        """
+        before = LedgerEntry.balances_at(
+            [account.pk], txn.transaction_date - timezone.timedelta(microseconds=1)
+        )[account.pk]
+        ties = cls.get_history(account).filter(
+            transaction_date=txn.transaction_date, pk__lte=txn.pk
+        ).aggregate(total=Sum(cls.signed_amount(account)))['total']
+        return before + (ties or 0)
+    
+    @classmethod
+    def get_page(cls, account: Account, cursor: Optional[str] = None,
+                 date_from=None, date_to=None, page_size: int = PAGE_SIZE):
+        """Return a keyset page of history with ``running_balance`` set on each row
+        
+        ``running_balance`` is the balance right after each transaction. The
+        newest row's is read from the ledger with ``get_balance_after`` and
+        the rows below it take back their own amounts, so a page costs the
+        same at any depth. The ledger dates a posting when it completes,
+        so a transaction completed long after its date shows up as a jump
+        at a page edge, as do adjustments made outside transactions.
+        ``date_to`` is exclusive. Raises ``ValueError`` for a malformed cursor.
+        """
+        from .pagination import paginate_keyset
+        
+        branches = []
+        for branch in cls.get_branches(account):
+            branch = branch.select_related('category', 'to_account')
+            if date_from:
+                branch = branch.filter(transaction_date__gte=date_from)
+            if date_to:
+                branch = branch.filter(transaction_date__lt=date_to)
+            branches.append(branch)
+        
+        page = paginate_keyset(branches, cursor, page_size)
+        if page.object_list:
+            balance = cls.get_balance_after(account, page.object_list[0])
+            for txn in page.object_list:
+                txn.running_balance = balance
+                if txn.status == 'completed':
+                    balance -= txn.get_balance_deltas().get(account.pk, 0)
+        return page
+
+
 class AnalyticsService:
-    """Financial analytics and reporting"""
+    """Financial analytics and reporting
+    
+    Aggregates read from ``DailyAccountRollup`` for whole days inside the
+    range covered by ``rebuild_rollups``; partial days at either edge of the
+    range (and anything uncovered) are summed from ``Transaction`` directly.
+    """
     
     @staticmethod
-    def get_spending_by_category(account: Account, start_date, end_date) -> Dict[str, Decimal]:
-        """Get spending breakdown by category"""
+    def _account_filter(accounts) -> Dict[str, Any]:
+        """Build a Transaction filter for an account, a user or many accounts
+        
+        A user selects all of that user's active accounts; a queryset or list
+        of accounts (or account ids) is matched with a single ``IN`` clause.
+        """
+        from django.contrib.auth.models import User
+        
+        if isinstance(accounts, Account):
+            return {'account': accounts}
+        if isinstance(accounts, User):
+            return {'account__user': accounts, 'account__is_active': True}
+        return {'account__in': accounts}
+    
+    @staticmethod
+    def _as_datetime(value):
+        """Coerce a date, datetime or ISO string to an aware datetime"""
+        from datetime import date, datetime, time
+        from django.utils import timezone
+        from django.utils.dateparse import parse_date, parse_datetime
+        
+        if isinstance(value, str):
+            value = parse_datetime(value) or parse_date(value)
+            if value is None:
+                raise ValueError("Invalid date")
+        if isinstance(value, date) and not isinstance(value, datetime):
+            value = datetime.combine(value, time.min)
+        if timezone.is_naive(value):
+            value = timezone.make_aware(value)
+        return value
+    
+    @staticmethod
+    def _split_for_rollups(start_date, end_date):
+        """Split an inclusive datetime range into whole rollup days and raw edges
+        
+        Returns ``(first_day, last_day, edges)`` where ``edges`` is a Q object
+        selecting the partial-day remainder, or None when the range contains
+        no whole day covered by the rollups.
+        """
+        from django.db.models import Q
+        from django.utils import timezone
+        
+        covered_from = RollupCoverage.get_covered_from()
+        if covered_from is None:
+            return None
+        
+        start = timezone.localtime(AnalyticsService._as_datetime(start_date))
+        end = timezone.localtime(AnalyticsService._as_datetime(end_date))
+        
+        first_midnight = start.replace(hour=0, minute=0, second=0, microsecond=0)
+        if first_midnight < start:
+            first_midnight += timezone.timedelta(days=1)
+        last_midnight = end.replace(hour=0, minute=0, second=0, microsecond=0)
+        
+        if first_midnight >= last_midnight or first_midnight.date() < covered_from:
+            return None
+        
+        edges = Q(transaction_date__gte=last_midnight, transaction_date__lte=end)
+        if start < first_midnight:
+            edges |= Q(transaction_date__gte=start, transaction_date__lt=first_midnight)
+        
+        return (
+            first_midnight.date(),
+            (last_midnight - timezone.timedelta(days=1)).date(),
+            edges,
+        )
+    
+    @staticmethod
+    def _grouped_totals(accounts, start_date, end_date, fields, by_day=False, **filters):
+        """Sum completed amounts grouped by ``fields`` (and day) over a range
+        
+        ``fields`` may include ``account_id``, ``category__name`` and
+        ``transaction_type``. Returned rows are not merged: the same group may
+        appear once from the rollups and once from the raw edges.
+        """
         from django.db.models import Sum
+        from django.db.models.functions import TruncDate
         
-        transactions = Transaction.objects.filter(
-            account=account,
-            transaction_type='debit',
-            status='completed',
-            transaction_date__range=[start_date, end_date]
-        ).select_related('category')
+        account_filter = AnalyticsService._account_filter(accounts)
+        split = AnalyticsService._split_for_rollups(start_date, end_date)
+        group_by = list(fields) + (['day'] if by_day else [])
+        
+        raw = Transaction.objects.filter(status='completed', **account_filter, **filters)
+        if split is None:
+            raw = raw.filter(transaction_date__range=[start_date, end_date])
+        else:
+            first_day, last_day, edges = split
+            raw = raw.filter(edges)
+        if by_day:
+            raw = raw.annotate(day=TruncDate('transaction_date'))
+        
+        rows = list(raw.values(*group_by).annotate(total=Sum('amount')).order_by())
+        
+        if split is not None:
+            rollups = DailyAccountRollup.objects.filter(
+                day__range=[first_day, last_day],
+                **account_filter,
+                **filters
+            ).values(*group_by).annotate(total=Sum('total')).order_by()
+            rows.extend(rollups)
+        
+        return rows
+    
+    @staticmethod
+    def get_spending_by_category(accounts, start_date, end_date) -> Dict[str, Decimal]:
+        """Get spending breakdown by category
+        
+        ``accounts`` may be a single account, a user, or an iterable/queryset
+        of accounts. Totals are grouped in the database, so Python memory does
+        not grow with the number of matching transactions.
+        """
+        rows = AnalyticsService._grouped_totals(
+            accounts, start_date, end_date, ['category__name'],
+            transaction_type='debit'
+        )
         
         spending = {}
-        for txn in transactions:
-            category_name = txn.category.name if txn.category else 'Uncategorized'
-            spending[category_name] = spending.get(category_name, Decimal('0.00')) + txn.amount
+        for row in rows:
+            category_name = row['category__name'] or 'Uncategorized'
+            spending[category_name] = spending.get(category_name, Decimal('0.00')) + row['total']
+        
+        return spending
+    
+    @staticmethod
+    def get_spending_by_category_per_account(accounts, start_date, end_date) -> Dict[int, Dict[str, Decimal]]:
+        """Get spending breakdown by category for many accounts in one query
+        
+        Returns a mapping of account id to its category totals. Accounts with
+        no spending in the period are omitted.
+        """
+        rows = AnalyticsService._grouped_totals(
+            accounts, start_date, end_date, ['account_id', 'category__name'],
+            transaction_type='debit'
+        )
+        
+        spending = {}
+        for row in rows:
+            category_name = row['category__name'] or 'Uncategorized'
+            account_spending = spending.setdefault(row['account_id'], {})
+            account_spending[category_name] = account_spending.get(category_name, Decimal('0.00')) + row['total']
         
         return spending
     
+    TREND_GRANULARITIES = ('day', 'week', 'month')
+    
+    @staticmethod
+    def _period_start(value, granularity: str):
+        """Truncate a date or datetime to the first day of its day, ISO week or month"""
+        from datetime import datetime
+        from django.utils import timezone
+        
+        if isinstance(value, datetime):
+            if timezone.is_aware(value):
+                value = timezone.localtime(value)
+            value = value.date()
+        if granularity == 'week':
+            value -= timezone.timedelta(days=value.weekday())
+        elif granularity == 'month':
+            value = value.replace(day=1)
+        return value
+    
+    @staticmethod
+    def _period_key(value, granularity: str) -> str:
+        """Format a period start as a trends dictionary key"""
+        if granularity == 'month':
+            return value.strftime('%Y-%m')
+        return value.strftime('%Y-%m-%d')
+    
+    @staticmethod
+    def get_trends(accounts, start_date, end_date, granularities=('month',),
+                   fill_gaps: bool = True,
+                   include_transfers: bool = True) -> Dict[str, Dict[str, Dict[str, Decimal]]]:
+        """Get income and spending trends bucketed by day, week and/or month
+        
+        Totals are grouped per day with ``TruncDate`` (so it works on any
+        database backend) and rolled up in Python for each requested
+        granularity, so one set of grouped queries serves every view.
+        ``accounts`` accepts the same values as ``get_spending_by_category``.
+        Keys are ``YYYY-MM`` for months and the first day (``YYYY-MM-DD``) for
+        days and weeks; weeks start on Monday. With ``fill_gaps`` every period
+        in the range is present, with zero totals where there was no activity.
+        Outgoing transfers count as spending unless ``include_transfers`` is off.
+        """
+        from dateutil.relativedelta import relativedelta
+        
+        for granularity in granularities:
+            if granularity not in AnalyticsService.TREND_GRANULARITIES:
+                raise ValueError(f"Unsupported granularity: {granularity}")
+        
+        rows = AnalyticsService._grouped_totals(
+            accounts, start_date, end_date, ['transaction_type'], by_day=True
+        )
+        
+        steps = {
+            'day': relativedelta(days=1),
+            'week': relativedelta(weeks=1),
+            'month': relativedelta(months=1),
+        }
+        
+        trends = {}
+        for granularity in granularities:
+            buckets = {}
+            if fill_gaps:
+                period = AnalyticsService._period_start(AnalyticsService._as_datetime(start_date), granularity)
+                last = AnalyticsService._period_start(AnalyticsService._as_datetime(end_date), granularity)
+                while period <= last:
+                    buckets[AnalyticsService._period_key(period, granularity)] = {
+                        'income': Decimal('0.00'), 'spending': Decimal('0.00')
+                    }
+                    period += steps[granularity]
+            trends[granularity] = buckets
+        
+        for row in rows:
+            if row['transaction_type'] == 'transfer' and not include_transfers:
+                continue
+            side = 'income' if row['transaction_type'] == 'credit' else 'spending'
+            for granularity in granularities:
+                key = AnalyticsService._period_key(
+                    AnalyticsService._period_start(row['day'], granularity), granularity
+                )
+                bucket = trends[granularity].setdefault(
+                    key, {'income': Decimal('0.00'), 'spending': Decimal('0.00')}
+                )
+                bucket[side] += row['total']
+        
+        for granularity in granularities:
+            trends[granularity] = dict(sorted(trends[granularity].items()))
+        
+        return trends
+    
     @staticmethod
-    def get_monthly_trends(account: Account, months: int = 6) -> Dict[str, Dict[str, Decimal]]:
+    def get_monthly_trends(account: Account, months: int = 6,
+                           fill_gaps: bool = False) -> Dict[str, Dict[str, Decimal]]:
         """Get monthly spending and income trends"""
-        from django.db.models import Sum
         from django.utils import timezone
         from dateutil.relativedelta import relativedelta
         
         end_date = timezone.now()
         start_date = end_date - relativedelta(months=months)
         
-        transactions = Transaction.objects.filter(
-            account=account,
-            status='completed',
-            transaction_date__range=[start_date, end_date]
-        ).extra(
-            select={'month': "DATE_TRUNC('month', transaction_date)"}
-        ).values('month', 'transaction_type').annotate(
-            total=Sum('amount')
-        ).order_by('month')
+        return AnalyticsService.get_trends(
+            account, start_date, end_date,
+            granularities=('month',),
+            fill_gaps=fill_gaps
+        )['month']
+    
+    @staticmethod
+    def get_user_overview(user, months: int = 12, category_days: int = 30) -> Dict[str, Any]:
+        """Get calendar-month income/spending and recent category spending for a user
         
-        trends = {}
-        for item in transactions:
-            month_key = item['month'].strftime('%Y-%m')
-            if month_key not in trends:
-                trends[month_key] = {'income': Decimal('0.00'), 'spending': Decimal('0.00')}
-            
-            if item['transaction_type'] == 'credit':
-                trends[month_key]['income'] += item['total']
-            else:
-                trends[month_key]['spending'] += item['total']
+        Both the monthly series and the category breakdown are grouped
+        queries over all of the user's active accounts, so the cost does not
+        grow with the number of months or accounts.
+        """
+        from django.utils import timezone
+        from dateutil.relativedelta import relativedelta
         
-        return trends
+        now = timezone.now()
+        current_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        month_starts = [current_month - relativedelta(months=i) for i in range(months - 1, -1, -1)]
+        
+        trends = AnalyticsService.get_trends(
+            user, month_starts[0], now, granularities=('month',), include_transfers=False
+        )['month']
+        
+        monthly = []
+        for month_start in month_starts:
+            totals = trends.get(month_start.strftime('%Y-%m'), {})
+            monthly.append({
+                'month': month_start.strftime('%b %Y'),
+                'income': totals.get('income', Decimal('0.00')),
+                'spending': totals.get('spending', Decimal('0.00')),
+            })
+        
+        category_spending = AnalyticsService.get_spending_by_category(
+            user, now - relativedelta(days=category_days), now
+        )
+        
+        return {
+            'monthly': monthly,
+            'category_spending': category_spending,
+        }
+
+
+class MonthlyReportService:
+    """Build and store month-end reports for batches of users"""
+    
+    @staticmethod
+    def get_period(year: int, month: int):
+        """Return the first day of the month and the aware start and end of the month"""
+        from datetime import date, datetime
+        from dateutil.relativedelta import relativedelta
+        
+        period = date(year, month, 1)
+        start_date = timezone.make_aware(datetime(year, month, 1))
+        return period, start_date, start_date + relativedelta(months=1)
+    
+    @staticmethod
+    def generate(user_ids: List[int], year: int, month: int) -> List[MonthlyReport]:
+        """Compute and store the reports for a batch of users
+        
+        All accounts of the batch share one grouped spending query, and the
+        reports are upserted with a single bulk insert, so a batch costs a
+        fixed number of queries however many users and accounts it holds.
+        """
+        period, start_date, end_date = MonthlyReportService.get_period(year, month)
+        
+        accounts = list(Account.objects.filter(
+            user_id__in=user_ids, is_active=True
+        ).order_by('user_id', 'pk'))
+        spending_by_account = AnalyticsService.get_spending_by_category_per_account(
+            accounts, start_date, end_date
+        )
+        
+        data = {
+            user_id: {'user_id': user_id, 'period': f"{year}-{month:02d}", 'accounts': []}
+            for user_id in user_ids
+        }
+        for account in accounts:
+            spending = spending_by_account.get(account.id, {})
+            data[account.user_id]['accounts'].append({
+                'account_id': account.id,
+                'account_name': account.name,
+                'balance': float(account.get_balance()),
+                'spending_by_category': {k: float(v) for k, v in spending.items()}
+            })
+        
+        reports = [
+            MonthlyReport(user_id=user_id, period=period, data=report)
+            for user_id, report in data.items()
+        ]
+        MonthlyReport.objects.bulk_create(
+            reports,
+            update_conflicts=True,
+            unique_fields=['user', 'period'],
+            update_fields=['data', 'generated_at'],
+        )
+        return reports
+    
+    @staticmethod
+    def get_report(user, year: int, month: int) -> Dict[str, Any]:
+        """Return a user's stored report, generating and storing it on first request"""
+        period, _, _ = MonthlyReportService.get_period(year, month)
+        report = MonthlyReport.objects.filter(user=user, period=period).values_list('data', flat=True).first()
+        if report is None:
+            report = MonthlyReportService.generate([user.pk], year, month)[0].data
+        return report
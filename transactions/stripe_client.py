@@ -0,0 +1,151 @@
+"""
+HTTP transport for the Stripe API
+
+The Stripe library sends every request through ``stripe.default_http_client``.
+``StripeHTTPClient`` replaces its per-thread sessions with one pooled,
+keep-alive session, and guards each request with a timeout, a concurrency
+limit and a circuit breaker. When Stripe slows down or fails, callers then
+get a fast ``APIConnectionError`` instead of a worker blocked on a socket.
+
+All limits apply per process: every gunicorn or Celery worker process gets
+its own pool, semaphore and breaker.
+"""
+import logging
+import threading
+import time
+
+import requests
+import stripe
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+
+class StripeCallRejected(stripe.error.APIConnectionError):
+    """The request was refused locally, without reaching Stripe"""
+    
+    def __init__(self, message):
+        super().__init__(message, should_retry=False)
+
+
+class CircuitBreaker:
+    """Fail fast after repeated failures, then let one probe through
+    
+    Closed: requests flow and consecutive failures are counted. Open: after
+    ``failure_threshold`` failures every request is refused for
+    ``reset_timeout`` seconds. Half-open: once that time has passed, a single
+    probe is allowed; its success closes the breaker, its failure reopens it.
+    """
+    
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+    
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 clock=time.monotonic):
+        self.failure_threshold = max(failure_threshold, 1)
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+    
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return self.CLOSED
+            if self._probing or self._clock() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self.OPEN
+    
+    def allow_request(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._probing or self._clock() - self._opened_at < self.reset_timeout:
+                return False
+            self._probing = True
+            return True
+    
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+    
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    logger.warning(f"Stripe circuit opened after {self._failures} consecutive failures")
+                self._opened_at = self._clock()
+
+
+class StripeHTTPClient(stripe.RequestsClient):
+    """Pooled Stripe transport with timeouts, a concurrency cap and a circuit breaker
+    
+    ``connect_timeout`` and ``read_timeout`` bound each request, replacing the
+    library's 80 second default. ``max_connections`` keep-alive connections are
+    shared by every thread. At most ``max_concurrent_requests`` requests are in
+    flight at once; a caller waits up to ``acquire_timeout`` seconds for a slot.
+    Requests refused by the breaker or the limit raise ``StripeCallRejected``.
+    """
+    
+    def __init__(self, connect_timeout: float = 2.0, read_timeout: float = 10.0,
+                 max_connections: int = 10, max_concurrent_requests: int = 10,
+                 acquire_timeout: float = 1.0, circuit_breaker: CircuitBreaker = None,
+                 **kwargs):
+        session = requests.Session()
+        # Non-blocking pool: the semaphore already bounds concurrency, and a
+        # blocking pool would wait on a free connection without any timeout
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_connections)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        super().__init__(timeout=(connect_timeout, read_timeout), session=session, **kwargs)
+        self.acquire_timeout = acquire_timeout
+        self.circuit_breaker = circuit_breaker or CircuitBreaker()
+        self._slots = threading.BoundedSemaphore(max(max_concurrent_requests, 1))
+    
+    def request(self, method, url, headers, post_data=None):
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            raise StripeCallRejected('Too many concurrent Stripe requests')
+        try:
+            # Checked after taking a slot, so a half-open probe is never
+            # granted to a request that is then refused
+            if not self.circuit_breaker.allow_request():
+                raise StripeCallRejected('Stripe circuit is open; not sending the request')
+            try:
+                content, status_code, headers = super().request(method, url, headers, post_data)
+            except stripe.error.APIConnectionError:
+                self.circuit_breaker.record_failure()
+                raise
+        finally:
+            self._slots.release()
+        
+        if status_code >= 500:
+            self.circuit_breaker.record_failure()
+        else:
+            self.circuit_breaker.record_success()
+        return content, status_code, headers
+    
+    def close(self):
+        self._session.close()
+
+
+def build_stripe_http_client(settings) -> StripeHTTPClient:
+    """Build the Stripe transport from the ``STRIPE_*`` Django settings"""
+    return StripeHTTPClient(
+        connect_timeout=settings.STRIPE_CONNECT_TIMEOUT,
+        read_timeout=settings.STRIPE_READ_TIMEOUT,
+        max_connections=settings.STRIPE_MAX_CONNECTIONS,
+        max_concurrent_requests=settings.STRIPE_MAX_CONCURRENT_REQUESTS,
+        acquire_timeout=settings.STRIPE_ACQUIRE_TIMEOUT,
+        circuit_breaker=CircuitBreaker(
+            failure_threshold=settings.STRIPE_CIRCUIT_FAILURE_THRESHOLD,
+            reset_timeout=settings.STRIPE_CIRCUIT_RESET_TIMEOUT,
+        ),
+    )
@@ -1,141 +1,277 @@
 """
 Celery tasks for asynchronous processing
 """
-from celery import shared_task
+from celery import chord, group, shared_task
 import logging
+import time
+from django.conf import settings
+from django.core.cache import cache
 from django.db import transaction
-from .models import Transaction
-from .services import StripePaymentService
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .models import Transaction, BalanceSnapshot
+from .services import (
+    StripePaymentService, AdminStatsService, RecurringTransactionService, MonthlyReportService,
+    PaymentReconciliationService, StripeWebhookService, PaymentServiceUnavailable, PaymentPending
+)
 
 logger = logging.getLogger(__name__)
 
 
-@shared_task
-def process_payment_async(transaction_id: int, payment_intent_id: str):
-    """Process payment asynchronously"""
+# Longest a worker may hold a transaction's payment lock, in seconds. The
+# lock lives in the default cache, which must be shared by all workers;
+# financeapp.celery stops workers from starting on the local memory cache.
+PAYMENT_LOCK_TIMEOUT = 300
+
+
+def _settled_result(txn):
+    """Return the task result for a transaction that can no longer be processed"""
+    if txn.status == 'completed':
+        return {'success': True, 'transaction_id': txn.id}
+    return {'success': False, 'error': txn.metadata.get('error', f'Transaction {txn.status}')}
+
+
+@shared_task(
+    bind=True,
+    autoretry_for=(PaymentServiceUnavailable, PaymentPending),
+    retry_backoff=2,
+    retry_backoff_max=600,
+    retry_jitter=True,
+    max_retries=8,
+    acks_late=True,
+    rate_limit=settings.PAYMENT_TASK_RATE_LIMIT,
+    soft_time_limit=60,
+    time_limit=90,
+)
+def process_payment_async(self, transaction_id: int, payment_intent_id: str):
+    """Process payment asynchronously
+    
+    Safe to run more than once for the same transaction: a per-transaction
+    cache lock keeps concurrent deliveries apart, and the status guard
+    turns a repeat after completion into a no-op. Stripe outages and
+    intents that are still in flight are retried with exponential backoff
+    and jitter; the transaction stays pending meanwhile.
+    """
+    lock_key = f'payment-lock:{transaction_id}'
+    lock_token = self.request.id or payment_intent_id
+    if not cache.add(lock_key, lock_token, PAYMENT_LOCK_TIMEOUT):
+        logger.info(f"Payment for transaction {transaction_id} is already being processed")
+        return {'success': False, 'error': 'Payment already being processed'}
+    
     try:
         txn = Transaction.objects.get(id=transaction_id)
         
+        # Duplicate delivery after the payment was settled
+        if txn.status in ('completed', 'failed', 'cancelled'):
+            return _settled_result(txn)
+        
         # Confirm payment with Stripe
         result = StripePaymentService.confirm_payment(payment_intent_id)
         
         if result['success']:
-            txn.status = 'processing'
-            txn.external_payment_id = payment_intent_id
-            txn.save()
-            
-            # Complete the transaction
-            txn.complete_transaction()
+            # Either step is refused if the transaction was settled, e.g.
+            # cancelled, while Stripe was being asked
+            if not (txn.transition_to('processing', external_payment_id=payment_intent_id)
+                    and txn.complete_transaction()):
+                txn.refresh_from_db()
+                logger.warning(
+                    f"Payment {payment_intent_id} succeeded but {txn.reference_number} is {txn.status}"
+                )
+                return _settled_result(txn)
             
             logger.info(f"Payment processed successfully: {txn.reference_number}")
             return {'success': True, 'transaction_id': transaction_id}
+        elif result.get('status') in StripePaymentService.PENDING_STATUSES:
+            raise PaymentPending(f"Payment intent {payment_intent_id} is {result['status']}")
+        elif result.get('status') == 'requires_payment_method':
+            # Declined, but the customer may retry; webhooks and
+            # reconciliation settle it once it succeeds or is canceled
+            logger.info(f"Payment awaiting a new payment method: {txn.reference_number}")
+            return {'success': False, 'error': 'Awaiting a new payment method'}
         else:
-            txn.status = 'failed'
-            txn.metadata['error'] = result['error']
-            txn.save()
+            txn.transition_to('failed', metadata={**txn.metadata, 'error': result['error']})
             
             logger.error(f"Payment failed: {txn.reference_number} - {result['error']}")
             return {'success': False, 'error': result['error']}
-            
+    
     except Transaction.DoesNotExist:
         logger.error(f"Transaction not found: {transaction_id}")
         return {'success': False, 'error': 'Transaction not found'}
+    except (PaymentServiceUnavailable, PaymentPending):
+        raise
     except Exception as e:
         logger.error(f"Payment processing error: {e}")
         return {'success': False, 'error': str(e)}
+    finally:
+        if cache.get(lock_key) == lock_token:
+            cache.delete(lock_key)
 
 
-@shared_task
-def process_recurring_transactions():
-    """Process due recurring transactions"""
-    from django.utils import timezone
-    from .models import RecurringTransaction
-    from dateutil.relativedelta import relativedelta
-    
-    due_transactions = RecurringTransaction.objects.filter(
-        is_active=True,
-        next_transaction_date__lte=timezone.now()
+@shared_task(
+    autoretry_for=(PaymentServiceUnavailable,),
+    retry_backoff=30,
+    retry_jitter=True,
+    max_retries=3,
+)
+def reconcile_pending_payments():
+    """Settle pending card payments in bulk from Stripe's payment intent list"""
+    metrics = PaymentReconciliationService.reconcile()
+    logger.info(
+        f"Payment reconciliation: {metrics['completed']} completed, {metrics['failed']} failed "
+        f"of {metrics['pending']} pending, {metrics['intents']} intents in {metrics['pages']} pages, "
+        f"{metrics['retrieved']} retrieved"
     )
-    
+    return metrics
+
+
+@shared_task(
+    autoretry_for=(Exception,),
+    retry_backoff=5,
+    retry_jitter=True,
+    max_retries=5,
+)
+def process_stripe_events(payment_intent_id: str):
+    """Apply the stored webhook events of one payment intent, in order"""
+    processed = StripeWebhookService.process_events(payment_intent_id)
+    logger.info(f"Processed {processed} Stripe events for {payment_intent_id or 'no payment intent'}")
+    return processed
+
+
+@shared_task
+def process_pending_stripe_events():
+    """Sweep up stored webhook events whose processing task was never run"""
     processed = 0
-    for recurring in due_transactions:
+    for payment_intent_id in StripeWebhookService.get_pending_intent_ids():
         try:
-            # Create transaction
-            txn = Transaction.objects.create(
-                account=recurring.account,
-                amount=recurring.amount,
-                description=f"Recurring: {recurring.description}",
-                transaction_type='debit',
-                category=recurring.category,
-                metadata={'recurring_id': recurring.id}
-            )
-            
-            # Complete transaction
-            txn.complete_transaction()
-            
-            # Update next transaction date
-            if recurring.frequency == 'daily':
-                recurring.next_transaction_date += timezone.timedelta(days=1)
-            elif recurring.frequency == 'weekly':
-                recurring.next_transaction_date += timezone.timedelta(weeks=1)
-            elif recurring.frequency == 'monthly':
-                recurring.next_transaction_date += relativedelta(months=1)
-            elif recurring.frequency == 'quarterly':
-                recurring.next_transaction_date += relativedelta(months=3)
-            elif recurring.frequency == 'yearly':
-                recurring.next_transaction_date += relativedelta(years=1)
-            
-            recurring.save()
-            processed += 1
-            
+            processed += StripeWebhookService.process_events(payment_intent_id)
         except Exception as e:
-            logger.error(f"Error processing recurring transaction {recurring.id}: {e}")
-    
-    logger.info(f"Processed {processed} recurring transactions")
+            logger.error(f"Error processing Stripe events for {payment_intent_id}: {e}")
     return processed
 
 
+@shared_task
+def process_recurring_transactions():
+    """Process due recurring transactions
+    
+    Due rows are split into chunks of ``RECURRING_CHUNK_SIZE``. A run that
+    fits in one chunk is processed inline; larger runs fan the chunks out
+    to ``process_recurring_chunk`` subtasks in a chord whose callback
+    reports the run's throughput. Returns the number of due recurring
+    transactions processed or dispatched.
+    """
+    started_at = time.time()
+    now = timezone.now()
+    due_ids = RecurringTransactionService.get_due_ids(now)
+    chunk_size = settings.RECURRING_CHUNK_SIZE
+    chunks = [due_ids[i:i + chunk_size] for i in range(0, len(due_ids), chunk_size)]
+    
+    if len(chunks) <= 1:
+        results = [process_recurring_chunk(chunk, now.isoformat()) for chunk in chunks]
+        return summarize_recurring_run(results, started_at)['recurring']
+    
+    chord(
+        process_recurring_chunk.s(chunk, now.isoformat()) for chunk in chunks
+    )(summarize_recurring_run.s(started_at))
+    logger.info(f"Dispatched {len(due_ids)} recurring transactions in {len(chunks)} chunks")
+    return len(due_ids)
+
+
+@shared_task
+def process_recurring_chunk(recurring_ids, now):
+    """Process one chunk of due recurring transactions"""
+    try:
+        return RecurringTransactionService.process_batch(recurring_ids, parse_datetime(now))
+    except Exception as e:
+        # The rows stay due and are picked up again by the next run
+        logger.error(f"Error processing recurring transactions {recurring_ids[0]}-{recurring_ids[-1]}: {e}")
+        return {'recurring': 0, 'transactions': 0, 'failed': 0, 'errors': len(recurring_ids)}
+
+
+@shared_task
+def summarize_recurring_run(results, started_at):
+    """Log the totals and throughput of a recurring transaction run"""
+    summary = {
+        key: sum(result.get(key, 0) for result in results)
+        for key in ('recurring', 'transactions', 'failed', 'errors')
+    }
+    summary['seconds'] = round(time.time() - started_at, 3)
+    summary['transactions_per_second'] = round(
+        summary['transactions'] / summary['seconds'], 1
+    ) if summary['seconds'] else 0
+    
+    logger.info(
+        f"Processed {summary['recurring']} recurring transactions: "
+        f"{summary['transactions']} transactions ({summary['failed']} failed, "
+        f"{summary['errors']} not processed) in {summary['seconds']}s, "
+        f"{summary['transactions_per_second']}/s"
+    )
+    return summary
+
+
 @shared_task
 def generate_monthly_report(user_id: int, year: int, month: int):
-    """Generate monthly financial report"""
+    """Return a user's monthly financial report, generating it if not stored yet"""
     from django.contrib.auth.models import User
-    from .models import Account
-    from .services import AnalyticsService
-    from datetime import datetime
     
     try:
         user = User.objects.get(id=user_id)
-        accounts = Account.objects.filter(user=user, is_active=True)
-        
-        start_date = datetime(year, month, 1)
-        if month == 12:
-            end_date = datetime(year + 1, 1, 1)
-        else:
-            end_date = datetime(year, month + 1, 1)
-        
-        report_data = {
-            'user_id': user_id,
-            'period': f"{year}-{month:02d}",
-            'accounts': []
-        }
-        
-        for account in accounts:
-            spending = AnalyticsService.get_spending_by_category(
-                account, start_date, end_date
-            )
-            
-            account_data = {
-                'account_id': account.id,
-                'account_name': account.name,
-                'balance': float(account.get_balance()),
-                'spending_by_category': {k: float(v) for k, v in spending.items()}
-            }
-            report_data['accounts'].append(account_data)
-        
-        # Here you could save to database, send email, etc.
+        report_data = MonthlyReportService.get_report(user, year, month)
         logger.info(f"Monthly report generated for user {user_id}")
         return report_data
-        
+    
     except Exception as e:
         logger.error(f"Error generating monthly report: {e}")
         return {'error': str(e)}
+
+
+@shared_task
+def generate_monthly_reports(year: int = None, month: int = None):
+    """Generate the month-end reports for every active user
+    
+    Defaults to the previous month, for the beat run on the first of the
+    month. Users are sharded into batches of ``MONTHLY_REPORT_BATCH_SIZE``;
+    a single batch is processed inline, more are fanned out to
+    ``generate_monthly_report_batch`` subtasks in a group. Returns the
+    number of users covered.
+    """
+    from django.contrib.auth.models import User
+    
+    if year is None or month is None:
+        last_month = timezone.localdate().replace(day=1) - timezone.timedelta(days=1)
+        year, month = last_month.year, last_month.month
+    
+    user_ids = list(User.objects.filter(is_active=True).order_by('pk').values_list('pk', flat=True))
+    batch_size = settings.MONTHLY_REPORT_BATCH_SIZE
+    batches = [user_ids[i:i + batch_size] for i in range(0, len(user_ids), batch_size)]
+    
+    if len(batches) <= 1:
+        for batch in batches:
+            generate_monthly_report_batch(batch, year, month)
+    else:
+        group(generate_monthly_report_batch.s(batch, year, month) for batch in batches).apply_async()
+    
+    logger.info(f"Monthly reports for {year}-{month:02d}: {len(user_ids)} users in {len(batches)} batches")
+    return len(user_ids)
+
+
+@shared_task
+def generate_monthly_report_batch(user_ids, year: int, month: int):
+    """Generate and store the monthly reports for one batch of users"""
+    reports = MonthlyReportService.generate(user_ids, year, month)
+    return len(reports)
+
+
+@shared_task
+def refresh_admin_stats():
+    """Recompute the cached admin dashboard statistics"""
+    stats = AdminStatsService.refresh()
+    logger.info("Admin stats refreshed")
+    return stats
+
+
+@shared_task
+def take_balance_snapshots():
+    """Checkpoint ledger balances so point-in-time lookups stay short"""
+    written = BalanceSnapshot.take()
+    logger.info(f"Took {written} balance snapshots")
+    return written
@@ -4,6 +4,7 @@ URL patterns for transactions app
 from django.urls import path
 from . import views
 from . import auth_views
+from . import webhooks
 
 urlpatterns = [
     # Authentication URLs
@@ -31,4 +32,7 @@ urlpatterns = [
     path('settings/', views.settings, name='settings'),
     path('profile/', views.profile, name='profile'),
     path('notifications/', views.notifications, name='notifications'),
+    
+    # Webhooks
+    path('webhooks/stripe/', webhooks.stripe_webhook, name='stripe_webhook'),
 ]
@@ -7,26 +7,36 @@ from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.contrib import messages
-from django.db.models import Q, Sum, Avg
+from django.db.models import Q, Sum, Avg, Count
 from django.utils import timezone
 from datetime import timedelta
 from decimal import Decimal, InvalidOperation
 import json
 import logging
-from django.db import connection
+from urllib.parse import urlencode
+from django.db import connection, transaction as db_transaction
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.parsers import JSONParser
 
 from .models import Account, Transaction, Category, UserPreferences
 from .serializers import (
     AccountSerializer, TransactionSerializer, CategorySerializer
 )
-from .services import TransactionService, AnalyticsService
+from .services import TransactionService, AnalyticsService, AccountHistoryService
+from .middleware import get_request_preferences
+from .cache import cached_user_context
+from .parsers import NDJSONParser
+from .search import SEARCH_FIELDS, search_transactions, typeahead_search
+from .pagination import TransactionKeysetPagination, estimate_count, paginate_keyset
 
 logger = logging.getLogger(__name__)
 
+# Largest value a bigint primary key can hold; larger ids cannot match a row
+MAX_ID = 2 ** 63 - 1
+
 
 class AccountViewSet(viewsets.ModelViewSet):
     """API ViewSet for accounts"""
@@ -34,7 +44,9 @@ class AccountViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        return Account.objects.filter(user=self.request.user, is_active=True)
+        return Account.objects.filter(
+            user=self.request.user, is_active=True
+        ).annotate(transaction_count=Count('transactions'))
     
     def perform_create(self, serializer):
         serializer.save(user=self.request.user) 
@@ -74,14 +86,15 @@ class TransactionViewSet(viewsets.ModelViewSet):
     """API ViewSet for transactions"""
     serializer_class = TransactionSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = TransactionKeysetPagination
     
     def get_queryset(self):
         queryset = Transaction.objects.filter(
-            account__user=self.request.user
+            user=self.request.user
         ).select_related('account', 'category', 'to_account')
         
         # Filter by account
-        account_id = self.request.query_params.get('account_id')
+        account_id = _parse_id_filter(self.request.query_params.get('account_id'))
         if account_id:
             queryset = queryset.filter(account_id=account_id)
         
@@ -93,13 +106,44 @@ class TransactionViewSet(viewsets.ModelViewSet):
         # Search
         search = self.request.query_params.get('search')
         if search:
-            queryset = queryset.filter(
-                Q(description__icontains=search) |
-                Q(reference_number__icontains=search)
-            )
+            queryset = search_transactions(queryset, search)
         
         return queryset.order_by('-transaction_date')
     
+    BULK_CREATE_MAX_ROWS = 50000
+    
+    @action(detail=False, methods=['post'], url_path='bulk',
+            parser_classes=[JSONParser, NDJSONParser])
+    def bulk_create(self, request):
+        """Create many pending transactions from a JSON array or NDJSON body"""
+        rows = request.data
+        if not isinstance(rows, list):
+            return Response(
+                {'error': 'Expected a JSON array or NDJSON body of transactions'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(rows) > self.BULK_CREATE_MAX_ROWS:
+            return Response(
+                {'error': f'At most {self.BULK_CREATE_MAX_ROWS} transactions per request'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        results = TransactionService.bulk_create_transactions(request.user, rows)
+        created = sum(1 for result in results if result['success'])
+        
+        if created == len(results):
+            response_status = status.HTTP_201_CREATED
+        elif created:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_400_BAD_REQUEST
+        
+        return Response({
+            'created': created,
+            'failed': len(results) - created,
+            'results': results,
+        }, status=response_status)
+    
     @action(detail=False, methods=['post'])
     def create_payment(self, request):
         """Create a payment transaction"""
@@ -129,7 +173,7 @@ class TransactionViewSet(viewsets.ModelViewSet):
                     {'error': result['error']},
                     status=status.HTTP_400_BAD_REQUEST
                 )
-                
+        
         except Exception as e:
             logger.error(f"Payment creation error: {e}")
             return Response(
@@ -162,7 +206,7 @@ class TransactionViewSet(viewsets.ModelViewSet):
             
             serializer = self.get_serializer(transaction)
             return Response(serializer.data)
-            
+        
         except ValueError as e:
             return Response(
                 {'error': str(e)},
@@ -187,59 +231,98 @@ class CategoryViewSet(viewsets.ModelViewSet):
 @login_required
 def dashboard(request):
     """Main dashboard view"""
-    accounts = Account.objects.filter(user=request.user, is_active=True)
-    recent_transactions = Transaction.objects.filter(
-        account__user=request.user
-    ).select_related('account', 'category')[:10]
+    def build_context():
+        accounts = Account.objects.filter(user=request.user, is_active=True)
+        recent_transactions = Transaction.objects.filter(
+            user=request.user
+        ).select_related('account', 'category')[:10]
+        
+        total_balance = accounts.aggregate(total_balance=Sum('balance'))['total_balance'] or 0   
+        return {
+            'accounts': list(accounts),
+            'recent_transactions': list(recent_transactions),
+            'total_balance': total_balance,
+        }
     
-    total_balance = accounts.aggregate(total_balance=Sum('balance'))['total_balance'] or 0   
-    context = {
-        'accounts': accounts,
-        'recent_transactions': recent_transactions,
-        'total_balance': total_balance,
-    }
+    context = cached_user_context('dashboard', request.user, build_context)
     return render(request, 'transactions/dashboard.html', context)
 
 
 @login_required
 def account_list(request):
     """Account list view"""
-    accounts = Account.objects.filter(user=request.user, is_active=True).order_by('-created_at')
-
+    def build_context():
+        accounts = Account.objects.filter(user=request.user, is_active=True).order_by('-created_at')
+        
+        # Efficient DB-side aggregation
+        aggregates = accounts.aggregate(
+            total_balance=Sum('balance'),
+            average_balance=Avg('balance')
+        )
+        
+        return {
+            'accounts': list(accounts.annotate(
+                completed_transaction_count=Count('transactions', filter=Q(transactions__status='completed'))
+            )),
+            'total_balance': aggregates['total_balance'] or 0,
+            'average_balance': aggregates['average_balance'] or 0,
+        }
     
-    # Efficient DB-side aggregation
-    aggregates = accounts.aggregate(
-        total_balance=Sum('balance'),
-        average_balance=Avg('balance')
-    )
+    context = cached_user_context('account_list', request.user, build_context)
+    return render(request, 'transactions/account_list.html', context)
+
+
+def _parse_id_filter(value):
+    """Return ``value`` as a positive database id, or None if it is not one"""
+    if not value or not value.isascii() or not value.isdigit():
+        return None
+    value = int(value)
+    return value if 0 < value <= MAX_ID else None
+
 
-    total_balance = aggregates['total_balance'] or 0
-    average_balance = aggregates['average_balance'] or 0
+def _parse_date_filter(value):
+    """Return the aware start of the day in ``value`` (YYYY-MM-DD), or None"""
+    from datetime import datetime, time
+    from django.utils.dateparse import parse_date
     
-    context = {
-        'accounts': accounts,
-        'total_balance': total_balance,
-        'average_balance': average_balance,
-    }
-    return render(request, 'transactions/account_list.html', context)
+    try:
+        day = parse_date(value or '')
+    except ValueError:
+        day = None
+    if day is None:
+        return None
+    return timezone.make_aware(datetime.combine(day, time.min))
 
 
 @login_required
 def account_detail(request, account_id):
-    """Account detail view"""
+    """Account detail view with the account's full, date-filterable history"""
     account = get_object_or_404(Account, id=account_id, user=request.user)
-    transactions = Transaction.objects.filter(account=account).order_by('-transaction_date')[:50]
     
-    # Pagination
-    from django.core.paginator import Paginator
-    paginator = Paginator(transactions, 20)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    date_from = _parse_date_filter(request.GET.get('from'))
+    date_to = _parse_date_filter(request.GET.get('to'))
     
+    # Keyset pages with a running balance; date_to includes the whole day
+    history_filters = {
+        'date_from': date_from,
+        'date_to': date_to + timedelta(days=1) if date_to else None,
+    }
+    try:
+        page_obj = AccountHistoryService.get_page(account, request.GET.get('cursor'), **history_filters)
+    except ValueError:
+        page_obj = AccountHistoryService.get_page(account, None, **history_filters)
+    
+    current_filters = {
+        'from': date_from.date().isoformat() if date_from else '',
+        'to': date_to.date().isoformat() if date_to else '',
+    }
     context = {
         'account': account,
         'transactions': page_obj,
+        'transaction_count': estimate_count(AccountHistoryService.get_history(account)),
         'current_balance': account.get_balance(),
+        'current_filters': current_filters,
+        'filter_query': urlencode({key: value for key, value in current_filters.items() if value}),
     }
     return render(request, 'transactions/account_detail.html', context)
 
@@ -254,7 +337,7 @@ def transaction_detail_ajax(request, transaction_id):
         transaction = get_object_or_404(
             Transaction.objects.select_related('account', 'category', 'to_account'),
             id=transaction_id,
-            account__user=request.user
+            user=request.user
         )
         
         # Format transaction data
@@ -283,7 +366,7 @@ def transaction_detail_ajax(request, transaction_id):
         }
         
         return JsonResponse({'success': True, 'transaction': data})
-        
+    
     except Exception as e:
         logger.error(f"Transaction detail error: {e}")
         return JsonResponse({'error': 'Failed to fetch transaction details'}, status=500)
@@ -297,15 +380,19 @@ def transaction_complete_ajax(request, transaction_id):
     
     try:
         transaction = get_object_or_404(
-            Transaction,
+            Transaction.objects.select_related('account', 'to_account'),
             id=transaction_id,
-            account__user=request.user,
+            user=request.user,
             status='pending'  # Only pending transactions can be completed
         )
         
-        # Update transaction status
-        transaction.status = 'completed'
-        transaction.save()
+        # Posts the balances; refused if the transaction was settled meanwhile
+        try:
+            completed = transaction.complete_transaction()
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        if not completed:
+            return JsonResponse({'error': 'Transaction not found or cannot be completed'}, status=404)
         
         logger.info(f"Transaction {transaction.reference_number} completed by user {request.user.username}")
         
@@ -314,7 +401,7 @@ def transaction_complete_ajax(request, transaction_id):
             'message': f'Transaction {transaction.reference_number} has been completed.',
             'new_status': 'completed'
         })
-        
+    
     except Transaction.DoesNotExist:
         return JsonResponse({'error': 'Transaction not found or cannot be completed'}, status=404)
     except Exception as e:
@@ -332,13 +419,12 @@ def transaction_cancel_ajax(request, transaction_id):
         transaction = get_object_or_404(
             Transaction,
             id=transaction_id,
-            account__user=request.user,
-            status__in=['pending', 'processing']  # Only pending/processing transactions can be cancelled
+            user=request.user,
         )
         
-        # Update transaction status
-        transaction.status = 'cancelled'
-        transaction.save()
+        # Conditional update: loses cleanly to a concurrent completion
+        if not transaction.transition_to('cancelled'):
+            return JsonResponse({'error': 'Transaction not found or cannot be cancelled'}, status=404)
         
         logger.info(f"Transaction {transaction.reference_number} cancelled by user {request.user.username}")
         
@@ -347,7 +433,7 @@ def transaction_cancel_ajax(request, transaction_id):
             'message': f'Transaction {transaction.reference_number} has been cancelled.',
             'new_status': 'cancelled'
         })
-        
+    
     except Transaction.DoesNotExist:
         return JsonResponse({'error': 'Transaction not found or cannot be cancelled'}, status=404)
     except Exception as e:
@@ -355,45 +441,98 @@ def transaction_cancel_ajax(request, transaction_id):
         return JsonResponse({'error': 'Failed to cancel transaction'}, status=500)
 
 
+class _Echo:
+    """Pseudo-buffer that hands back whatever the CSV writer writes to it"""
+    
+    def write(self, value):
+        return value
+
+
+EXPORT_CHUNK_SIZE = 2000
+
+EXPORT_COLUMNS = [
+    'transaction_date', 'reference_number', 'description', 'account__name',
+    'category__name', 'amount', 'transaction_type', 'status', 'to_account__name',
+]
+
+
+def _iter_transactions_csv(rows):
+    """Yield CSV lines for ``values_list`` rows without building model instances"""
+    import csv
+    
+    writer = csv.writer(_Echo())
+    type_labels = dict(Transaction.TRANSACTION_TYPES)
+    status_labels = dict(Transaction.STATUS_CHOICES)
+    
+    yield writer.writerow([
+        'Date', 'Reference', 'Description', 'Account', 'Category',
+        'Amount', 'Type', 'Status', 'To Account', 'Notes'
+    ])
+    
+    for (txn_date, reference, description, account_name, category_name,
+         amount, txn_type, txn_status, to_account_name) in rows:
+        yield writer.writerow([
+            txn_date.strftime('%Y-%m-%d %H:%M:%S'),
+            reference,
+            description,
+            account_name,
+            category_name or 'Uncategorized',
+            f"{'-' if txn_type == 'debit' else '+'}{amount}",
+            type_labels.get(txn_type, txn_type),
+            status_labels.get(txn_status, txn_status),
+            to_account_name or '',
+        ])
+
+
 @login_required
 def transaction_export(request):
-    """Export transactions to CSV or PDF"""
-    from django.http import HttpResponse
-    import csv
-    import io
-    from datetime import datetime
+    """Export transactions to CSV or PDF
+    
+    The CSV is streamed row by row from a server-side cursor, so memory use
+    stays flat regardless of how much history the user has. Supports optional
+    ``start_date``/``end_date`` (YYYY-MM-DD, inclusive) and ``account`` filters.
+    """
+    from django.http import StreamingHttpResponse
+    from django.utils.dateparse import parse_date
+    from datetime import datetime, time
     
     export_format = request.GET.get('format', 'csv')
     
     # Get user's transactions
-    transactions = Transaction.objects.filter(
-        account__user=request.user
-    ).select_related('account', 'category', 'to_account').order_by('-transaction_date')
+    transactions = Transaction.objects.filter(user=request.user)
+    
+    # Optional date range filter
+    raw_start = request.GET.get('start_date')
+    raw_end = request.GET.get('end_date')
+    try:
+        start_date = parse_date(raw_start) if raw_start else None
+        end_date = parse_date(raw_end) if raw_end else None
+    except ValueError:
+        start_date = end_date = None
+    if (raw_start and not start_date) or (raw_end and not end_date):
+        return JsonResponse({'error': 'Dates must be in YYYY-MM-DD format'}, status=400)
+    
+    if start_date:
+        transactions = transactions.filter(
+            transaction_date__gte=timezone.make_aware(datetime.combine(start_date, time.min))
+        )
+    if end_date:
+        transactions = transactions.filter(
+            transaction_date__lt=timezone.make_aware(datetime.combine(end_date + timedelta(days=1), time.min))
+        )
+    
+    # Filter by account if specified
+    account_id = _parse_id_filter(request.GET.get('account'))
+    if account_id:
+        transactions = transactions.filter(account_id=account_id)
     
     if export_format == 'csv':
-        # Create CSV response
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = f'attachment; filename="transactions_{datetime.now().strftime("%Y%m%d")}.csv"'
-        
-        writer = csv.writer(response)
-        writer.writerow([
-            'Date', 'Reference', 'Description', 'Account', 'Category', 
-            'Amount', 'Type', 'Status', 'To Account', 'Notes'
-        ])
-        
-        for txn in transactions:
-            writer.writerow([
-                txn.transaction_date.strftime('%Y-%m-%d %H:%M:%S'),
-                txn.reference_number,
-                txn.description,
-                txn.account.name,
-                txn.category.name if txn.category else 'Uncategorized',
-                f"{'-' if txn.transaction_type == 'debit' else '+'}{txn.amount}",
-                txn.get_transaction_type_display(),
-                txn.get_status_display(),
-                txn.to_account.name if txn.to_account else '',
-            ])
+        rows = transactions.order_by('-transaction_date', '-id').values_list(
+            *EXPORT_COLUMNS
+        ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
         
+        response = StreamingHttpResponse(_iter_transactions_csv(rows), content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="transactions_{datetime.now().strftime("%Y%m%d")}.csv"'
         return response
     
     elif export_format == 'pdf':
@@ -436,29 +575,37 @@ def transfer_funds_ajax(request):
         if from_account.id == to_account.id:
             return JsonResponse({'error': 'Cannot transfer to the same account'}, status=400)
         
-        # Check sufficient balance
-        if from_account.get_balance() < amount:
+        try:
+            with db_transaction.atomic():
+                # Lock both accounts in primary-key order before anything
+                # references them, so opposite transfers cannot deadlock
+                list(Account.objects.select_for_update().filter(
+                    pk__in=[from_account.pk, to_account.pk]
+                ).order_by('pk'))
+                
+                # Create debit transaction (outgoing)
+                debit_txn = Transaction.objects.create(
+                    account=from_account,
+                    description=f"{description} to {to_account.name}",
+                    amount=amount,
+                    transaction_type='debit',
+                    to_account=to_account
+                )
+                
+                # Create credit transaction (incoming)
+                credit_txn = Transaction.objects.create(
+                    account=to_account,
+                    description=f"{description} from {from_account.name}",
+                    amount=amount,
+                    transaction_type='credit'
+                )
+                
+                # Post both legs; the funds check runs against the locked balance
+                debit_txn.complete_transaction()
+                credit_txn.complete_transaction()
+        except ValueError:
             return JsonResponse({'error': 'Insufficient balance'}, status=400)
         
-        # Create debit transaction (outgoing)
-        debit_txn = Transaction.objects.create(
-            account=from_account,
-            description=f"{description} to {to_account.name}",
-            amount=amount,
-            transaction_type='debit',
-            status='completed',
-            to_account=to_account
-        )
-        
-        # Create credit transaction (incoming)
-        credit_txn = Transaction.objects.create(
-            account=to_account,
-            description=f"{description} from {from_account.name}",
-            amount=amount,
-            transaction_type='credit',
-            status='completed'
-        )
-        
         logger.info(f"Transfer completed: {amount} from {from_account.name} to {to_account.name} by user {request.user.username}")
         
         return JsonResponse({
@@ -467,7 +614,7 @@ def transfer_funds_ajax(request):
             'from_balance': str(from_account.get_balance()),
             'to_balance': str(to_account.get_balance())
         })
-        
+    
     except Account.DoesNotExist:
         return JsonResponse({'error': 'Account not found'}, status=404)
     except json.JSONDecodeError:
@@ -481,11 +628,11 @@ def transfer_funds_ajax(request):
 def transaction_list(request):
     """Transaction list view"""
     transactions = Transaction.objects.filter(
-        account__user=request.user
+        user=request.user
     ).select_related('account', 'category', 'to_account').order_by('-transaction_date')
     
     # Filter by account if specified
-    account_id = request.GET.get('account')
+    account_id = _parse_id_filter(request.GET.get('account'))
     if account_id:
         transactions = transactions.filter(account_id=account_id)
     
@@ -502,29 +649,28 @@ def transaction_list(request):
     # Search functionality
     search = request.GET.get('search')
     if search:
-        transactions = transactions.filter(
-            Q(description__icontains=search) |
-            Q(reference_number__icontains=search)
-        )
+        transactions = search_transactions(transactions, search)
     
-    # Pagination
-    from django.core.paginator import Paginator
-    paginator = Paginator(transactions, 25)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Keyset pagination: deep pages cost the same as the first
+    try:
+        page_obj = paginate_keyset(transactions, request.GET.get('cursor'), 25)
+    except ValueError:
+        page_obj = paginate_keyset(transactions, None, 25)
     
     # Get user accounts for filter dropdown
     user_accounts = Account.objects.filter(user=request.user, is_active=True)
     
+    current_filters = {
+        'account': str(account_id) if account_id else None,
+        'status': status,
+        'type': transaction_type,
+        'search': search,
+    }
     context = {
         'transactions': page_obj,
         'user_accounts': user_accounts,
-        'current_filters': {
-            'account': account_id,
-            'status': status,
-            'type': transaction_type,
-            'search': search,
-        }
+        'current_filters': current_filters,
+        'filter_query': urlencode({key: value for key, value in current_filters.items() if value}),
     }
     return render(request, 'transactions/transaction_list.html', context)
 
@@ -532,36 +678,38 @@ def transaction_list(request):
 @login_required
 @require_http_methods(["GET"])
 def transaction_search(request):
-    """AJAX endpoint for transaction search"""
-    query = request.GET.get('q', '')
-    account_id = request.GET.get('account_id')
-    
-    transactions = Transaction.objects.filter(account__user=request.user)
-    
-    if query:
-        transactions = transactions.filter(
-            Q(description__icontains=query) |
-            Q(reference_number__icontains=query)
-        )
+    """AJAX endpoint for transaction search
     
-    if account_id:
-        transactions = transactions.filter(account_id=account_id)
+    ``typeahead=1`` serves keystroke-driven queries from a per-user prefix
+    cache instead of querying the database on every request.
+    """
+    query = request.GET.get('q', '')
+    account_id = _parse_id_filter(request.GET.get('account_id'))
     
-    transactions = transactions.select_related('account', 'category')[:20]
-    
-    data = []
-    for txn in transactions:
-        data.append({
-            'id': txn.id,
-            'description': txn.description,
-            'amount': float(txn.amount),
-            'transaction_type': txn.transaction_type,
-            'status': txn.status,
-            'date': txn.transaction_date.strftime('%Y-%m-%d %H:%M'),
-            'account': txn.account.name,
-            'category': txn.category.name if txn.category else None,
-        })
+    if request.GET.get('typeahead') in ('1', 'true'):
+        rows = typeahead_search(request.user, query, account_id)
+    else:
+        transactions = Transaction.objects.filter(user=request.user)
+        
+        if account_id:
+            transactions = transactions.filter(account_id=account_id)
+        
+        # Best matches first
+        rows = search_transactions(transactions, query, rank=True).values(*SEARCH_FIELDS)[:20]
     
+    data = [
+        {
+            'id': row['id'],
+            'description': row['description'],
+            'amount': float(row['amount']),
+            'transaction_type': row['transaction_type'],
+            'status': row['status'],
+            'date': row['transaction_date'].strftime('%Y-%m-%d %H:%M'),
+            'account': row['account__name'],
+            'category': row['category__name'],
+        }
+        for row in rows
+    ]
     return JsonResponse({'transactions': data})
 
 
@@ -600,7 +748,7 @@ def quick_transaction(request):
             'reference_number': transaction.reference_number,
             'new_balance': float(account.get_balance())
         })
-        
+    
     except Exception as e:
         logger.error(f"Quick transaction error: {e}")
         return JsonResponse({
@@ -612,66 +760,41 @@ def quick_transaction(request):
 @login_required
 def analytics(request):
     """Analytics dashboard view"""
-    accounts = Account.objects.filter(user=request.user, is_active=True).order_by('-created_at')
-    
-    # Get analytics data
-    total_balance = accounts.aggregate(total_balance=Sum('balance'))['total_balance']
-    total_transactions = Transaction.objects.filter(account__user=request.user).count()
-    
-    # Monthly spending/income data for charts
-    import calendar
-    
-    # Get last 12 months data
-    now = timezone.now()
-    monthly_data = []
-    
-    for i in range(12):
-        month_start = now.replace(day=1) - timedelta(days=i*30)
-        month_end = month_start + timedelta(days=30)
-        
-        monthly_income = Transaction.objects.filter(
-            account__user=request.user,
-            transaction_type='credit',
-            status='completed',
-            transaction_date__gte=month_start,
-            transaction_date__lt=month_end
-        ).aggregate(total=Sum('amount'))['total'] or 0
-        
-        monthly_spending = Transaction.objects.filter(
-            account__user=request.user,
-            transaction_type='debit',
-            status='completed',
-            transaction_date__gte=month_start,
-            transaction_date__lt=month_end
-        ).aggregate(total=Sum('amount'))['total'] or 0
-        
-        monthly_data.append({
-            'month': month_start.strftime('%b %Y'),
-            'income': float(monthly_income),
-            'spending': float(monthly_spending)
-        })
-    
-    monthly_data.reverse()
-    
-    # Category spending
-    category_spending = {}
-    for account in accounts:
-        spending = AnalyticsService.get_spending_by_category(
-            account, 
-            (now - timedelta(days=30)).date(),
-            now.date()
-        )
-        for category, amount in spending.items():
-            category_spending[category] = category_spending.get(category, 0) + float(amount)
+    def build_context():
+        accounts = Account.objects.filter(user=request.user, is_active=True).order_by('-created_at')
+        
+        # Get analytics data
+        total_balance = accounts.aggregate(total_balance=Sum('balance'))['total_balance']
+        total_transactions = Transaction.objects.filter(user=request.user).count()
+        
+        # Monthly spending/income and category data for charts
+        overview = AnalyticsService.get_user_overview(request.user, months=12)
+        
+        monthly_data = [
+            {
+                'month': item['month'],
+                'income': float(item['income']),
+                'spending': float(item['spending'])
+            }
+            for item in overview['monthly']
+        ]
+        
+        category_spending = {
+            category: float(amount)
+            for category, amount in overview['category_spending'].items()
+        }
+        
+        return {
+            'accounts': list(accounts.annotate(
+                completed_transaction_count=Count('transactions', filter=Q(transactions__status='completed'))
+            )),
+            'total_balance': total_balance,
+            'total_transactions': total_transactions,
+            'monthly_data': json.dumps(monthly_data),
+            'category_spending': json.dumps(category_spending),
+        }
     
-    import json
-    context = {
-        'accounts': accounts,
-        'total_balance': total_balance,
-        'total_transactions': total_transactions,
-        'monthly_data': json.dumps(monthly_data),
-        'category_spending': json.dumps(category_spending),
-    }
+    context = cached_user_context('analytics', request.user, build_context)
     return render(request, 'transactions/analytics.html', context)
 
 
@@ -722,9 +845,9 @@ def settings(request):
             messages.success(request, 'Preferences updated successfully!')
             return JsonResponse({'success': True, 'message': 'Preferences updated successfully!'})
     
-    # Get or create user preferences
+    # Get user preferences (loaded once per request by UserPreferencesMiddleware)
     try:
-        preferences = UserPreferences.get_or_create_for_user(request.user)
+        preferences = get_request_preferences(request)
     except Exception as e:
         # Fallback to default preferences if there's an issue
         preferences = type('DefaultPreferences', (), {
@@ -746,16 +869,21 @@ def settings(request):
 @login_required
 def profile(request):
     """User profile view"""
-    accounts = Account.objects.filter(user=request.user, is_active=True).order_by('-created_at')
-    recent_transactions = Transaction.objects.filter(
-        account__user=request.user
-    ).select_related('account', 'category')[:10]
+    def build_context():
+        accounts = list(Account.objects.filter(user=request.user, is_active=True).order_by('-created_at'))
+        recent_transactions = Transaction.objects.filter(
+            user=request.user
+        ).select_related('account', 'category')[:10]
+        
+        return {
+            'accounts': accounts,
+            'recent_transactions': list(recent_transactions),
+            'total_balance': sum(account.get_balance() for account in accounts),
+        }
     
     context = {
         'user': request.user,
-        'accounts': accounts,
-        'recent_transactions': recent_transactions,
-        'total_balance': sum(account.get_balance() for account in accounts),
+        **cached_user_context('profile', request.user, build_context),
     }
     return render(request, 'transactions/profile.html', context)
 
@@ -0,0 +1,44 @@
+"""
+Webhook endpoints for third-party services
+"""
+import logging
+
+import stripe
+from django.db import transaction
+from django.http import HttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+
+from .services import StripeWebhookService
+from .tasks import process_stripe_events
+
+logger = logging.getLogger(__name__)
+
+
+def _enqueue_stripe_events(payment_intent_id):
+    try:
+        process_stripe_events.delay(payment_intent_id)
+    except Exception as e:
+        # The event is stored; the periodic sweep will process it
+        logger.warning(f"Could not enqueue Stripe events for {payment_intent_id}: {e}")
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def stripe_webhook(request):
+    """Verify and store a Stripe event, then acknowledge it straight away
+    
+    Applying the event is left to a Celery task, so the response never
+    waits on balance updates.
+    """
+    try:
+        event = StripeWebhookService.receive(
+            request.body,
+            request.META.get('HTTP_STRIPE_SIGNATURE', '')
+        )
+    except (ValueError, stripe.error.SignatureVerificationError) as e:
+        logger.warning(f"Rejected Stripe webhook: {e}")
+        return HttpResponse(status=400)
+    
+    transaction.on_commit(lambda: _enqueue_stripe_events(event.payment_intent_id))
+    return HttpResponse(status=200)